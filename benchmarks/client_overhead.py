@@ -0,0 +1,331 @@
+# Measures what the clients cost per call against the stand-in server in
+# benchmarks/server.py: calls/s, latency percentiles, client CPU time and peak
+# traced allocations for the sync and async clients, both endpoints and every
+# response format. Results are printed and written as JSON.
+#
+#   python benchmarks/client_overhead.py --calls 500 --size 262144
+#   python benchmarks/client_overhead.py --baseline previous.json
+#
+# The server runs in a child process so its CPU time and allocations are not
+# counted as client overhead.
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openvoice_api_client import __version__
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from server import FakeServer, fake_wav
+
+# "into" reads generate-audio bytes into one reused buffer per worker
+FORMATS = ("url", "bytes", "base64", "stream", "into")
+ENDPOINTS = ("generate-audio", "change-voice")
+TEXT = "The quick brown fox jumps over the lazy dog."
+
+
+def serve(options, ready):
+    FakeServer(**options).serve_forever(ready)
+
+
+def start_server(size, latency):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(
+        target=serve,
+        args=({"size": size, "latency": latency}, ready),
+        daemon=True,
+    )
+    process.start()
+    port = ready.get(timeout=30)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def sync_call(client, endpoint, response_format, audio_data, buffer=None):
+    if response_format == "into":
+        _, status_code, _ = client.generate_audio_into(buffer, input=TEXT)
+        return status_code == 200
+
+    if endpoint == "generate-audio":
+        data, status_code, _ = client.generate_audio(
+            input=TEXT, response_format=response_format
+        )
+    else:
+        data, status_code, _ = client.change_voice(
+            voice="raw",
+            audio_data=audio_data,
+            response_format=response_format,
+            encode=True,
+        )
+
+    if response_format == "stream" and status_code == 200:
+        try:
+            for _ in data.iter_content(chunk_size=client.chunk_size):
+                pass
+        finally:
+            data.close()
+    return status_code == 200
+
+
+async def async_call(client, endpoint, response_format, audio_data, buffer=None):
+    if response_format == "into":
+        _, status_code, _ = await client.generate_audio_into(buffer, input=TEXT)
+        return status_code == 200
+
+    if endpoint == "generate-audio":
+        data, status_code, _ = await client.generate_audio(
+            input=TEXT, response_format=response_format
+        )
+    else:
+        data, status_code, _ = await client.change_voice(
+            voice="raw",
+            audio_data=audio_data,
+            response_format=response_format,
+            encode=True,
+        )
+
+    if response_format == "stream" and status_code == 200:
+        try:
+            async for _ in data.content.iter_chunked(client.chunk_size):
+                pass
+        finally:
+            data.release()
+    return status_code == 200
+
+
+def run_sync(base_url, endpoint, response_format, args, audio_data):
+    client = OpenVoiceApiClient(
+        base_url,
+        log_level=logging.WARNING,
+        pool_maxsize=args.concurrency,
+        max_workers=args.concurrency,
+    )
+
+    def worker(calls):
+        latencies = []
+        errors = 0
+        buffer = bytearray()
+        cpu = time.thread_time()
+
+        for _ in range(calls):
+            started = time.perf_counter()
+            if not sync_call(client, endpoint, response_format, audio_data, buffer):
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        return latencies, errors, time.thread_time() - cpu
+
+    with client:
+        worker(args.warmup)
+        shares = split(args.calls, args.concurrency)
+
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            started = time.perf_counter()
+            outcomes = list(executor.map(worker, shares))
+            wall = time.perf_counter() - started
+
+        peak = measure_allocations(lambda: worker(args.alloc_calls), args.alloc_calls)
+
+    return summarise(outcomes, wall, peak)
+
+
+def run_async(base_url, endpoint, response_format, args, audio_data):
+    async def main():
+        client = OpenVoiceApiClientAsync(
+            base_url, log_level=logging.WARNING, limit=args.concurrency
+        )
+
+        async def worker(calls):
+            latencies = []
+            errors = 0
+            buffer = bytearray()
+
+            for _ in range(calls):
+                started = time.perf_counter()
+                if not await async_call(
+                    client, endpoint, response_format, audio_data, buffer
+                ):
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+            return latencies, errors
+
+        async with client:
+            await worker(args.warmup)
+            # The event loop runs on this thread, its CPU time is the client's
+            cpu = time.thread_time()
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(
+                *(worker(calls) for calls in split(args.calls, args.concurrency))
+            )
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu
+
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await worker(args.alloc_calls)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            tracemalloc.stop()
+
+        return (
+            [(latencies, errors, 0.0) for latencies, errors in outcomes],
+            wall,
+            cpu,
+            peak,
+        )
+
+    outcomes, wall, cpu, peak = asyncio.run(main())
+    result = summarise(outcomes, wall, peak)
+    result["cpu_ms_per_call"] = cpu / max(result["calls"], 1) * 1000
+    return result
+
+
+def measure_allocations(run, calls):
+    if not calls:
+        return None
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak
+
+
+def split(calls, workers):
+    return [
+        calls // workers + (1 if i < calls % workers else 0) for i in range(workers)
+    ]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarise(outcomes, wall, peak):
+    latencies = sorted(l for outcome in outcomes for l in outcome[0])
+    calls = len(latencies)
+    cpu = sum(outcome[2] for outcome in outcomes)
+    return {
+        "calls": calls,
+        "errors": sum(outcome[1] for outcome in outcomes),
+        "calls_per_sec": calls / wall if wall else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if calls else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if calls else None,
+        "mean_ms": sum(latencies) / calls * 1000 if calls else None,
+        "cpu_ms_per_call": cpu / calls * 1000 if calls else None,
+        "alloc_peak_kib": peak / 1024 if peak is not None else None,
+    }
+
+
+def compare(results, baseline_file, tolerance):
+    # CPU time per call is the most stable figure between runs
+    with open(baseline_file) as source:
+        baseline = {
+            (r["client"], r["endpoint"], r["format"]): r
+            for r in json.load(source)["results"]
+        }
+
+    regressions = []
+
+    for result in results:
+        previous = baseline.get(
+            (result["client"], result["endpoint"], result["format"])
+        )
+        if not previous or not previous["cpu_ms_per_call"]:
+            continue
+        ratio = result["cpu_ms_per_call"] / previous["cpu_ms_per_call"]
+        if ratio > 1 + tolerance:
+            regressions.append((result, ratio))
+
+    for result, ratio in regressions:
+        print(
+            f"REGRESSION {result['client']} {result['endpoint']} {result['format']}: "
+            f"CPU per call x{ratio:.2f}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-calls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--size", type=int, default=256 * 1024, help="audio bytes")
+    parser.add_argument("--latency", type=float, default=0.0, help="server seconds")
+    parser.add_argument("--clients", nargs="+", default=["sync", "async"])
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS))
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS))
+    parser.add_argument(
+        "--output", default=os.path.join(os.path.dirname(__file__), "results.json")
+    )
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    # Input recording for change-voice, the same size as the generated audio
+    audio_data = fake_wav(args.size)
+    process, base_url = start_server(args.size, args.latency)
+    results = []
+
+    try:
+        for client in args.clients:
+            run = run_sync if client == "sync" else run_async
+
+            for endpoint in args.endpoints:
+                for response_format in args.formats:
+                    if response_format == "into" and endpoint != "generate-audio":
+                        continue
+                    result = run(base_url, endpoint, response_format, args, audio_data)
+                    result.update(
+                        client=client, endpoint=endpoint, format=response_format
+                    )
+                    results.append(result)
+                    print(
+                        f"{client:5} {endpoint:14} {response_format:6} "
+                        f"{result['calls_per_sec']:9.1f} calls/s  "
+                        f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+                        f"cpu {result['cpu_ms_per_call']:6.2f} ms/call  "
+                        f"peak {result['alloc_peak_kib']:9.1f} KiB  "
+                        f"errors {result['errors']}"
+                    )
+    finally:
+        process.terminate()
+        process.join()
+
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": {
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "size": args.size,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Measures what logging costs per change_voice call with a 1 MB base64 payload.
+# The HTTP session is replaced by an in-process stub so only client work is timed.
+#
+#   python benchmarks/logging_overhead.py
+
+import base64
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+
+
+class StubResponse:
+    status_code = 200
+    content = b"audio_bytes_content"
+    url = "http://localhost:5000/v2/change-voice"
+
+    def close(self):
+        pass
+
+
+class StubSession:
+    def post(self, url, **kwargs):
+        return StubResponse()
+
+
+def per_call(client, audio_data, number):
+    seconds = timeit.timeit(
+        lambda: client.change_voice(voice="raw", audio_data=audio_data),
+        number=number,
+    )
+    return seconds / number * 1e6
+
+
+def main(number=2000):
+    audio_data = base64.b64encode(os.urandom(768 * 1024)).decode("utf-8")
+    client = OpenVoiceApiClient(log_level=logging.INFO)
+    client._session = StubSession()
+    client.logger.handlers[0].setStream(open(os.devnull, "w"))
+
+    logging.disable(logging.CRITICAL)
+    disabled = per_call(client, audio_data, number)
+    logging.disable(logging.NOTSET)
+    info = per_call(client, audio_data, number)
+
+    # What every call used to pay before debug arguments were formatted lazily
+    payload = {"model": "en", "voice": "raw", "audio_data": audio_data}
+    eager = (
+        timeit.timeit(
+            lambda: f" > Starting request:\nparams:\n {json.dumps(payload, indent=4)}",
+            number=number,
+        )
+        / number
+        * 1e6
+    )
+
+    print(f"logging disabled      {disabled:10.1f} us/call")
+    print(f"INFO                  {info:10.1f} us/call")
+    print(f"overhead at INFO      {info - disabled:10.1f} us/call")
+    print(f"eager debug format    {eager:10.1f} us/call (previous cost at any level)")
+
+
+if __name__ == "__main__":
+    main()
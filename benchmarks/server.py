@@ -0,0 +1,163 @@
+# Stand-in OpenVoice API server for benchmarks. Answers /v2/generate-audio and
+# /v2/change-voice in every response format with a fixed payload of `size`
+# bytes after `latency` seconds, without doing any synthesis.
+#
+#   python benchmarks/server.py --port 5000 --size 262144 --latency 0.05
+
+import argparse
+import asyncio
+import base64
+import json
+import struct
+import threading
+from aiohttp import web
+
+
+def fake_wav(size, sample_rate=22050):
+    # 16 bit mono WAV of `size` bytes in total
+    data_size = max(0, size - 44)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        1,
+        sample_rate,
+        sample_rate * 2,
+        2,
+        16,
+        b"data",
+        data_size,
+    )
+    return header + bytes(data_size)
+
+
+class FakeServer:
+    def __init__(
+        self, host="127.0.0.1", port=0, size=256 * 1024, latency=0.0, chunk_size=8192
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.requests = 0
+        # Responses are built once so the server costs as little as possible
+        self.audio = fake_wav(size)
+        self.base64_body = json.dumps(
+            {
+                "result": {
+                    "data": {"audio_data": base64.b64encode(self.audio).decode()},
+                    "message": "Generated audio",
+                }
+            }
+        ).encode()
+        self.url_body = json.dumps(
+            {
+                "result": {
+                    "data": {"url": "http://localhost/outputs/benchmark.wav"},
+                    "message": "Generated audio",
+                }
+            }
+        ).encode()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def app(self):
+        app = web.Application(client_max_size=1024**3)
+        app.router.add_post("/v2/generate-audio", self.handle)
+        app.router.add_post("/v2/change-voice", self.handle)
+        return app
+
+    async def handle(self, request):
+        payload = await request.json()
+        self.requests += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        response_format = payload.get("response_format", "bytes")
+
+        if response_format == "url":
+            return web.Response(body=self.url_body, content_type="application/json")
+        if response_format == "base64":
+            return web.Response(body=self.base64_body, content_type="application/json")
+        if response_format == "stream":
+            response = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            view = memoryview(self.audio)
+            for start in range(0, len(view), self.chunk_size):
+                await response.write(view[start : start + self.chunk_size])
+            await response.write_eof()
+            return response
+        return web.Response(body=self.audio, content_type="audio/wav")
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        # Runs the server on its own event loop in a daemon thread
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-openvoice", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def serve_forever(self, ready=None):
+        # Blocking variant for a separate process, `ready` receives the port
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._start())
+
+        if ready is not None:
+            ready.put(self.port)
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self._runner.cleanup())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in OpenVoice API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeServer(args.host, args.port, args.size, args.latency)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
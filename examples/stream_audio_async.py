@@ -0,0 +1,42 @@
+import logging
+import sys
+import os
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Required for the example
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+
+API_URL = os.getenv("API_URL", "http://localhost:5000")
+VERSION = 'v2'
+output_file = 'outputs/generated_audio_stream_async.wav'
+if os.path.exists(output_file):
+    os.remove(output_file)
+
+async def main():
+    async with OpenVoiceApiClientAsync(base_url=API_URL, log_level=logging.DEBUG) as client:
+        # The connection is held only while the stream is being iterated
+        stream = client.stream_audio(
+            version=VERSION,
+            model='en',
+            input='Hello, this is a test. I am here, there and everywhere',
+            speed=1.0,
+            #accent='en-au', # only v2
+        )
+
+        async with stream:
+            with open(output_file, 'wb') as audio_file:
+                async for chunk in stream:
+                    audio_file.write(chunk)
+
+        if stream.status_code == 200:
+            client.logger.info(f"Audio streamed to {output_file}, first chunk after {stream.time_to_first_chunk:.3f}s")
+        else:
+            client.logger.error(f"Failed to stream audio: {stream.message}")
+
+# Run the async main function
+asyncio.run(main())
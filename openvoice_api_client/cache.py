@@ -0,0 +1,285 @@
+import logging
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(version, payload):
+    # The response format only changes how audio is delivered, not the audio
+    # itself, so it is left out of the key.
+    params = {k: v for k, v in payload.items() if k != "response_format"}
+    params["version"] = version
+
+    if "speed" in params:
+        params["speed"] = float(params["speed"])
+
+    data = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def variant_key(key, variant):
+    # Key of a derived version of the audio stored under key, such as the
+    # output of a post-processor
+    return hashlib.sha256(f"{key}/{variant}".encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, directory, max_size=1024 * 1024 * 1024, max_age=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> [size, stored, accessed]
+        self._index = {}
+        self._size = 0
+        self._next_sweep = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        for shard in os.listdir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+
+            if not os.path.isdir(shard_dir):
+                continue
+
+            for name in os.listdir(shard_dir):
+                if name.startswith("."):
+                    continue
+                try:
+                    st = os.stat(os.path.join(shard_dir, name))
+                except OSError:
+                    continue
+                self._index[name] = [st.st_size, st.st_mtime, st.st_atime]
+                self._size += st.st_size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        now = time.time()
+
+        try:
+            with open(path, "rb") as cache_file:
+                st = os.fstat(cache_file.fileno())
+
+                if self.max_age is not None and now - st.st_mtime > self.max_age:
+                    data = None
+                else:
+                    data = cache_file.read()
+        except FileNotFoundError:
+            data = None
+            st = None
+        except OSError as e:
+            logger.warning(f" > Failed to read cache entry {key}: {str(e)} < ")
+            data = None
+            st = None
+
+        if data is None:
+            with self._lock:
+                self.misses += 1
+
+            if st is not None:
+                self._remove(key, evicted=True)
+            return None
+
+        # mtime keeps the time the entry was stored, atime the last access
+        try:
+            os.utime(path, (now, st.st_mtime))
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+            entry = self._index.get(key)
+
+            if entry is None:
+                self._index[key] = [st.st_size, st.st_mtime, now]
+                self._size += st.st_size
+            else:
+                entry[2] = now
+
+        return data
+
+    def put(self, key, data):
+        self._store(key, lambda cache_file: cache_file.write(data))
+
+    def put_file(self, key, source):
+        def copy(cache_file):
+            with open(source, "rb") as source_file:
+                while True:
+                    chunk = source_file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    cache_file.write(chunk)
+
+        self._store(key, copy)
+
+    def _store(self, key, write):
+        path = self._path(key)
+        shard_dir = os.path.dirname(path)
+
+        try:
+            os.makedirs(shard_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=shard_dir, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as cache_file:
+                    write(cache_file)
+                # Readers either see the previous entry or the complete new one
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f" > Failed to write cache entry {key}: {str(e)} < ")
+            return
+
+        now = time.time()
+
+        with self._lock:
+            previous = self._index.get(key)
+
+            if previous is not None:
+                self._size -= previous[0]
+            self._index[key] = [size, now, now]
+            self._size += size
+
+        self._evict()
+
+    def _remove(self, key, evicted=False):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f" > Failed to remove cache entry {key}: {str(e)} < ")
+            return
+
+        with self._lock:
+            entry = self._index.pop(key, None)
+
+            if entry is not None:
+                self._size -= entry[0]
+            if evicted:
+                self.evictions += 1
+
+    def _evict(self):
+        now = time.time()
+
+        with self._lock:
+            expired = set()
+
+            # Expired entries are swept periodically rather than on every write
+            if self.max_age is not None and now >= self._next_sweep:
+                cutoff = now - self.max_age
+                expired = {k for k, entry in self._index.items() if entry[1] < cutoff}
+                self._next_sweep = now + min(self.max_age, 60)
+
+            size = self._size - sum(self._index[k][0] for k in expired)
+            overflow = []
+
+            if size > self.max_size:
+                # Least recently accessed entries go first
+                for k, entry in sorted(
+                    self._index.items(), key=lambda item: item[1][2]
+                ):
+                    if size <= self.max_size:
+                        break
+                    if k not in expired:
+                        overflow.append(k)
+                        size -= entry[0]
+
+        for key in list(expired) + overflow:
+            self._remove(key, evicted=True)
+
+        if expired or overflow:
+            logger.debug(" > Evicted %d cache entries < ", len(expired) + len(overflow))
+
+    def clear(self):
+        for key in list(self._index):
+            self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "size": self._size,
+            }
+
+
+class MemoryCache:
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+
+            if data is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Views over immutable bytes are read-only and never copy
+        return memoryview(data)
+
+    def put(self, key, data):
+        # Only a bytes object can be shared without copying, anything else
+        # (bytearray, memoryview) is frozen once here.
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        if len(data) > self.max_size:
+            return memoryview(data)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+
+            while self._size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+        return memoryview(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self._size,
+            }
@@ -1,36 +1,161 @@
 import logging
 import requests
 import os
-import json
 import base64
+import collections
+import queue
+import threading
+import time
 import traceback
+from concurrent import futures
+from requests import exceptions as requests_exceptions
+from .cache import cache_key, variant_key
+from .endpoints import EndpointPool
+from .instrumentation import (
+    RequestTiming,
+    TimedHTTPAdapter,
+    current_timing,
+    emit,
+    queue_wait,
+)
+from .log import LazyJson, configure_logger
+from .retry import ApiResult, parse_retry_after
+from .serializer import get_serializer
+from .streaming import Base64JsonBody, Base64JsonDecoder, BufferWriter
+from .text import SentenceBuffer, split_sentences
+from . import wav
+
+# Errors worth retrying, raised while connecting, sending or reading the body
+TRANSIENT_ERRORS = (
+    requests_exceptions.ConnectionError,
+    requests_exceptions.Timeout,
+    requests_exceptions.ChunkedEncodingError,
+)
 
 
 class OpenVoiceApiClient:
     def __init__(
-        self, base_url="http://localhost:5000", log_level=None, log_format=None
+        self,
+        base_url="http://localhost:5000",
+        log_level=None,
+        log_format=None,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        keep_alive=True,
+        max_workers=10,
+        cache=None,
+        memory_cache=None,
+        upload_chunk_size=3 * 256 * 1024,
+        chunk_size=64 * 1024,
+        hooks=None,
+        retry=None,
+        coalesce=False,
+        json_backend=None,
+        postprocess=None,
     ):
         self.base_url = base_url
+        # A single URL, a list of URLs or an EndpointPool to share between clients
+        self.endpoints = (
+            base_url if isinstance(base_url, EndpointPool) else EndpointPool(base_url)
+        )
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.max_workers = max_workers
+        self.cache = cache
+        self.memory_cache = memory_cache
+        self.upload_chunk_size = upload_chunk_size
+        self.chunk_size = chunk_size
+        # Callables receiving a RequestTiming after every HTTP call
+        self.hooks = list(hooks or [])
+        # RetryPolicy for transient failures, no retries when None
+        self.retry = retry
+        # Identical generate_audio calls in flight at the same time share one request
+        self.coalesce = coalesce
+        # orjson, ujson or json, the fastest one installed by default
+        self.serializer = get_serializer(json_backend)
+        # dsp.PostProcessor converting the audio of every call, None keeps it as sent
+        self.postprocess = postprocess
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = None
         self.logger = logging.getLogger(__name__)
         self._configure_logging(log_level, log_format)
 
-    def _configure_logging(self, log_level, log_format):
+    def __enter__(self):
+        self._get_session()
+        return self
 
-        if log_level:
-            self.logger.setLevel(log_level)
-        else:
-            # Use the application's default logging level if custom level is not provided
-            app_log_level = logging.getLogger().getEffectiveLevel()
-            self.logger.setLevel(app_log_level)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-        if not log_format:
-            log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    def _get_session(self):
+        # The session is shared by every thread using this client, the underlying
+        # urllib3 pools are thread-safe and hand out one connection per request.
+        session = self._session
+        if session is not None:
+            return session
 
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        formatter = logging.Formatter(log_format)
-        ch.setFormatter(formatter)
-        self.logger.addHandler(ch)
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                # pool_connections is the number of hosts kept in the pool cache,
+                # pool_maxsize the number of connections kept alive per host.
+                adapter = TimedHTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                if not self.keep_alive:
+                    session.headers["Connection"] = "close"
+
+                self.endpoints.start_probing()
+
+                self._session = session
+                self.logger.debug(
+                    " > Opened HTTP session, pool size: %d < ",
+                    self.pool_maxsize,
+                )
+            return self._session
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is not None:
+            return executor
+
+        with self._session_lock:
+            if self._executor is None:
+                # Keep max_workers <= pool_maxsize so every worker can hold a
+                # pooled connection instead of opening throwaway ones.
+                self._executor = futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="openvoice-api-client",
+                )
+            return self._executor
+
+    def close(self):
+        with self._session_lock:
+            session, self._session = self._session, None
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        if session is not None:
+            # Probing goes on while other clients use the pool
+            self.endpoints.stop_probing()
+            session.close()
+            self.logger.debug(" > Closed HTTP session < ")
+
+    def _configure_logging(self, log_level, log_format):
+        configure_logger(self.logger, log_level, log_format)
 
     def generate_audio(
         self,
@@ -44,7 +169,54 @@ class OpenVoiceApiClient:
         accent=None,
         output_file=None,
     ):
-        url = f"{self.base_url}/{version}/generate-audio"
+        path = f"/{version}/generate-audio"
+        # NumPy arrays are decoded locally from the raw bytes, and raw is bytes
+        # as sent by the server, skipping post-processing
+        payload = self._generate_payload(
+            model,
+            input,
+            voice,
+            speed,
+            style,
+            accent,
+            "bytes" if response_format in ("numpy", "raw") else response_format,
+        )
+
+        if self._shared() and response_format in ("bytes", "base64", "numpy", "raw"):
+            return self._generate_shared(
+                path, version, payload, response_format, output_file
+            )
+
+        return self._post(path, payload, response_format, output_file)
+
+    def generate_audio_into(
+        self,
+        buffer,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+    ):
+        # Reads the audio bytes straight into a caller's bytearray or writable
+        # buffer and returns the number of bytes filled as the data, so one
+        # buffer can be reused across calls. Bytearrays grow when needed.
+        path = f"/{version}/generate-audio"
+        payload = self._generate_payload(
+            model, input, voice, speed, style, accent, "bytes"
+        )
+
+        # The buffer takes the place of the output file for this format
+        if self._shared():
+            return self._generate_shared(path, version, payload, "into", buffer)
+
+        return self._post(path, payload, "into", buffer)
+
+    def _generate_payload(
+        self, model, input, voice, speed, style, accent, response_format
+    ):
         payload = {
             "model": model,
             "input": input,
@@ -58,23 +230,11 @@ class OpenVoiceApiClient:
 
         if accent:
             payload["accent"] = accent
+        return payload
 
-        try:
-            self.logger.debug(
-                f" > Starting request:\n{url}\nparams:\n {json.dumps(payload, indent=4)} < "
-            )
-            response = requests.post(url, json=payload)
-            return self._handle_response(response, response_format, output_file)
-
-        except Exception as e:
-            self.logger.error(
-                f" > An unexpected error occurred: {type(e).__name__}: {str(e)} < "
-            )
-
-            if self.logger.getEffectiveLevel() == logging.DEBUG:
-                self.logger.error(traceback.format_exc())
-
-            return None, 500, "Internal Server Error"
+    def _shared(self):
+        # Whether generated audio goes through _generate_shared
+        return self.coalesce or self.cache is not None or self.memory_cache is not None
 
     def change_voice(
         self,
@@ -89,23 +249,10 @@ class OpenVoiceApiClient:
         encode=False,
     ):
 
-        if audio_file:
-            try:
-                with open(audio_file, "rb") as audio:
-                    audio_bytes = audio.read()
-                    audio_data = base64.b64encode(audio_bytes).decode("utf-8")
-            except Exception as e:
-                self.logger.error(
-                    f" > An unexpected error occurred: {type(e).__name__}: {str(e)} < "
-                )
-                if self.logger.getEffectiveLevel() == logging.DEBUG:
-                    self.logger.error(traceback.format_exc())
-                return None, 500, "Internal Server Error"
-
-        elif encode:
+        if encode and not audio_file:
             audio_bytes = base64.b64encode(audio_data).decode("utf-8")
             audio_data = audio_bytes
-        url = f"{self.base_url}/{version}/change-voice"
+        path = f"/{version}/change-voice"
         payload = {
             "model": model,
             "response_format": response_format,
@@ -116,14 +263,94 @@ class OpenVoiceApiClient:
         if accent:
             payload["accent"] = accent
 
+        if audio_file:
+            try:
+                # The file is base64 encoded while it is being uploaded
+                payload = Base64JsonBody(
+                    payload, audio_file, chunk_size=self.upload_chunk_size
+                )
+            except Exception as e:
+                return self._unexpected_error(e)
+
+        return self._post(path, payload, response_format, output_file)
+
+    def _post(self, path, payload, response_format, output_file):
+        started = time.monotonic()
+        retries = 0
+
+        try:
+            body = self._body_kwargs(payload)
+        except Exception as e:
+            # Payloads that cannot be encoded (bytes without encode=True)
+            return self._unexpected_error(e)
+
+        while True:
+            result, retryable, retry_after = self._post_once(
+                path, payload, body, response_format, output_file, retries
+            )
+            delay = None
+
+            if retryable:
+                elapsed = time.monotonic() - started
+                delay = self.retry.next_delay(retries, elapsed, retry_after)
+
+            if delay is None:
+                return ApiResult(*result, retries=retries)
+
+            retries += 1
+            self.logger.warning(
+                " > Request to %s failed with %s %s, retry %d of %d in %.2fs < ",
+                path,
+                result[1],
+                result[2],
+                retries,
+                self.retry.max_retries,
+                delay,
+            )
+            time.sleep(delay)
+
+    def _post_once(self, path, payload, body, response_format, output_file, attempt):
+        # Returns the result and whether and after how long it may be retried.
+        # Every attempt picks an endpoint, so retries can go to another node.
+        endpoint = self.endpoints.acquire()
+        url = endpoint.url + path
+        healthy = False
+        timing = RequestTiming(url)
+        timing.attempt = attempt
+        # The timed connection pool reports into the record of this thread
+        token = current_timing.set(timing)
+        retry_after = None
+
         try:
             self.logger.debug(
-                f" > Starting request:\n{url}\nparams:\n {json.dumps(payload, indent=4)} <"
+                " > Starting request:\n%s\nparams:\n %s < ",
+                url,
+                LazyJson(self._log_params(payload)),
+            )
+            # Bodies are read lazily so files can be written while downloading
+            response = self._get_session().post(url, stream=True, **body)
+            timing.headers_received()
+            timing.status_code = response.status_code
+
+            if response.status_code != 200:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            try:
+                result = self._handle_response(
+                    response, response_format, output_file, timing
+                )
+            finally:
+                # Streams are released by the consumer once fully read
+                if response_format != "stream":
+                    response.close()
+
+            retryable = self.retry is not None and self.retry.retry_status(
+                response.status_code
             )
-            response = requests.post(url, json=payload)
-            return self._handle_response(response, response_format, output_file)
+            healthy = response.status_code < 500
+            return result, retryable, retry_after
 
         except Exception as e:
+            timing.error = f"{type(e).__name__}: {str(e)}"
             self.logger.error(
                 f" > An unexpected error occurred: {type(e).__name__}: {str(e)} < "
             )
@@ -131,37 +358,566 @@ class OpenVoiceApiClient:
             if self.logger.getEffectiveLevel() == logging.DEBUG:
                 self.logger.error(traceback.format_exc())
 
-            return None, 500, "Internal Server Error"
+            # Error bodies that are not JSON (proxies) still retry on their status
+            retryable = self.retry is not None and (
+                self.retry.retry_status(timing.status_code)
+                or self.retry.retry_exception(
+                    e, timing.sent is not None, TRANSIENT_ERRORS
+                )
+            )
+            # Local errors (disk, decoding) say nothing about the server
+            healthy = (
+                timing.status_code is not None
+                and timing.status_code < 500
+                and not isinstance(e, TRANSIENT_ERRORS)
+            )
+            return (None, 500, "Internal Server Error"), retryable, retry_after
+
+        finally:
+            current_timing.reset(token)
+            timing.finish()
+            self.endpoints.release(endpoint, timing.total, healthy)
+
+            if self.hooks:
+                emit(self.hooks, timing)
+
+    def _body_kwargs(self, payload):
+        # Payloads are encoded once by the client's serializer, not by the HTTP
+        # library on every attempt
+        if isinstance(payload, Base64JsonBody):
+            data = payload
+        else:
+            data = self.serializer.dumps(payload)
+        content_type = getattr(self.serializer, "content_type", "application/json")
+        return {"data": data, "headers": {"Content-Type": content_type}}
+
+    def _log_params(self, payload):
+        if isinstance(payload, Base64JsonBody):
+            params = dict(payload.payload)
+            params[payload.key] = f"<{payload.file_size} bytes from {payload.path}>"
+            return params
+        return payload
+
+    def _generate_shared(self, path, version, payload, response_format, output_file):
+        key = raw_key = cache_key(version, payload)
+
+        # Processed audio is cached under its own key, next to the raw audio
+        if self.postprocess is not None and response_format != "raw":
+            key = variant_key(raw_key, self.postprocess.key)
+
+        retries = 0
+
+        # Cached and shared results are delivered locally, failures there
+        # (files, buffers, post-processing) are reported like failed requests
+        try:
+            audio_bytes = self._cache_get(key)
+
+            if audio_bytes is None:
+                if self.coalesce:
+                    result = self._fetch_coalesced(key, raw_key, path, payload)
+                else:
+                    result = self._fetch_audio(key, raw_key, path, payload)
+
+                if result.status_code != 200:
+                    return result
+                audio_bytes = result.data
+                retries = result.retries
+            else:
+                self.logger.debug(
+                    " > Cache hit for %s, bytes length: %d < ",
+                    key,
+                    len(audio_bytes),
+                )
+
+            result = self._deliver_audio(audio_bytes, response_format, output_file)
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(*result, retries=retries)
+
+    def _unexpected_error(self, e, retries=0):
+        self.logger.error(
+            f" > An unexpected error occurred: {type(e).__name__}: {str(e)} < "
+        )
+        if self.logger.getEffectiveLevel() == logging.DEBUG:
+            self.logger.error(traceback.format_exc())
+        return ApiResult(None, 500, "Internal Server Error", retries=retries)
+
+    def _fetch_audio(self, key, raw_key, path, payload):
+        # Always fetch raw bytes, the requested format is rebuilt locally. With
+        # a post-processor, the raw audio may already be cached under raw_key.
+        audio_bytes = None
+        result = ApiResult(None, 200, "Generated audio bytes")
 
-    def _handle_response(self, response, response_format, output_file):
+        if key != raw_key:
+            audio_bytes = self._cache_get(raw_key)
+
+        if audio_bytes is None:
+            payload = dict(payload, response_format="bytes")
+            result = self._post(path, payload, "raw", None)
+
+            if result.status_code != 200:
+                return result
+            audio_bytes = self._cache_put(raw_key, result.data)
+
+        if key != raw_key:
+            audio_bytes = self._cache_put(key, self._process(audio_bytes))
+        return ApiResult(audio_bytes, 200, result.message, retries=result.retries)
+
+    def _fetch_coalesced(self, key, raw_key, path, payload):
+        # The first caller for a key sends the request, callers arriving while
+        # it is in flight wait for its result instead of sending their own
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+
+            if leader:
+                future = self._inflight[key] = futures.Future()
+
+        if not leader:
+            self.logger.debug(" > Joined in-flight request for %s < ", key)
+            return future.result()
+
+        try:
+            result = self._fetch_audio(key, raw_key, path, payload)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+        return result
+
+    def _cache_get(self, key):
+        # Memory tier first, disk hits are promoted into memory
+        if self.memory_cache is not None:
+            audio_bytes = self.memory_cache.get(key)
+            if audio_bytes is not None:
+                return audio_bytes
+
+        if self.cache is None:
+            return None
+
+        audio_bytes = self.cache.get(key)
+        if audio_bytes is not None and self.memory_cache is not None:
+            audio_bytes = self.memory_cache.put(key, audio_bytes)
+        return audio_bytes
+
+    def _cache_put(self, key, audio_bytes):
+        if self.cache is not None:
+            self.cache.put(key, audio_bytes)
+
+        if self.memory_cache is not None:
+            audio_bytes = self.memory_cache.put(key, audio_bytes)
+        return audio_bytes
+
+    def _process(self, audio_bytes, timing=None):
+        if self.postprocess is None:
+            return audio_bytes
+
+        started = time.perf_counter()
+        try:
+            return self.postprocess.process(audio_bytes)
+        finally:
+            if timing is not None:
+                timing.process += time.perf_counter() - started
+
+    def _to_numpy(self, audio_bytes):
+        # Post-processed audio may be mu-law or raw, the processor knows how to
+        # read its own output
+        if self.postprocess is not None:
+            return self.postprocess.to_numpy(audio_bytes)
+        return wav.to_numpy(audio_bytes)
+
+    def _stream_processor(self):
+        if self.postprocess is None:
+            return None
+        return self.postprocess.stream()
+
+    def _deliver_audio(self, audio_bytes, response_format, output_file):
+        if response_format == "numpy":
+            return ApiResult(
+                self._to_numpy(audio_bytes), 200, "Generated audio samples"
+            )
+
+        if response_format == "into":
+            writer = BufferWriter(output_file)
+            try:
+                writer.expect(len(audio_bytes))
+                writer.write(audio_bytes)
+            finally:
+                writer.release()
+            return ApiResult(writer.length, 200, "Generated audio bytes")
+
+        if output_file is not None:
+            with open(output_file, "wb") as audio_file:
+                audio_file.write(audio_bytes)
+            return ApiResult(
+                output_file, 200, "Generated audio bytes and saved to file"
+            )
+
+        if response_format == "base64":
+            audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+            return ApiResult(audio_base64, 200, "Generated audio bytes")
+
+        return ApiResult(audio_bytes, 200, "Generated audio bytes")
+
+    def iter_audio_long(
+        self,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        max_chars=300,
+        response_format="bytes",
+    ):
+        # Splits long input at sentence boundaries and synthesises the pieces
+        # concurrently, yielding (audio_bytes, status_code, message) per piece in
+        # text order as soon as each one is ready. With response_format="raw"
+        # the pieces are not post-processed.
+        specs = (
+            {
+                "version": version,
+                "model": model,
+                "input": chunk,
+                "voice": voice,
+                "speed": speed,
+                "response_format": response_format,
+                "style": style,
+                "accent": accent,
+            }
+            for chunk in split_sentences(input, max_chars)
+        )
+
+        for index, result in self.generate_audio_many(specs):
+            yield result
+
+    def generate_audio_long(
+        self,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        output_file=None,
+        max_chars=300,
+    ):
+        clips = []
+        retries = 0
+
+        for result in self.iter_audio_long(
+            version=version,
+            model=model,
+            input=input,
+            voice=voice,
+            speed=speed,
+            style=style,
+            accent=accent,
+            max_chars=max_chars,
+            # Clips are post-processed once they are joined
+            response_format="raw",
+        ):
+            audio_bytes, status_code, response_message = result
+            retries += getattr(result, "retries", 0)
+
+            if status_code != 200:
+                return ApiResult(None, status_code, response_message, retries=retries)
+            clips.append(audio_bytes)
+
+        if not clips:
+            return self.generate_audio(
+                version=version,
+                model=model,
+                input=input,
+                voice=voice,
+                speed=speed,
+                style=style,
+                accent=accent,
+                output_file=output_file,
+            )
+
+        try:
+            audio_bytes = self._process(wav.concatenate(clips))
+            result = self._deliver_audio(audio_bytes, "bytes", output_file)
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(*result, retries=retries)
+
+    def iter_audio_from_text(
+        self,
+        fragments,
+        version="v2",
+        model="en",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        max_chars=300,
+    ):
+        # Synthesises an iterator of text fragments (e.g. LLM tokens) sentence by
+        # sentence. Each sentence is sent as soon as it is complete while later
+        # fragments are still arriving, results are yielded in text order as
+        # (audio_bytes, status_code, message).
+        kwargs = {
+            "version": version,
+            "model": model,
+            "voice": voice,
+            "speed": speed,
+            "response_format": "bytes",
+            "style": style,
+            "accent": accent,
+        }
+        pending = queue.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            buffer = SentenceBuffer(max_chars)
+            try:
+                for fragment in fragments:
+                    if stopped.is_set():
+                        return
+                    for sentence in buffer.feed(fragment):
+                        pending.put(
+                            self.submit_generate_audio(input=sentence, **kwargs)
+                        )
+
+                for sentence in buffer.flush():
+                    pending.put(self.submit_generate_audio(input=sentence, **kwargs))
+
+            except Exception as e:
+                failed = futures.Future()
+                failed.set_result(self._unexpected_error(e))
+                pending.put(failed)
+
+            finally:
+                pending.put(None)
+
+        # Fragments are consumed on their own thread so a slow producer never
+        # holds back audio that is already available
+        producer = threading.Thread(
+            target=produce, name="openvoice-api-client-text", daemon=True
+        )
+        producer.start()
+
+        try:
+            while True:
+                future = pending.get()
+                if future is None:
+                    break
+                yield future.result()
+        finally:
+            stopped.set()
+            while not pending.empty():
+                future = pending.get_nowait()
+                if future is not None:
+                    future.cancel()
+
+    def submit_generate_audio(self, **kwargs):
+        return self._get_executor().submit(
+            self._call, self.generate_audio, kwargs, None, time.perf_counter()
+        )
+
+    def submit_change_voice(self, **kwargs):
+        return self._get_executor().submit(
+            self._call, self.change_voice, kwargs, None, time.perf_counter()
+        )
+
+    def generate_audio_many(self, specs, ordered=True, window=None):
+        return self._run_many(self.generate_audio, specs, ordered, window)
+
+    def change_voice_many(self, specs, ordered=True, window=None):
+        return self._run_many(self.change_voice, specs, ordered, window)
+
+    def generate_and_change_voice_many(
+        self,
+        specs,
+        ordered=True,
+        generate_concurrency=4,
+        change_concurrency=4,
+        window=None,
+    ):
+        # Runs generate_audio then change_voice for every spec, a dict with
+        # "generate" (generate_audio kwargs) and "change_voice" (change_voice
+        # kwargs, without the audio). Generated bytes go straight into the
+        # change_voice request, and both stages run at the same time on
+        # different specs, each within its own concurrency limit. Yields
+        # (index, result) with the change_voice result, or the generate_audio
+        # one when it failed.
+        generate_slots = threading.BoundedSemaphore(generate_concurrency)
+        change_slots = threading.BoundedSemaphore(change_concurrency)
+
+        def run(slots, method, kwargs):
+            queued = time.perf_counter()
+
+            with slots:
+                token = queue_wait.set(time.perf_counter() - queued)
+                try:
+                    return method(**kwargs)
+                finally:
+                    queue_wait.reset(token)
+
+        def convert(generate, change_voice):
+            # The intermediate audio is never post-processed
+            generate = dict(generate, response_format="raw", output_file=None)
+            result = run(generate_slots, self.generate_audio, generate)
+            audio_bytes, status_code, _ = result
+
+            if status_code != 200:
+                return result
+
+            change_voice = dict(change_voice, audio_data=audio_bytes, encode=True)
+            return run(change_slots, self.change_voice, change_voice)
+
+        # A spec waiting for a change_voice slot holds a thread, one thread per
+        # slot of each stage keeps both stages busy
+        workers = generate_concurrency + change_concurrency
+        executor = futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="openvoice-api-client-pipeline"
+        )
+
+        try:
+            yield from self._run_many(
+                convert, specs, ordered, window, executor, workers
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+    def generate_audio_stacked(self, specs, window=None):
+        # Generates a batch of clips and stacks their samples into one array of
+        # shape (clips, frames[, channels]) for vectorised processing. The data
+        # is (samples, sample_rate, lengths), see wav.stack. The first failed
+        # clip fails the whole batch.
+        clips = []
+        retries = 0
+        specs = (dict(spec, response_format="bytes") for spec in specs)
+
+        for index, result in self._run_many(self.generate_audio, specs, True, window):
+            audio_bytes, status_code, response_message = result
+            retries += getattr(result, "retries", 0)
+
+            if status_code != 200:
+                return ApiResult(None, status_code, response_message, retries=retries)
+            clips.append(audio_bytes)
+
+        try:
+            clips = [self._to_numpy(clip) for clip in clips]
+            samples = wav.stack_samples(clips)
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(samples, 200, "Generated audio samples", retries=retries)
+
+    def _call(self, method, kwargs, index=None, submitted=None):
+        # Time spent waiting for a pool worker is reported by timing hooks
+        waited = time.perf_counter() - submitted if submitted is not None else 0.0
+        token = queue_wait.set(waited)
+
+        try:
+            result = method(**kwargs)
+        except Exception as e:
+            result = self._unexpected_error(e)
+        finally:
+            queue_wait.reset(token)
+
+        if index is None:
+            return result
+        return index, result
+
+    def _run_many(self, method, specs, ordered, window, executor=None, workers=None):
+        # Yields (index, result) pairs. Specs are pulled lazily and at most `window`
+        # of them are submitted to the thread pool at any time, results come back
+        # in input order or as soon as they finish.
+        executor = executor or self._get_executor()
+        workers = workers or self.max_workers
+        window = max(window or workers * 4, workers)
+        specs = iter(specs)
+        index = 0
+        exhausted = False
+        pending = collections.deque() if ordered else set()
+
+        try:
+            while True:
+                limit = window if ordered else workers
+                while not exhausted and len(pending) < limit:
+                    try:
+                        spec = next(specs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(
+                        self._call, method, spec, index, time.perf_counter()
+                    )
+                    if ordered:
+                        pending.append(future)
+                    else:
+                        pending.add(future)
+                    index += 1
+
+                if not pending:
+                    break
+
+                if ordered:
+                    yield pending[0].result()
+                    pending.popleft()
+                else:
+                    done, pending = futures.wait(
+                        pending, return_when=futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _handle_response(self, response, response_format, output_file, timing=None):
         status_code = response.status_code
+        timing = timing or RequestTiming(response.url)
 
         if status_code == 200:
             if response_format == "url":
-                response_data = response.json()
+                response_data = self._read_json(response, timing)
                 file_url = response_data["result"]["data"]["url"]
                 response_message = response_data["result"]["message"]
                 self.logger.debug(
-                    f" > Finished processing request, response:\n {json.dumps(response_data, indent=4)} < "
+                    " > Finished processing request, response:\n %s < ",
+                    LazyJson(response_data),
                 )
-                self.logger.debug(f" > Generated audio URL: {file_url} < ")
+                self.logger.debug(" > Generated audio URL: %s < ", file_url)
                 return file_url, status_code, response_message
 
-            elif response_format == "bytes" or response_format == "base64":
+            # raw is bytes left unprocessed, for audio that is cached first
+            elif response_format in ("bytes", "base64", "raw"):
                 if output_file is not None:
 
-                    if response_format == "base64":
-                        response_data = response.json()
-                        audio_base64 = response_data["result"]["data"]["audio_data"]
-                        audio_bytes = base64.b64decode(audio_base64)
-                    else:
-                        audio_bytes = response.content
+                    # Base64 is decoded to the file while the JSON body arrives
+                    decoder = (
+                        Base64JsonDecoder() if response_format == "base64" else None
+                    )
+                    self._write_stream(
+                        output_file,
+                        response,
+                        timing=timing,
+                        decoder=decoder,
+                        processor=(
+                            self._stream_processor()
+                            if response_format != "raw"
+                            else None
+                        ),
+                    )
 
-                    with open(output_file, "wb") as audio_file:
-                        audio_file.write(audio_bytes)
                     file_size = os.path.getsize(output_file)
                     self.logger.debug(
-                        f" > Finished processing request, saved generated audio bytes: {file_size} < "
+                        " > Finished processing request, saved generated audio bytes: %d < ",
+                        file_size,
                     )
                     return (
                         output_file,
@@ -170,39 +926,162 @@ class OpenVoiceApiClient:
                     )
 
                 else:
-                    audio_bytes = response.content
-
                     if response_format == "base64":
-                        response_data = response.json()
+                        response_data = self._read_json(response, timing)
                         audio_base64 = response_data["result"]["data"]["audio_data"]
                         # audio_bytes = base64.b64decode(audio_base64)
                         audio_bytes = audio_base64
 
+                        if self.postprocess is not None:
+                            audio_bytes = self._process(
+                                base64.b64decode(audio_base64), timing
+                            )
+                            audio_bytes = base64.b64encode(audio_bytes).decode("utf-8")
+                    else:
+                        audio_bytes = self._read_content(response, timing)
+
+                        if response_format == "bytes":
+                            audio_bytes = self._process(audio_bytes, timing)
+
                     self.logger.debug(
-                        f" > Finished processing request, bytes length: {len(audio_bytes)} < "
+                        " > Finished processing request, bytes length: %d < ",
+                        len(audio_bytes),
                     )
                     return audio_bytes, status_code, "Generated audio bytes"
 
+            elif response_format == "numpy":
+                content = self._process(self._read_content(response, timing), timing)
+                started = time.perf_counter()
+                try:
+                    samples = self._to_numpy(content)
+                finally:
+                    timing.decode += time.perf_counter() - started
+                return samples, status_code, "Generated audio samples"
+
+            elif response_format == "into":
+                if self.postprocess is not None:
+                    content = self._process(
+                        self._read_content(response, timing), timing
+                    )
+                    return self._deliver_audio(content, "into", output_file)
+
+                length = self._read_into(output_file, response, timing)
+                self.logger.debug(
+                    " > Finished processing request, bytes length: %d < ", length
+                )
+                return length, status_code, "Generated audio bytes"
+
             elif response_format == "stream":
                 return response, status_code, "Generated audio stream"
 
         else:
-            response_data = response.json()
+            response_data = self._read_json(response, timing)
             response_message = response_data["result"]["message"]
             self.logger.debug(
-                f" > Finished request, response:\n {json.dumps(response_data, indent=4)} < "
+                " > Finished request, response:\n %s < ",
+                LazyJson(response_data),
             )
             self.logger.error(
                 f" > Failed to generate audio. Response status code: {status_code}, Response message: {response_message} < "
             )
             return None, status_code, response_message
 
-    def stream_generator(self, output_file, response):
-        self.logger.debug(" > Starting streaming and writing to file <")
+    def _read_content(self, response, timing):
+        started = time.perf_counter()
+        content = response.content
+        timing.transfer += time.perf_counter() - started
+        timing.bytes_in += len(content or b"")
+        return content
+
+    def _read_into(self, buffer, response, timing):
+        # Chunks are copied into the caller's buffer as they arrive, the body
+        # is never assembled into a bytes object of its own
+        writer = BufferWriter(buffer)
+        started = time.perf_counter()
+
+        try:
+            size = response.headers.get("Content-Length")
+
+            # Compressed bodies decode to more than their Content-Length
+            if size and "Content-Encoding" not in response.headers:
+                writer.expect(int(size))
+
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                writer.write(chunk)
+        finally:
+            writer.release()
+            timing.transfer += time.perf_counter() - started
+            timing.bytes_in += writer.length
+
+        return writer.length
+
+    def _read_json(self, response, timing):
+        # Read and parsed separately so both steps are timed
+        content = self._read_content(response, timing)
+        started = time.perf_counter()
+        try:
+            return self.serializer.loads(content)
+        finally:
+            timing.decode += time.perf_counter() - started
+
+    def _write_stream(
+        self,
+        output_file,
+        response,
+        chunk_size=None,
+        timing=None,
+        decoder=None,
+        processor=None,
+    ):
+        # With a decoder, chunks of the body are decoded before being written,
+        # then converted by a processor
+        timing = timing or RequestTiming(response.url)
+
         with open(output_file, "wb") as audio_file:
-            for chunk in response.iter_content(chunk_size=1024):
+            chunks = response.iter_content(chunk_size=chunk_size or self.chunk_size)
+            started = time.perf_counter()
+
+            # Reading from the socket and writing to disk are timed separately
+            for chunk in chunks:
+                received = time.perf_counter()
+                timing.transfer += received - started
+                timing.bytes_in += len(chunk)
+
+                if decoder is not None:
+                    chunk = decoder.feed(chunk)
+                    timing.decode += time.perf_counter() - received
+
+                if processor is not None and chunk:
+                    processed = time.perf_counter()
+                    chunk = processor.feed(chunk)
+                    timing.process += time.perf_counter() - processed
+
+                written = time.perf_counter()
 
                 if chunk:
                     audio_file.write(chunk)
 
+                started = time.perf_counter()
+                timing.file_write += started - written
+
+            timing.transfer += time.perf_counter() - started
+
+            if processor is not None:
+                audio_file.write(processor.close())
+                # Files get the real sizes once the length is known
+                audio_file.seek(0)
+                audio_file.write(processor.header())
+
+        if decoder is not None:
+            decoder.close()
+
+    def stream_generator(self, output_file, response, chunk_size=None):
+        self.logger.debug(" > Starting streaming and writing to file <")
+        try:
+            self._write_stream(
+                output_file, response, chunk_size, processor=self._stream_processor()
+            )
+        finally:
+            response.close()
+
         self.logger.debug(" > Streaming and writing completed <")
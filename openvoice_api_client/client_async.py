@@ -1,36 +1,161 @@
 import logging
+import asyncio
+import collections
 import aiohttp
 import aiofiles
 import os
-import json
 import base64
+import time
 import traceback
+from .cache import cache_key, variant_key
+from .endpoints import EndpointPool
+from .instrumentation import RequestTiming, emit, queue_wait, trace_config
+from .log import LazyJson, configure_logger
+from .retry import ApiResult, parse_retry_after
+from .serializer import get_serializer
+from .streaming import Base64JsonBody, Base64JsonDecoder, BufferWriter
+from .text import SentenceBuffer, split_sentences
+from . import wav
+
+# Errors worth retrying, raised while connecting, sending or reading the body
+TRANSIENT_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
 
 
 class OpenVoiceApiClientAsync:
     def __init__(
-        self, base_url="http://localhost:5000", log_level=None, log_format=None
+        self,
+        base_url="http://localhost:5000",
+        log_level=None,
+        log_format=None,
+        limit=100,
+        limit_per_host=0,
+        keepalive_timeout=15,
+        ttl_dns_cache=300,
+        cache=None,
+        memory_cache=None,
+        upload_chunk_size=3 * 256 * 1024,
+        chunk_size=64 * 1024,
+        hooks=None,
+        retry=None,
+        coalesce=False,
+        json_backend=None,
+        postprocess=None,
     ):
         self.base_url = base_url
+        # A single URL, a list of URLs or an EndpointPool to share between clients
+        self.endpoints = (
+            base_url if isinstance(base_url, EndpointPool) else EndpointPool(base_url)
+        )
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.cache = cache
+        self.memory_cache = memory_cache
+        self.upload_chunk_size = upload_chunk_size
+        self.chunk_size = chunk_size
+        # Callables receiving a RequestTiming after every HTTP call
+        self.hooks = list(hooks or [])
+        # RetryPolicy for transient failures, no retries when None
+        self.retry = retry
+        # Identical generate_audio calls in flight at the same time share one request
+        self.coalesce = coalesce
+        # orjson, ujson or json, the fastest one installed by default
+        self.serializer = get_serializer(json_backend)
+        # dsp.PostProcessor converting the audio of every call, None keeps it as sent
+        self.postprocess = postprocess
+        # key -> [task, number of callers waiting on it]
+        self._inflight = {}
+        self._session = None
+        self._session_loop = None
+        # Whether this client counts as an owner of the pool's probe thread
+        self._probing = False
         self.logger = logging.getLogger(__name__)
         self._configure_logging(log_level, log_format)
 
-    def _configure_logging(self, log_level, log_format):
-        if log_level:
-            self.logger.setLevel(log_level)
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def _get_session(self):
+        # The session and its connector are created on first use so they bind to
+        # the running event loop, then reused by every call until aclose().
+        loop = asyncio.get_running_loop()
+
+        if self._session is not None and self._session_loop is not loop:
+            # Each asyncio.run() has its own loop, the session of an earlier
+            # one cannot be used here and is replaced
+            self._drop_session()
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=self.ttl_dns_cache is not None,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            # Connection level timings come from aiohttp's tracing signals
+            self._session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[trace_config()]
+            )
+            self._session_loop = loop
+            self.logger.debug(
+                " > Opened HTTP session, connection limit: %d < ",
+                self.limit,
+            )
+
+        if not self._probing:
+            # Probes run in a thread of the pool, shared with every other
+            # client, each client counts once however often its session is
+            # recreated
+            self._probing = True
+            self.endpoints.start_probing()
+        return self._session
+
+    def _drop_session(self):
+        session, self._session = self._session, None
+
+        if not self._session_loop.is_closed():
+            # Still alive, e.g. running in another thread, it closes the session
+            asyncio.run_coroutine_threadsafe(session.close(), self._session_loop)
         else:
-            # Use the application's default logging level if custom level is not provided
-            app_log_level = logging.getLogger().getEffectiveLevel()
-            self.logger.setLevel(app_log_level)
+            # Transports of a finished loop cannot be closed anymore, the
+            # connector only forgets them so their sockets go with them
+            connector = session.connector
+            session.detach()
+            if connector is not None:
+                connector._close()
+        self.logger.debug(" > Dropped HTTP session of another event loop < ")
+
+    async def aclose(self):
+        session, self._session = self._session, None
 
-        if not log_format:
-            log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        if session is not None and self._session_loop is not asyncio.get_running_loop():
+            # Opened by an earlier event loop
+            self._session = session
+            self._drop_session()
+            session = None
 
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        formatter = logging.Formatter(log_format)
-        ch.setFormatter(formatter)
-        self.logger.addHandler(ch)
+        if self._probing:
+            self._probing = False
+            # The last client of the pool waits for a probe in progress
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.endpoints.stop_probing)
+
+        if session is not None and not session.closed:
+            await session.close()
+            self.logger.debug(" > Closed HTTP session < ")
+
+    def _configure_logging(self, log_level, log_format):
+        configure_logger(self.logger, log_level, log_format)
 
     async def generate_audio(
         self,
@@ -44,7 +169,72 @@ class OpenVoiceApiClientAsync:
         accent=None,
         output_file=None,
     ):
-        url = f"{self.base_url}/{version}/generate-audio"
+        path = f"/{version}/generate-audio"
+        # NumPy arrays are decoded locally from the raw bytes, and raw is bytes
+        # as sent by the server, skipping post-processing
+        payload = self._generate_payload(
+            model,
+            input,
+            voice,
+            speed,
+            style,
+            accent,
+            "bytes" if response_format in ("numpy", "raw") else response_format,
+        )
+
+        if self._shared() and response_format in ("bytes", "base64", "numpy", "raw"):
+            return await self._generate_shared(
+                path, version, payload, response_format, output_file
+            )
+
+        return await self._post(path, payload, response_format, output_file)
+
+    async def generate_audio_into(
+        self,
+        buffer,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+    ):
+        # Reads the audio bytes straight into a caller's bytearray or writable
+        # buffer and returns the number of bytes filled as the data, so one
+        # buffer can be reused across calls. Bytearrays grow when needed.
+        path = f"/{version}/generate-audio"
+        payload = self._generate_payload(
+            model, input, voice, speed, style, accent, "bytes"
+        )
+
+        # The buffer takes the place of the output file for this format
+        if self._shared():
+            return await self._generate_shared(path, version, payload, "into", buffer)
+
+        return await self._post(path, payload, "into", buffer)
+
+    def stream_audio(
+        self,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        chunk_size=None,
+    ):
+        path = f"/{version}/generate-audio"
+        payload = self._generate_payload(
+            model, input, voice, speed, style, accent, "stream"
+        )
+
+        return AudioStream(self, path, payload, chunk_size or self.chunk_size)
+
+    def _generate_payload(
+        self, model, input, voice, speed, style, accent, response_format
+    ):
         payload = {
             "model": model,
             "input": input,
@@ -58,25 +248,11 @@ class OpenVoiceApiClientAsync:
 
         if accent:
             payload["accent"] = accent
+        return payload
 
-        try:
-            self.logger.debug(
-                f" > Starting request: {url} with params: {json.dumps(payload, indent=4)}"
-            )
-
-            async with aiohttp.ClientSession() as client:
-                response = await client.post(url, json=payload)
-                return await self._handle_response(
-                    response, response_format, output_file
-                )
-
-        except Exception as e:
-            self.logger.error(
-                f" > An unexpected error occurred: {type(e).__name__}: {str(e)}"
-            )
-            if self.logger.getEffectiveLevel() == logging.DEBUG:
-                self.logger.error(traceback.format_exc())
-            return None, 500, "Internal Server Error"
+    def _shared(self):
+        # Whether generated audio goes through _generate_shared
+        return self.coalesce or self.cache is not None or self.memory_cache is not None
 
     async def change_voice(
         self,
@@ -91,24 +267,11 @@ class OpenVoiceApiClientAsync:
         encode=False,
     ):
 
-        if audio_file:
-            try:
-                async with aiofiles.open(audio_file, "rb") as audio:
-                    audio_bytes = await audio.read()
-                    audio_data = base64.b64encode(audio_bytes).decode("utf-8")
-            except Exception as e:
-                self.logger.error(
-                    f" > An unexpected error occurred: {type(e).__name__}: {str(e)}"
-                )
-                if self.logger.getEffectiveLevel() == logging.DEBUG:
-                    self.logger.error(traceback.format_exc())
-                return None, 500, "Internal Server Error"
-
-        elif encode:
+        if encode and not audio_file:
             audio_bytes = base64.b64encode(audio_data).decode("utf-8")
             audio_data = audio_bytes
 
-        url = f"{self.base_url}/{version}/change-voice"
+        path = f"/{version}/change-voice"
         payload = {
             "model": model,
             "response_format": response_format,
@@ -119,52 +282,695 @@ class OpenVoiceApiClientAsync:
         if accent:
             payload["accent"] = accent
 
+        if audio_file:
+            try:
+                # The file is base64 encoded while it is being uploaded
+                payload = Base64JsonBody(
+                    payload, audio_file, chunk_size=self.upload_chunk_size
+                )
+            except Exception as e:
+                return self._unexpected_error(e)
+
+        return await self._post(path, payload, response_format, output_file)
+
+    async def _post(self, path, payload, response_format, output_file):
+        started = time.monotonic()
+        retries = 0
+
+        try:
+            body = self._body_kwargs(payload)
+        except Exception as e:
+            # Payloads that cannot be encoded (bytes without encode=True)
+            return self._unexpected_error(e)
+
+        while True:
+            result, retryable, retry_after = await self._post_once(
+                path, payload, body, response_format, output_file, retries
+            )
+            delay = None
+
+            if retryable:
+                elapsed = time.monotonic() - started
+                delay = self.retry.next_delay(retries, elapsed, retry_after)
+
+            if delay is None:
+                return ApiResult(*result, retries=retries)
+
+            retries += 1
+            self.logger.warning(
+                " > Request to %s failed with %s %s, retry %d of %d in %.2fs",
+                path,
+                result[1],
+                result[2],
+                retries,
+                self.retry.max_retries,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def _post_once(
+        self, path, payload, body, response_format, output_file, attempt
+    ):
+        # Returns the result and whether and after how long it may be retried.
+        # Every attempt picks an endpoint, so retries can go to another node.
+        endpoint = self.endpoints.acquire()
+        url = endpoint.url + path
+        healthy = False
+        timing = RequestTiming(url)
+        timing.attempt = attempt
+        retry_after = None
+
         try:
             self.logger.debug(
-                f" > Starting request:\n{url}\nparams:\n {json.dumps(payload, indent=4)}"
+                " > Starting request:\n%s\nparams:\n %s",
+                url,
+                LazyJson(self._log_params(payload)),
             )
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    return await self._handle_response(
-                        response, response_format, output_file
-                    )
+            response = await self._get_session().post(
+                url, trace_request_ctx=timing, **body
+            )
+            timing.headers_received()
+            timing.status_code = response.status
+
+            if response.status != 200:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            try:
+                result = await self._handle_response(
+                    response, response_format, output_file, timing
+                )
+            finally:
+                # Streams are released by the consumer once fully read
+                if response_format != "stream":
+                    response.release()
+
+            retryable = self.retry is not None and self.retry.retry_status(
+                response.status
+            )
+            healthy = response.status < 500
+            return result, retryable, retry_after
 
         except Exception as e:
+            timing.error = f"{type(e).__name__}: {str(e)}"
             self.logger.error(
                 f" > An unexpected error occurred: {type(e).__name__}: {str(e)}"
             )
             if self.logger.getEffectiveLevel() == logging.DEBUG:
                 self.logger.error(traceback.format_exc())
-            return None, 500, "Internal Server Error"
 
-    async def _handle_response(self, response, response_format, output_file):
+            # Error bodies that are not JSON (proxies) still retry on their status
+            retryable = self.retry is not None and (
+                self.retry.retry_status(timing.status_code)
+                or self.retry.retry_exception(
+                    e, timing.sent is not None, TRANSIENT_ERRORS
+                )
+            )
+            # Local errors (disk, decoding) say nothing about the server
+            healthy = (
+                timing.status_code is not None
+                and timing.status_code < 500
+                and not isinstance(e, TRANSIENT_ERRORS)
+            )
+            return (None, 500, "Internal Server Error"), retryable, retry_after
+
+        finally:
+            timing.finish()
+            self.endpoints.release(endpoint, timing.total, healthy)
+
+            if self.hooks:
+                emit(self.hooks, timing)
+
+    def _body_kwargs(self, payload):
+        # Payloads are encoded once by the client's serializer, not by the HTTP
+        # library on every attempt
+        content_type = getattr(self.serializer, "content_type", "application/json")
+        headers = {"Content-Type": content_type}
+
+        if isinstance(payload, Base64JsonBody):
+            data = payload
+            # aiohttp sends async iterables chunked unless given their length
+            headers["Content-Length"] = str(len(payload))
+        else:
+            data = self.serializer.dumps(payload)
+        return {"data": data, "headers": headers}
+
+    def _log_params(self, payload):
+        if isinstance(payload, Base64JsonBody):
+            params = dict(payload.payload)
+            params[payload.key] = f"<{payload.file_size} bytes from {payload.path}>"
+            return params
+        return payload
+
+    async def _generate_shared(
+        self, path, version, payload, response_format, output_file
+    ):
+        key = raw_key = cache_key(version, payload)
+
+        # Processed audio is cached under its own key, next to the raw audio
+        if self.postprocess is not None and response_format != "raw":
+            key = variant_key(raw_key, self.postprocess.key)
+
+        retries = 0
+
+        # Cached and shared results are delivered locally, failures there
+        # (files, buffers, post-processing) are reported like failed requests
+        try:
+            audio_bytes = await self._cache_get(key)
+
+            if audio_bytes is None:
+                if self.coalesce:
+                    result = await self._fetch_coalesced(key, raw_key, path, payload)
+                else:
+                    result = await self._fetch_audio(key, raw_key, path, payload)
+
+                if result.status_code != 200:
+                    return result
+                audio_bytes = result.data
+                retries = result.retries
+            else:
+                self.logger.debug(
+                    " > Cache hit for %s, bytes length: %d < ",
+                    key,
+                    len(audio_bytes),
+                )
+
+            result = await self._deliver_audio(
+                audio_bytes, response_format, output_file
+            )
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(*result, retries=retries)
+
+    def _unexpected_error(self, e, retries=0):
+        self.logger.error(
+            f" > An unexpected error occurred: {type(e).__name__}: {str(e)}"
+        )
+        if self.logger.getEffectiveLevel() == logging.DEBUG:
+            self.logger.error(traceback.format_exc())
+        return ApiResult(None, 500, "Internal Server Error", retries=retries)
+
+    async def _fetch_audio(self, key, raw_key, path, payload):
+        # Always fetch raw bytes, the requested format is rebuilt locally. With
+        # a post-processor, the raw audio may already be cached under raw_key.
+        audio_bytes = None
+        result = ApiResult(None, 200, "Generated audio bytes")
+
+        if key != raw_key:
+            audio_bytes = await self._cache_get(raw_key)
+
+        if audio_bytes is None:
+            payload = dict(payload, response_format="bytes")
+            result = await self._post(path, payload, "raw", None)
+
+            if result.status_code != 200:
+                return result
+            audio_bytes = await self._cache_put(raw_key, result.data)
+
+        if key != raw_key:
+            audio_bytes = await self._cache_put(key, await self._process(audio_bytes))
+        return ApiResult(audio_bytes, 200, result.message, retries=result.retries)
+
+    async def _fetch_coalesced(self, key, raw_key, path, payload):
+        # The first caller for a key starts the request as a task, callers
+        # arriving while it is in flight await the same task. Cancelling one
+        # caller leaves the request running for the others, it is only cancelled
+        # once every caller waiting on it is gone.
+        entry = self._inflight.get(key)
+
+        if entry is None:
+            task = asyncio.ensure_future(self._fetch_audio(key, raw_key, path, payload))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, entry))
+        else:
+            self.logger.debug(" > Joined in-flight request for %s < ", key)
+
+        task = entry[0]
+        entry[1] += 1
+
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+
+            if entry[1] == 0 and not task.done():
+                # Later callers must not join a request being cancelled
+                self._forget(key, entry)
+                task.cancel()
+
+    def _forget(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _cache_get(self, key):
+        # Memory tier first, disk hits are promoted into memory
+        if self.memory_cache is not None:
+            audio_bytes = self.memory_cache.get(key)
+            if audio_bytes is not None:
+                return audio_bytes
+
+        if self.cache is None:
+            return None
+
+        # Disk cache I/O is blocking, keep it off the event loop
+        loop = asyncio.get_event_loop()
+        audio_bytes = await loop.run_in_executor(None, self.cache.get, key)
+
+        if audio_bytes is not None and self.memory_cache is not None:
+            audio_bytes = self.memory_cache.put(key, audio_bytes)
+        return audio_bytes
+
+    async def _cache_put(self, key, audio_bytes):
+        if self.cache is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.cache.put, key, audio_bytes)
+
+        if self.memory_cache is not None:
+            audio_bytes = self.memory_cache.put(key, audio_bytes)
+        return audio_bytes
+
+    async def _process(self, audio_bytes, timing=None):
+        if self.postprocess is None:
+            return audio_bytes
+
+        # Whole clips are converted off the event loop
+        started = time.perf_counter()
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(
+                None, self.postprocess.process, audio_bytes
+            )
+        finally:
+            if timing is not None:
+                timing.process += time.perf_counter() - started
+
+    def _to_numpy(self, audio_bytes):
+        # Post-processed audio may be mu-law or raw, the processor knows how to
+        # read its own output
+        if self.postprocess is not None:
+            return self.postprocess.to_numpy(audio_bytes)
+        return wav.to_numpy(audio_bytes)
+
+    def _stream_processor(self):
+        if self.postprocess is None:
+            return None
+        return self.postprocess.stream()
+
+    async def _deliver_audio(self, audio_bytes, response_format, output_file):
+        if response_format == "numpy":
+            return ApiResult(
+                self._to_numpy(audio_bytes), 200, "Generated audio samples"
+            )
+
+        if response_format == "into":
+            writer = BufferWriter(output_file)
+            try:
+                writer.expect(len(audio_bytes))
+                writer.write(audio_bytes)
+            finally:
+                writer.release()
+            return ApiResult(writer.length, 200, "Generated audio bytes")
+
+        if output_file is not None:
+            async with aiofiles.open(output_file, "wb") as audio_file:
+                await audio_file.write(audio_bytes)
+            return ApiResult(
+                output_file, 200, "Generated audio bytes and saved to file"
+            )
+
+        if response_format == "base64":
+            audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+            return ApiResult(audio_base64, 200, "Generated audio bytes")
+
+        return ApiResult(audio_bytes, 200, "Generated audio bytes")
+
+    async def iter_audio_long(
+        self,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        max_chars=300,
+        concurrency=8,
+        response_format="bytes",
+    ):
+        # Splits long input at sentence boundaries and synthesises the pieces
+        # concurrently, yielding (audio_bytes, status_code, message) per piece in
+        # text order as soon as each one is ready. With response_format="raw"
+        # the pieces are not post-processed.
+        specs = (
+            {
+                "version": version,
+                "model": model,
+                "input": chunk,
+                "voice": voice,
+                "speed": speed,
+                "response_format": response_format,
+                "style": style,
+                "accent": accent,
+            }
+            for chunk in split_sentences(input, max_chars)
+        )
+
+        results = self.generate_audio_many(specs, concurrency=concurrency)
+
+        try:
+            async for index, result in results:
+                yield result
+        finally:
+            # Cancel outstanding pieces right away if the consumer stops early
+            await results.aclose()
+
+    async def generate_audio_long(
+        self,
+        version="v2",
+        model="en",
+        input="",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        output_file=None,
+        max_chars=300,
+        concurrency=8,
+    ):
+        clips = []
+        results = self.iter_audio_long(
+            version=version,
+            model=model,
+            input=input,
+            voice=voice,
+            speed=speed,
+            style=style,
+            accent=accent,
+            max_chars=max_chars,
+            # Clips are post-processed once they are joined
+            response_format="raw",
+            concurrency=concurrency,
+        )
+
+        retries = 0
+
+        try:
+            async for result in results:
+                audio_bytes, status_code, response_message = result
+                retries += getattr(result, "retries", 0)
+
+                if status_code != 200:
+                    return ApiResult(
+                        None, status_code, response_message, retries=retries
+                    )
+                clips.append(audio_bytes)
+        finally:
+            await results.aclose()
+
+        if not clips:
+            return await self.generate_audio(
+                version=version,
+                model=model,
+                input=input,
+                voice=voice,
+                speed=speed,
+                style=style,
+                accent=accent,
+                output_file=output_file,
+            )
+
+        try:
+            audio_bytes = await self._process(wav.concatenate(clips))
+            result = await self._deliver_audio(audio_bytes, "bytes", output_file)
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(*result, retries=retries)
+
+    async def iter_audio_from_text(
+        self,
+        fragments,
+        version="v2",
+        model="en",
+        voice="raw",
+        speed=1.0,
+        style=None,
+        accent=None,
+        max_chars=300,
+        concurrency=8,
+    ):
+        # Synthesises an (async) iterator of text fragments (e.g. LLM tokens)
+        # sentence by sentence. Each sentence is sent as soon as it is complete
+        # while later fragments are still arriving, results are yielded in text
+        # order as (audio_bytes, status_code, message).
+        kwargs = {
+            "version": version,
+            "model": model,
+            "voice": voice,
+            "speed": speed,
+            "response_format": "bytes",
+            "style": style,
+            "accent": accent,
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = asyncio.Queue()
+
+        async def synthesise(sentence):
+            async with semaphore:
+                return await self.generate_audio(input=sentence, **kwargs)
+
+        async def produce():
+            buffer = SentenceBuffer(max_chars)
+            try:
+                async for fragment in self._iterate(fragments):
+                    for sentence in buffer.feed(fragment):
+                        pending.put_nowait(asyncio.ensure_future(synthesise(sentence)))
+
+                for sentence in buffer.flush():
+                    pending.put_nowait(asyncio.ensure_future(synthesise(sentence)))
+
+            except Exception as e:
+                failed = asyncio.get_event_loop().create_future()
+                failed.set_result(self._unexpected_error(e))
+                pending.put_nowait(failed)
+
+            finally:
+                pending.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        outstanding = []
+
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                yield await task
+        finally:
+            producer.cancel()
+            outstanding.append(producer)
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
+                    outstanding.append(task)
+            await asyncio.gather(*outstanding, return_exceptions=True)
+
+    def generate_audio_many(self, specs, concurrency=8, ordered=True, window=None):
+        return self._run_many(self.generate_audio, specs, concurrency, ordered, window)
+
+    def run_many(self, method, specs, concurrency=8, ordered=True, window=None):
+        # Batches any coroutine function like generate_audio_many, every spec
+        # is a dict of its keyword arguments. Exceptions are logged and
+        # reported as a 500 result.
+        return self._run_many(method, specs, concurrency, ordered, window)
+
+    def change_voice_many(self, specs, concurrency=8, ordered=True, window=None):
+        return self._run_many(self.change_voice, specs, concurrency, ordered, window)
+
+    def generate_and_change_voice_many(
+        self,
+        specs,
+        ordered=True,
+        generate_concurrency=4,
+        change_concurrency=4,
+        window=None,
+    ):
+        # Runs generate_audio then change_voice for every spec, a dict with
+        # "generate" (generate_audio kwargs) and "change_voice" (change_voice
+        # kwargs, without the audio). Generated bytes go straight into the
+        # change_voice request, and both stages run at the same time on
+        # different specs, each within its own concurrency limit. Yields
+        # (index, result) with the change_voice result, or the generate_audio
+        # one when it failed.
+        generate_slots = asyncio.Semaphore(generate_concurrency)
+        change_slots = asyncio.Semaphore(change_concurrency)
+
+        async def run(slots, method, kwargs):
+            queued = time.perf_counter()
+
+            async with slots:
+                queue_wait.set(time.perf_counter() - queued)
+                return await method(**kwargs)
+
+        async def convert(generate, change_voice):
+            # The intermediate audio is never post-processed
+            generate = dict(generate, response_format="raw", output_file=None)
+            result = await run(generate_slots, self.generate_audio, generate)
+            audio_bytes, status_code, _ = result
+
+            if status_code != 200:
+                return result
+
+            change_voice = dict(change_voice, audio_data=audio_bytes, encode=True)
+            return await run(change_slots, self.change_voice, change_voice)
+
+        # Specs done generating wait for a change_voice slot, at most one per
+        # slot of each stage is in progress
+        return self._run_many(
+            convert, specs, generate_concurrency + change_concurrency, ordered, window
+        )
+
+    async def generate_audio_stacked(self, specs, concurrency=8, window=None):
+        # Generates a batch of clips and stacks their samples into one array of
+        # shape (clips, frames[, channels]) for vectorised processing. The data
+        # is (samples, sample_rate, lengths), see wav.stack. The first failed
+        # clip fails the whole batch.
+        clips = []
+        specs = (dict(spec, response_format="bytes") for spec in specs)
+        results = self._run_many(self.generate_audio, specs, concurrency, True, window)
+
+        retries = 0
+
+        try:
+            async for index, result in results:
+                audio_bytes, status_code, response_message = result
+                retries += getattr(result, "retries", 0)
+
+                if status_code != 200:
+                    return ApiResult(
+                        None, status_code, response_message, retries=retries
+                    )
+                clips.append(audio_bytes)
+        finally:
+            await results.aclose()
+
+        try:
+            clips = [self._to_numpy(clip) for clip in clips]
+            samples = wav.stack_samples(clips)
+        except Exception as e:
+            return self._unexpected_error(e, retries)
+
+        return ApiResult(samples, 200, "Generated audio samples", retries=retries)
+
+    async def _run_many(self, method, specs, concurrency, ordered, window):
+        # Yields (index, result) pairs. Requests are pulled lazily from any sync or
+        # async iterable of kwargs dicts and at most `concurrency` run at once.
+        # In ordered mode up to `window` finished results are buffered while
+        # waiting on the oldest one.
+        semaphore = asyncio.Semaphore(concurrency)
+        window = max(window or concurrency * 4, concurrency)
+        specs = self._iterate(specs)
+        index = 0
+        exhausted = False
+        pending = collections.deque() if ordered else set()
+
+        async def run(index, spec):
+            queued = time.perf_counter()
+
+            async with semaphore:
+                # Each task runs in its own context, timing hooks report the wait
+                queue_wait.set(time.perf_counter() - queued)
+                try:
+                    return index, await method(**spec)
+                except Exception as e:
+                    self.logger.error(
+                        f" > Batch request {index} failed: {type(e).__name__}: {str(e)}"
+                    )
+                    if self.logger.getEffectiveLevel() == logging.DEBUG:
+                        self.logger.error(traceback.format_exc())
+                    return index, ApiResult(None, 500, "Internal Server Error")
+
+        try:
+            while True:
+                limit = window if ordered else concurrency
+                while not exhausted and len(pending) < limit:
+                    try:
+                        spec = await specs.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(run(index, spec))
+                    if ordered:
+                        pending.append(task)
+                    else:
+                        pending.add(task)
+                    index += 1
+
+                if not pending:
+                    break
+
+                if ordered:
+                    yield await pending[0]
+                    pending.popleft()
+                else:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _iterate(self, items):
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    async def _handle_response(
+        self, response, response_format, output_file, timing=None
+    ):
         status_code = response.status
+        timing = timing or RequestTiming(str(response.url))
 
         if status_code == 200:
 
             if response_format == "url":
-                response_data = await response.json()
+                response_data = await self._read_json(response, timing)
                 file_url = response_data["result"]["data"]["url"]
                 response_message = response_data["result"]["message"]
-                self.logger.debug(f" > Generated audio URL: {file_url}")
+                self.logger.debug(" > Generated audio URL: %s", file_url)
                 return file_url, status_code, response_message
 
-            elif response_format == "bytes" or response_format == "base64":
+            # raw is bytes left unprocessed, for audio that is cached first
+            elif response_format in ("bytes", "base64", "raw"):
 
                 if output_file is not None:
 
-                    if response_format == "base64":
-                        response_data = await response.json()
-                        audio_base64 = response_data["result"]["data"]["audio_data"]
-                        audio_bytes = base64.b64decode(audio_base64)
-                    else:
-                        audio_bytes = await response.read()
+                    # Base64 is decoded to the file while the JSON body arrives
+                    decoder = (
+                        Base64JsonDecoder() if response_format == "base64" else None
+                    )
+                    await self._write_stream(
+                        output_file,
+                        response,
+                        timing=timing,
+                        decoder=decoder,
+                        processor=(
+                            self._stream_processor()
+                            if response_format != "raw"
+                            else None
+                        ),
+                    )
 
-                    async with aiofiles.open(output_file, "wb") as audio_file:
-                        await audio_file.write(audio_bytes)
                     file_size = os.path.getsize(output_file)
                     self.logger.debug(
-                        f" > Finished processing request, saved generated audio bytes: {file_size} < "
+                        " > Finished processing request, saved generated audio bytes: %d < ",
+                        file_size,
                     )
                     return (
                         output_file,
@@ -175,41 +981,293 @@ class OpenVoiceApiClientAsync:
                 else:
 
                     if response_format == "base64":
-                        response_data = await response.json()
+                        response_data = await self._read_json(response, timing)
                         audio_base64 = response_data["result"]["data"]["audio_data"]
                         # audio_bytes = base64.b64decode(audio_base64)
                         audio_bytes = audio_base64
+
+                        if self.postprocess is not None:
+                            audio_bytes = await self._process(
+                                base64.b64decode(audio_base64), timing
+                            )
+                            audio_bytes = base64.b64encode(audio_bytes).decode("utf-8")
                     else:
-                        audio_bytes = await response.read()
+                        audio_bytes = await self._read_content(response, timing)
+
+                        if response_format == "bytes":
+                            audio_bytes = await self._process(audio_bytes, timing)
 
                     self.logger.debug(
-                        f" > Finished processing request, bytes length: {len(audio_bytes)} < "
+                        " > Finished processing request, bytes length: %d < ",
+                        len(audio_bytes),
                     )
                     return audio_bytes, status_code, "Generated audio bytes"
 
+            elif response_format == "numpy":
+                content = await self._process(
+                    await self._read_content(response, timing), timing
+                )
+                started = time.perf_counter()
+                try:
+                    samples = self._to_numpy(content)
+                finally:
+                    timing.decode += time.perf_counter() - started
+                return samples, status_code, "Generated audio samples"
+
+            elif response_format == "into":
+                if self.postprocess is not None:
+                    content = await self._process(
+                        await self._read_content(response, timing), timing
+                    )
+                    return await self._deliver_audio(content, "into", output_file)
+
+                length = await self._read_into(output_file, response, timing)
+                self.logger.debug(
+                    " > Finished processing request, bytes length: %d < ", length
+                )
+                return length, status_code, "Generated audio bytes"
+
             elif response_format == "stream":
                 return response, status_code, "Generated audio stream"
 
         else:
-            response_data = await response.json()
-            response_message = response_data["data"]["message"]
+            response_data = await self._read_json(response, timing)
+            response_message = response_data["result"]["message"]
             self.logger.error(
                 f" > Failed to generate audio. Response status code: {status_code}, Response message: {response_message}"
             )
             return None, status_code, response_message
 
-    async def async_stream_generator(self, output_file, response):
-        self.logger.debug(" > Starting streaming and writing to file...")
+    async def _read_content(self, response, timing):
+        started = time.perf_counter()
+        content = await response.read()
+        timing.transfer += time.perf_counter() - started
+        timing.bytes_in += len(content)
+        return content
+
+    async def _read_into(self, buffer, response, timing):
+        # Chunks are copied into the caller's buffer as they arrive, the body
+        # is never assembled into a bytes object of its own
+        writer = BufferWriter(buffer)
+        started = time.perf_counter()
+
         try:
-            async with aiofiles.open(output_file, "wb") as audio_file:
-                while True:
-                    chunk = await response.content.read(1024)
-                    if not chunk:
-                        break
+            # Compressed bodies decode to more than their Content-Length
+            if response.content_length and "Content-Encoding" not in response.headers:
+                writer.expect(response.content_length)
+
+            async for chunk in response.content.iter_any():
+                writer.write(chunk)
+        finally:
+            writer.release()
+            timing.transfer += time.perf_counter() - started
+            timing.bytes_in += writer.length
+
+        return writer.length
+
+    async def _read_json(self, response, timing):
+        # Read and parsed separately so both steps are timed
+        content = await self._read_content(response, timing)
+        started = time.perf_counter()
+        try:
+            return self.serializer.loads(content)
+        finally:
+            timing.decode += time.perf_counter() - started
+
+    async def _write_stream(
+        self,
+        output_file,
+        response,
+        chunk_size=None,
+        timing=None,
+        decoder=None,
+        processor=None,
+    ):
+        # With a decoder, chunks of the body are decoded before being written,
+        # then converted by a processor
+        timing = timing or RequestTiming(str(response.url))
+
+        # aiohttp keeps filling its read buffer while a chunk is being written
+        async with aiofiles.open(output_file, "wb") as audio_file:
+            chunks = response.content.iter_chunked(chunk_size or self.chunk_size)
+            started = time.perf_counter()
+
+            async for chunk in chunks:
+                received = time.perf_counter()
+                timing.transfer += received - started
+                timing.bytes_in += len(chunk)
+
+                if decoder is not None:
+                    chunk = decoder.feed(chunk)
+                    timing.decode += time.perf_counter() - received
+
+                if processor is not None and chunk:
+                    processed = time.perf_counter()
+                    chunk = processor.feed(chunk)
+                    timing.process += time.perf_counter() - processed
+
+                written = time.perf_counter()
+
+                if chunk:
                     await audio_file.write(chunk)
+
+                started = time.perf_counter()
+                timing.file_write += started - written
+
+            timing.transfer += time.perf_counter() - started
+
+            if processor is not None:
+                await audio_file.write(processor.close())
+                # Files get the real sizes once the length is known
+                await audio_file.seek(0)
+                await audio_file.write(processor.header())
+
+        if decoder is not None:
+            decoder.close()
+
+    async def async_stream_generator(self, output_file, response, chunk_size=None):
+        self.logger.debug(" > Starting streaming and writing to file...")
+        try:
+            await self._write_stream(
+                output_file, response, chunk_size, processor=self._stream_processor()
+            )
         except Exception as e:
             self.logger.error(f"Error during streaming: {e}")
             if self.logger.getEffectiveLevel() == logging.DEBUG:
                 self.logger.error(traceback.format_exc())
         else:
             self.logger.debug(" > Streaming and writing completed.")
+        finally:
+            # Hand the connection back to the shared pool
+            response.release()
+
+
+class AudioStream:
+    # Async iterable over generated audio chunks. The connection is opened when
+    # iteration starts and released when it ends or is cancelled. A loop that is
+    # broken out of is only finalised later by the event loop, use the stream
+    # as an async context manager or call aclose() to release it right away.
+    # Status, message and timings are available once iteration starts.
+
+    def __init__(self, client, path, payload, chunk_size):
+        self.client = client
+        self.path = path
+        # Set to the endpoint chosen once iteration starts
+        self.url = None
+        self.payload = payload
+        self.chunk_size = chunk_size
+        self.status_code = None
+        self.message = None
+        self.time_to_first_chunk = None
+        self.elapsed = None
+        self.bytes_received = 0
+        self.timing = None
+        self._iterator = None
+
+    def __aiter__(self):
+        self._iterator = self._iterate()
+        return self._iterator
+
+    async def aclose(self):
+        # Stops the iteration in progress and releases its connection
+        iterator, self._iterator = self._iterator, None
+
+        if iterator is not None:
+            await iterator.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _iterate(self):
+        logger = self.client.logger
+        started = time.perf_counter()
+        endpoint = self.client.endpoints.acquire()
+        self.url = endpoint.url + self.path
+        timing = self.timing = RequestTiming(self.url)
+        responded = None
+        healthy = False
+
+        try:
+            logger.debug(
+                " > Starting request:\n%s\nparams:\n %s",
+                self.url,
+                LazyJson(self.payload),
+            )
+            session = self.client._get_session()
+
+            async with session.post(
+                self.url,
+                trace_request_ctx=timing,
+                **self.client._body_kwargs(self.payload),
+            ) as response:
+                responded = timing.headers_received() - timing.started
+                self.status_code = timing.status_code = response.status
+                healthy = response.status < 500
+
+                if response.status != 200:
+                    response_data = self.client.serializer.loads(await response.read())
+                    self.message = response_data["result"]["message"]
+                    logger.error(
+                        f" > Failed to generate audio. Response status code: {self.status_code}, Response message: {self.message}"
+                    )
+                    return
+
+                self.message = "Generated audio stream"
+
+                # Chunks are converted as they arrive, a few samples may be held
+                # back by the resampler until the next one
+                processor = self.client._stream_processor()
+                chunks = response.content.iter_chunked(self.chunk_size)
+                received = time.perf_counter()
+
+                # Only the time spent waiting on the network counts as transfer,
+                # not the time the consumer holds each chunk
+                async for chunk in chunks:
+                    timing.transfer += time.perf_counter() - received
+                    timing.bytes_in += len(chunk)
+
+                    if self.time_to_first_chunk is None:
+                        self.time_to_first_chunk = time.perf_counter() - started
+                        logger.debug(
+                            " > First audio chunk after %.3fs < ",
+                            self.time_to_first_chunk,
+                        )
+                    self.bytes_received += len(chunk)
+
+                    if processor is not None:
+                        processed = time.perf_counter()
+                        chunk = processor.feed(chunk)
+                        timing.process += time.perf_counter() - processed
+
+                    if chunk:
+                        yield chunk
+                    received = time.perf_counter()
+
+                if processor is not None:
+                    chunk = processor.close()
+
+                    if chunk:
+                        yield chunk
+
+        except Exception as e:
+            self.status_code = 500
+            self.message = "Internal Server Error"
+            timing.error = f"{type(e).__name__}: {str(e)}"
+            healthy = healthy and not isinstance(e, TRANSIENT_ERRORS)
+            logger.error(
+                f" > An unexpected error occurred: {type(e).__name__}: {str(e)}"
+            )
+            if logger.getEffectiveLevel() == logging.DEBUG:
+                logger.error(traceback.format_exc())
+
+        finally:
+            self.elapsed = time.perf_counter() - started
+            timing.finish()
+            # Latency is sampled up to the headers, the rest depends on the reader
+            self.client.endpoints.release(endpoint, responded or self.elapsed, healthy)
+
+            if self.client.hooks:
+                emit(self.client.hooks, timing)
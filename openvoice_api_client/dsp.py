@@ -0,0 +1,305 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Audio post-processing requires numpy") from None
+
+from . import wav
+
+# G.711 and 16 bit PCM, as WAV files or raw sample data
+ENCODINGS = ("mulaw", "pcm16")
+CONTAINERS = ("wav", "raw")
+# RIFF and data sizes of WAVs streamed before their length is known
+STREAM_SIZE = 0xFFFFFFFF
+# How much of a stream is buffered while looking for the WAV data chunk
+MAX_HEADER = 64 * 1024
+
+_mulaw_table = None
+_mulaw_decode_table = None
+
+
+class Resampler:
+    # Band limited resampling between any two rates with a Kaiser windowed sinc
+    # filter. Every output sample is computed as one dot product over whole
+    # arrays, fed in chunks it gives exactly the same samples as in one go.
+
+    def __init__(self, from_rate, to_rate, zero_crossings=16, rolloff=0.95):
+        divisor = math.gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        # Below the Nyquist frequency of the lower of both rates
+        cutoff = min(1.0, self.up / self.down) * rolloff
+        self.half = int(math.ceil(zero_crossings / cutoff))
+
+        # One filter per output phase, taps over the input samples around it
+        offsets = np.arange(-self.half + 1, self.half + 1)
+        distance = np.arange(self.up)[:, None] / self.up - offsets[None, :]
+        window = np.i0(8.6 * np.sqrt(np.clip(1 - (distance / self.half) ** 2, 0, 1)))
+        filters = cutoff * np.sinc(cutoff * distance) * window / np.i0(8.6)
+        self.filters = filters / filters.sum(axis=1, keepdims=True)
+
+        # Silence before the first sample, then input not used up yet
+        self.buffer = np.zeros(self.half - 1)
+        self.base = -(self.half - 1)
+        self.produced = 0
+        self.consumed = 0
+
+    def feed(self, samples):
+        if self.up == self.down:
+            return samples
+
+        self.consumed += len(samples)
+        self.buffer = np.concatenate((self.buffer, samples))
+        # Outputs whose taps are all available
+        last = self.base + len(self.buffer) - 1 - self.half
+        return self._run((last + 1) * self.up - 1)
+
+    def flush(self):
+        # Pads the end with silence and returns the remaining samples
+        if self.up == self.down:
+            return np.zeros(0)
+
+        self.buffer = np.concatenate((self.buffer, np.zeros(self.half)))
+        total = -(-self.consumed * self.up // self.down)
+        return self._run(total * self.down - 1)
+
+    def _run(self, limit):
+        # limit // down is the last output index that can be computed
+        count = limit // self.down + 1 - self.produced
+
+        if count <= 0:
+            return np.zeros(0)
+
+        taps = self.filters.shape[1]
+        windows = np.lib.stride_tricks.sliding_window_view(self.buffer, taps)
+        output = np.empty(count)
+
+        # Blocks bound the memory taken by the gathered windows
+        for start in range(0, count, 4096):
+            index = np.arange(start, min(start + 4096, count)) + self.produced
+            position = index * self.down // self.up
+            phase = index * self.down % self.up
+            gathered = windows[position - self.half + 1 - self.base]
+            output[start : start + len(index)] = np.einsum(
+                "ij,ij->i", gathered, self.filters[phase]
+            )
+
+        self.produced += count
+        # Keep the input the next output still needs
+        keep = self.produced * self.down // self.up - self.half + 1 - self.base
+        self.buffer = self.buffer[keep:]
+        self.base += keep
+        return output
+
+
+def rms_gain(samples, target_dbfs, peak=1.0):
+    # Gain bringing the RMS level of samples to target_dbfs, lowered so the
+    # loudest sample stays below peak. Silence is left as it is.
+    if not len(samples):
+        return 1.0
+    rms = np.sqrt(np.mean(np.square(samples)))
+
+    if rms == 0:
+        return 1.0
+    gain = 10 ** (target_dbfs / 20) / rms
+    return min(gain, peak / np.max(np.abs(samples)))
+
+
+def to_float(samples):
+    # Integer PCM to floats in [-1, 1), 8 bit PCM is unsigned
+    if samples.dtype.kind == "f":
+        return samples.astype(np.float64)
+    if samples.dtype.kind == "u":
+        return (samples.astype(np.float64) - 128) / 128
+    return samples.astype(np.float64) / (1 << (8 * samples.dtype.itemsize - 1))
+
+
+def to_pcm16(samples):
+    return np.clip(np.rint(samples * 32768), -32768, 32767).astype("<i2")
+
+
+def mulaw_encode(samples):
+    # G.711 mu-law of 16 bit samples through a table of all 65536 values
+    global _mulaw_table
+
+    if _mulaw_table is None:
+        value = np.arange(-32768, 32768)
+        sign = np.where(value < 0, 0x80, 0)
+        magnitude = np.minimum(np.abs(value), 32635) + 0x84
+        exponent = np.floor(np.log2(magnitude)).astype(np.int64) - 7
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        _mulaw_table = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+    return _mulaw_table[samples.astype(np.int64) + 32768]
+
+
+def mulaw_decode(codes):
+    # G.711 mu-law bytes back to 16 bit samples through a table of all 256 codes
+    global _mulaw_decode_table
+
+    if _mulaw_decode_table is None:
+        value = ~np.arange(256) & 0xFF
+        exponent = (value >> 4) & 0x07
+        magnitude = (((value & 0x0F) << 3) + 0x84 << exponent) - 0x84
+        _mulaw_decode_table = np.where(value & 0x80, -magnitude, magnitude).astype(
+            "<i2"
+        )
+
+    return _mulaw_decode_table[np.asarray(codes, dtype=np.uint8)]
+
+
+class PostProcessor:
+    # Converts generated audio for telephony: downmix to mono, resample to
+    # sample_rate, normalise to an RMS level of loudness dBFS (None to keep the
+    # level) and encode as G.711 mu-law or 16 bit PCM, in a WAV or raw.
+
+    def __init__(
+        self, sample_rate=8000, encoding="mulaw", loudness=-20.0, container="wav"
+    ):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        if container not in CONTAINERS:
+            raise ValueError(f"Unknown container: {container}")
+
+        self.sample_rate = sample_rate
+        self.encoding = encoding
+        self.loudness = loudness
+        self.container = container
+
+    @property
+    def key(self):
+        # Identifies the output for caching, changes with any setting
+        return f"{self.encoding}/{self.sample_rate}/{self.loudness}/{self.container}"
+
+    def process(self, audio):
+        # Whole WAV in, whole output out, normalised on the level of the clip
+        samples, sample_rate = wav.to_numpy(audio)
+        resampler = Resampler(sample_rate, self.sample_rate)
+        samples = _mono(to_float(samples))
+        samples = np.concatenate((resampler.feed(samples), resampler.flush()))
+
+        if self.loudness is not None:
+            samples = samples * rms_gain(samples, self.loudness)
+        return self._header(len(samples)) + self._encode(samples)
+
+    def stream(self):
+        return StreamProcessor(self)
+
+    def to_numpy(self, audio):
+        # Output of process as (samples, sample_rate) of 16 bit samples, raw
+        # outputs carry no header and are read with the settings of self
+        if self.container == "wav":
+            return wav.to_numpy(audio)
+
+        if self.encoding == "mulaw":
+            return mulaw_decode(np.frombuffer(audio, np.uint8)), self.sample_rate
+        return np.frombuffer(audio, "<i2"), self.sample_rate
+
+    def _encode(self, samples):
+        pcm = to_pcm16(samples)
+
+        if self.encoding == "mulaw":
+            return mulaw_encode(pcm).tobytes()
+        return pcm.tobytes()
+
+    def _header(self, frames):
+        if self.container == "raw":
+            return b""
+
+        if self.encoding == "mulaw":
+            info = wav.WavInfo(wav._MULAW_FORMAT, 1, self.sample_rate, 8, 1, 44, 0)
+        else:
+            info = wav.WavInfo(1, 1, self.sample_rate, 16, 2, 44, 0)
+
+        if frames is None:
+            return wav.build_header(info, STREAM_SIZE)
+        return wav.build_header(info, frames * info.block_align)
+
+
+class StreamProcessor:
+    # Chunk by chunk version of PostProcessor.process for streamed WAVs. The
+    # output starts with a WAV header of unknown size, header() gives the final
+    # one for outputs that can be rewritten. Loudness follows the level of the
+    # audio received so far.
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.info = None
+        self.dtype = None
+        self.resampler = None
+        self.frames = 0
+        self._pending = b""
+        self._energy = 0.0
+        self._count = 0
+        self._peak = 0.0
+
+    def feed(self, chunk):
+        data = self._pending + bytes(chunk)
+        header = b""
+
+        if self.info is None:
+            try:
+                self.info = wav.parse_header(data)
+            except ValueError:
+                if not _incomplete(data):
+                    raise
+                self._pending = data
+                return b""
+
+            self.dtype = np.dtype(wav._sample_dtype(self.info))
+            self.resampler = Resampler(
+                self.info.sample_rate, self.processor.sample_rate
+            )
+            data = data[self.info.data_offset :]
+            header = self.processor._header(None)
+
+        # Only whole frames are decoded, the rest waits for the next chunk
+        cut = len(data) - len(data) % self.info.block_align
+        self._pending = data[cut:]
+        samples = np.frombuffer(
+            data, dtype=self.dtype, count=cut // self.dtype.itemsize
+        )
+
+        if self.info.channels > 1:
+            samples = samples.reshape(-1, self.info.channels)
+        return header + self._output(self.resampler.feed(_mono(to_float(samples))))
+
+    def close(self):
+        # Returns the end of the output, raises for a stream that ended early
+        if self.info is None:
+            raise ValueError("Stream ended before the WAV data chunk")
+        return self._output(self.resampler.flush())
+
+    def header(self):
+        return self.processor._header(self.frames)
+
+    def _output(self, samples):
+        self.frames += len(samples)
+
+        if self.processor.loudness is not None and len(samples):
+            self._energy += float(np.sum(np.square(samples)))
+            self._count += len(samples)
+            self._peak = max(self._peak, float(np.max(np.abs(samples))))
+
+            if self._energy:
+                rms = math.sqrt(self._energy / self._count)
+                gain = 10 ** (self.processor.loudness / 20) / rms
+                samples = samples * min(gain, 1.0 / self._peak)
+
+        return self.processor._encode(samples)
+
+
+def _incomplete(data):
+    # Whether data may still turn into a WAV header with more of the stream
+    return (
+        len(data) < MAX_HEADER
+        and b"RIFF".startswith(data[:4])
+        and b"WAVE".startswith(data[8:12])
+    )
+
+
+def _mono(samples):
+    if samples.ndim > 1:
+        return samples.mean(axis=1)
+    return samples
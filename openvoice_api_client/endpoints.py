@@ -0,0 +1,224 @@
+import logging
+import asyncio
+import random
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        # Requests currently in flight
+        self.outstanding = 0
+        # Moving average of the request duration in seconds, None until measured
+        self.latency = None
+        # Consecutive failures and ejection state
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+    def __repr__(self):
+        return f"Endpoint({self.url!r}, outstanding={self.outstanding}, latency={self.latency})"
+
+
+class EndpointPool:
+    # Spreads requests over several API servers. Each request goes to the
+    # available endpoint with the fewest requests in flight, weighted by its
+    # average latency, so slower nodes get proportionally less traffic.
+    #
+    # max_failures      consecutive failures (connection errors or 5xx) that
+    #                   eject an endpoint
+    # eject_time        first ejection in seconds, doubled on every ejection in
+    #                   a row up to max_eject_time
+    # decay             weight of the newest sample in the latency average
+    # probe_interval    seconds between active health checks, None to rely only
+    #                   on the outcome of real requests
+    # probe_path        route probed with a GET, any answer below 500 means the
+    #                   server is up
+
+    def __init__(
+        self,
+        urls,
+        max_failures=3,
+        eject_time=10.0,
+        max_eject_time=300.0,
+        decay=0.3,
+        probe_interval=None,
+        probe_timeout=2.0,
+        probe_path="/v2/generate-audio",
+    ):
+        if isinstance(urls, str):
+            urls = [urls]
+
+        self.endpoints = [Endpoint(url) for url in urls]
+
+        if not self.endpoints:
+            raise ValueError("EndpointPool needs at least one URL")
+
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self.decay = decay
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe_path = probe_path
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self._probe_stop = None
+        # Clients sharing the pool, the probe thread runs while there are any
+        self._probe_owners = 0
+
+    def acquire(self):
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.available(now)]
+
+            if not candidates:
+                # Every node is ejected, fail open on the one back soonest
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+
+            measured = [e.latency for e in candidates if e.latency is not None]
+            # Unmeasured endpoints are assumed to be as fast as the average
+            default = sum(measured) / len(measured) if measured else 1.0
+            scores = [
+                (e.outstanding + 1) * (e.latency if e.latency is not None else default)
+                for e in candidates
+            ]
+            lowest = min(scores)
+            # Ties are broken at random so idle nodes share the first requests
+            best = random.choice(
+                [e for e, score in zip(candidates, scores) if score == lowest]
+            )
+            best.outstanding += 1
+            return best
+
+    def release(self, endpoint, elapsed, ok):
+        with self._lock:
+            endpoint.outstanding -= 1
+
+            if ok:
+                endpoint.failures = 0
+                endpoint.ejections = 0
+
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency += self.decay * (elapsed - endpoint.latency)
+                return
+
+            endpoint.failures += 1
+
+            if endpoint.failures >= self.max_failures:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint):
+        duration = min(self.eject_time * 2**endpoint.ejections, self.max_eject_time)
+        endpoint.ejected_until = time.monotonic() + duration
+        endpoint.ejections += 1
+        endpoint.failures = 0
+        logger.warning(f" > Ejected endpoint {endpoint.url} for {duration:.1f}s < ")
+
+    def _probed(self, endpoint, healthy):
+        with self._lock:
+            if healthy:
+                if endpoint.ejected_until:
+                    logger.info(f" > Endpoint {endpoint.url} is healthy again < ")
+                endpoint.ejected_until = 0.0
+                endpoint.failures = 0
+            elif endpoint.available(time.monotonic()):
+                self._eject(endpoint)
+
+    def probe(self, session=None):
+        # One round of health checks with requests
+        session = session or requests
+        for endpoint in self.endpoints:
+            try:
+                response = session.get(
+                    endpoint.url + self.probe_path, timeout=self.probe_timeout
+                )
+                response.close()
+                healthy = response.status_code < 500
+            except Exception as e:
+                logger.debug(" > Probe of %s failed: %s < ", endpoint.url, e)
+                healthy = False
+            self._probed(endpoint, healthy)
+
+    async def probe_async(self, session):
+        # One round of health checks with an aiohttp session
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+
+        async def check(endpoint):
+            try:
+                async with session.get(
+                    endpoint.url + self.probe_path, timeout=timeout
+                ) as response:
+                    healthy = response.status < 500
+            except Exception as e:
+                logger.debug(" > Probe of %s failed: %s < ", endpoint.url, e)
+                healthy = False
+            self._probed(endpoint, healthy)
+
+        await asyncio.gather(*(check(endpoint) for endpoint in self.endpoints))
+
+    def start_probing(self):
+        # Background thread probing every probe_interval seconds. One thread
+        # serves every sync and async client of the pool, each start_probing
+        # is paired with a stop_probing and the last one stops the thread.
+        with self._lock:
+            self._probe_owners += 1
+
+            if self.probe_interval is None or self._probe_thread is not None:
+                return
+
+            # Every thread has its own stop event, a restart never revives a
+            # thread that is still shutting down
+            self._probe_stop = threading.Event()
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop,
+                args=(self._probe_stop,),
+                name="openvoice-api-client-probe",
+                daemon=True,
+            )
+            self._probe_thread.start()
+
+    def _probe_loop(self, stop):
+        with requests.Session() as session:
+            while not stop.wait(self.probe_interval):
+                self.probe(session)
+
+    def stop_probing(self):
+        with self._lock:
+            if self._probe_owners == 0:
+                return
+
+            self._probe_owners -= 1
+
+            if self._probe_owners or self._probe_thread is None:
+                return
+            thread, self._probe_thread = self._probe_thread, None
+
+        self._probe_stop.set()
+        thread.join()
+
+    def stats(self):
+        now = time.monotonic()
+
+        with self._lock:
+            return [
+                {
+                    "url": e.url,
+                    "outstanding": e.outstanding,
+                    "latency": e.latency,
+                    "available": e.available(now),
+                }
+                for e in self.endpoints
+            ]
@@ -0,0 +1,214 @@
+import logging
+import contextvars
+import time
+import traceback
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Record of the request running in the current thread or task
+current_timing = contextvars.ContextVar("current_timing", default=None)
+# Time the current call waited in a batch queue before it started
+queue_wait = contextvars.ContextVar("queue_wait", default=0.0)
+
+
+class RequestTiming:
+    # Timings of a single HTTP call, durations are in seconds:
+    #   url         the endpoint called
+    #   attempt     0 for the first attempt, then the retry number
+    #   queue_wait  waiting for a batch slot or pool worker
+    #   acquire     waiting for a free pooled connection
+    #   connect     opening a new connection (0 when one was reused)
+    #   send        writing the request
+    #   ttfb        request sent until response headers received
+    #   transfer    reading the response body
+    #   decode      parsing JSON and decoding base64
+    #   process     post-processing audio (resampling, normalising, encoding)
+    #   file_write  writing audio to output files
+    #   total       the whole call
+
+    __slots__ = (
+        "url",
+        "attempt",
+        "status_code",
+        "queue_wait",
+        "acquire",
+        "connect",
+        "send",
+        "ttfb",
+        "transfer",
+        "decode",
+        "process",
+        "file_write",
+        "total",
+        "bytes_in",
+        "bytes_out",
+        "error",
+        "started",
+        "ready",
+        "sent",
+    )
+
+    def __init__(self, url):
+        self.url = url
+        self.attempt = 0
+        self.status_code = None
+        self.queue_wait = queue_wait.get()
+        self.acquire = 0.0
+        self.connect = 0.0
+        self.send = 0.0
+        self.ttfb = 0.0
+        self.transfer = 0.0
+        self.decode = 0.0
+        self.process = 0.0
+        self.file_write = 0.0
+        self.total = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.error = None
+        self.started = time.perf_counter()
+        self.ready = None
+        self.sent = None
+
+    def headers_received(self):
+        now = time.perf_counter()
+        self.ttfb = now - (self.sent or self.ready or self.started)
+        return now
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in ("started", "ready", "sent")
+        }
+
+
+def emit(hooks, timing):
+    for hook in hooks:
+        try:
+            hook(timing)
+        except Exception as e:
+            logger.error(f" > Timing hook failed: {type(e).__name__}: {str(e)} < ")
+            if logger.getEffectiveLevel() == logging.DEBUG:
+                logger.error(traceback.format_exc())
+
+
+class _TimedConnectionMixin:
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            timing = current_timing.get()
+            if timing is not None:
+                timing.connect += time.perf_counter() - started
+
+    def request(self, method, url, body=None, headers=None, *args, **kwargs):
+        timing = current_timing.get()
+
+        if timing is None:
+            return super().request(method, url, body, headers, *args, **kwargs)
+
+        started = time.perf_counter()
+        connect = timing.connect
+        timing.ready = started
+        super().request(method, url, body, headers, *args, **kwargs)
+        timing.sent = time.perf_counter()
+        # Plain HTTP connections are opened lazily while sending
+        timing.send += timing.sent - started - (timing.connect - connect)
+        timing.bytes_out += int((headers or {}).get("Content-Length", 0))
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedPoolMixin:
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            timing = current_timing.get()
+            if timing is not None:
+                timing.acquire += time.perf_counter() - started
+
+
+class _TimedHTTPConnectionPool(_TimedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(_TimedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    # requests counterpart of aiohttp's TraceConfig, pools and connections
+    # report into the record of the request being sent
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def trace_config():
+    import aiohttp
+
+    config = aiohttp.TraceConfig()
+
+    # Requests sent without a record in trace_request_ctx are ignored
+
+    async def on_connection_queued_start(session, context, params):
+        context.queued = time.perf_counter()
+
+    async def on_connection_queued_end(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.acquire += time.perf_counter() - context.queued
+
+    async def on_connection_create_start(session, context, params):
+        context.connecting = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.ready = time.perf_counter()
+            timing.connect += timing.ready - context.connecting
+
+    async def on_connection_reuseconn(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.ready = time.perf_counter()
+
+    async def on_request_headers_sent(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.sent = time.perf_counter()
+            timing.send = timing.sent - (timing.ready or timing.started)
+
+    async def on_request_chunk_sent(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.sent = time.perf_counter()
+            timing.send = timing.sent - (timing.ready or timing.started)
+            timing.bytes_out += len(params.chunk)
+
+    config.on_connection_queued_start.append(on_connection_queued_start)
+    config.on_connection_queued_end.append(on_connection_queued_end)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_connection_reuseconn.append(on_connection_reuseconn)
+    config.on_request_headers_sent.append(on_request_headers_sent)
+    config.on_request_chunk_sent.append(on_request_chunk_sent)
+    return config
@@ -0,0 +1,272 @@
+import collections
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Client methods a job can call, with their keyword arguments as the spec
+METHODS = ("generate_audio", "change_voice")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    method TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    status_code INTEGER,
+    message TEXT,
+    result TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+def job_key(method, spec):
+    # Identical requests are one job, adding a corpus twice does not repeat it
+    data = json.dumps(
+        [method, spec], sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class JobProgress:
+    # Counts of the whole queue and the rate of the current run. The rate is
+    # measured over the last `window` seconds, the ETA assumes it holds for
+    # the remaining jobs (None until something has finished).
+
+    def __init__(self, total, done, failed, window=60.0):
+        self.total = total
+        self.done = done
+        self.failed = failed
+        self.completed = 0
+        self.started = time.perf_counter()
+        self.window = window
+        self._samples = collections.deque([(self.started, 0)])
+
+    @property
+    def pending(self):
+        return self.total - self.done - self.failed
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        now = time.perf_counter()
+        started, completed = self._samples[0]
+
+        if now <= started:
+            return 0.0
+        return (self.completed - completed) / (now - started)
+
+    @property
+    def eta(self):
+        rate = self.rate
+        return self.pending / rate if rate else None
+
+    def record(self, done, failed):
+        now = time.perf_counter()
+        self.done += done
+        self.failed += failed
+        self.completed += done + failed
+        self._samples.append((now, self.completed))
+
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "pending": self.pending,
+            "elapsed": self.elapsed,
+            "rate": self.rate,
+            "eta": self.eta,
+        }
+
+
+class JobQueue:
+    # Durable bulk synthesis on top of OpenVoiceApiClientAsync. Request specs
+    # and their states are kept in a SQLite database, so a run that stops for
+    # any reason resumes with the jobs that had not finished. Finished jobs are
+    # committed in batches, at most `commit_every` jobs or `commit_interval`
+    # seconds of work are redone after a crash. Jobs should write their audio
+    # to output_file or return urls, string results are stored with the job.
+
+    def __init__(
+        self,
+        client,
+        path,
+        concurrency=8,
+        commit_every=500,
+        commit_interval=5.0,
+        page_size=1000,
+    ):
+        self.client = client
+        self.path = path
+        self.concurrency = concurrency
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.page_size = page_size
+        self.progress = None
+        self._db = sqlite3.connect(path)
+        # Commits of the write ahead log only sync at checkpoints
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def add(self, specs, method="generate_audio"):
+        # Adds an iterable of kwargs dicts for `method`, returns the number of
+        # new jobs. Specs already in the queue are skipped.
+        if method not in METHODS:
+            raise ValueError(f"Unknown job method: {method}")
+
+        added = 0
+        rows = []
+
+        for spec in specs:
+            rows.append((job_key(method, spec), method, json.dumps(spec)))
+
+            if len(rows) >= self.page_size:
+                added += self._insert(rows)
+                rows = []
+
+        if rows:
+            added += self._insert(rows)
+        return added
+
+    def _insert(self, rows):
+        with self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (key, method, spec) VALUES (?, ?, ?)",
+                rows,
+            )
+            return self._db.total_changes - before
+
+    def counts(self):
+        rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        counts = {"pending": 0, "done": 0, "failed": 0}
+        counts.update(rows)
+        return counts
+
+    def retry_failed(self):
+        with self._db:
+            return self._db.execute(
+                "UPDATE jobs SET state = 'pending' WHERE state = 'failed'"
+            ).rowcount
+
+    def results(self, state="done"):
+        # Yields (id, spec, status_code, message, result) of jobs in `state`
+        rows = self._db.execute(
+            "SELECT id, spec, status_code, message, result FROM jobs"
+            " WHERE state = ? ORDER BY id",
+            (state,),
+        )
+        for job_id, spec, status_code, message, result in rows:
+            yield job_id, json.loads(spec), status_code, message, result
+
+    async def run(self, progress=None):
+        # Runs every pending job, calls progress(JobProgress) after each batch
+        # is committed and returns the final JobProgress
+        counts = self.counts()
+        self.progress = JobProgress(
+            sum(counts.values()), counts["done"], counts["failed"]
+        )
+        finished = []
+        committed = time.perf_counter()
+
+        try:
+            async for _, (job_id, result) in self.client.run_many(
+                self._execute,
+                self._pending(),
+                concurrency=self.concurrency,
+                ordered=False,
+            ):
+                finished.append((job_id, result))
+
+                if (
+                    len(finished) >= self.commit_every
+                    or time.perf_counter() - committed >= self.commit_interval
+                ):
+                    self._commit(finished, progress)
+                    finished = []
+                    committed = time.perf_counter()
+        finally:
+            # Stopped runs keep whatever finished before
+            self._commit(finished, progress)
+
+        return self.progress
+
+    async def _pending(self):
+        # Pages through pending jobs by id, jobs finished meanwhile are no
+        # longer pending but are never fetched twice either
+        last = 0
+
+        while True:
+            rows = self._db.execute(
+                "SELECT id, method, spec FROM jobs"
+                " WHERE state = 'pending' AND id > ? ORDER BY id LIMIT ?",
+                (last, self.page_size),
+            ).fetchall()
+
+            if not rows:
+                return
+
+            for job_id, method, spec in rows:
+                yield {"job_id": job_id, "method": method, "spec": json.loads(spec)}
+            last = rows[-1][0]
+
+    async def _execute(self, job_id, method, spec):
+        try:
+            return job_id, await getattr(self.client, method)(**spec)
+        except Exception as e:
+            logger.error(f" > Job {job_id} failed: {type(e).__name__}: {str(e)} < ")
+            return job_id, (None, 500, "Internal Server Error")
+
+    def _commit(self, finished, progress):
+        if not finished:
+            return
+
+        now = time.time()
+        rows = []
+
+        for job_id, (data, status_code, message) in finished:
+            state = "done" if status_code == 200 else "failed"
+            result = data if isinstance(data, str) else None
+            rows.append((state, status_code, message, result, now, job_id))
+
+        with self._db:
+            self._db.executemany(
+                "UPDATE jobs SET state = ?, status_code = ?, message = ?,"
+                " result = ?, updated = ? WHERE id = ?",
+                rows,
+            )
+
+        failed = sum(1 for row in rows if row[0] == "failed")
+        self.progress.record(len(rows) - failed, failed)
+        eta = self.progress.eta
+        logger.info(
+            f" > Jobs: {self.progress.done}/{self.progress.total} done,"
+            f" {self.progress.failed} failed, {self.progress.rate:.1f}/s,"
+            f" ETA {'-' if eta is None else f'{eta:.0f}s'} < "
+        )
+
+        if progress is not None:
+            progress(self.progress)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
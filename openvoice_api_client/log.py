@@ -0,0 +1,60 @@
+import json
+import logging
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def configure_logger(logger, log_level=None, log_format=None):
+    if log_level:
+        logger.setLevel(log_level)
+    else:
+        # Use the application's default logging level if custom level is not provided
+        app_log_level = logging.getLogger().getEffectiveLevel()
+        logger.setLevel(app_log_level)
+
+    # Clients share their module logger, it gets a single handler no matter
+    # how many clients are created
+    handler = None
+
+    for existing in logger.handlers:
+        if getattr(existing, "_openvoice_api_client", False):
+            handler = existing
+            break
+
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setLevel(logging.DEBUG)
+        handler._openvoice_api_client = True
+        logger.addHandler(handler)
+
+    if log_format or handler.formatter is None:
+        handler.setFormatter(logging.Formatter(log_format or DEFAULT_FORMAT))
+
+    return handler
+
+
+def truncate(data, max_length=64):
+    # Shortens long strings (base64 audio) and replaces binary values by their size
+    if isinstance(data, dict):
+        return {key: truncate(value, max_length) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [truncate(value, max_length) for value in data]
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return f"<{len(data)} bytes>"
+    if isinstance(data, str) and len(data) > max_length:
+        return f"{data[:max_length]}...<{len(data)} chars>"
+    return data
+
+
+class LazyJson:
+    # Log argument serialised only when the record is actually emitted:
+    # logger.debug("params: %s", LazyJson(payload))
+
+    __slots__ = ("data", "max_length")
+
+    def __init__(self, data, max_length=64):
+        self.data = data
+        self.max_length = max_length
+
+    def __str__(self):
+        return json.dumps(truncate(self.data, self.max_length), indent=4, default=str)
@@ -0,0 +1,116 @@
+import collections
+import datetime
+import email.utils
+import random
+
+# Statuses after which the server did not process the request
+REFUSED_STATUSES = (429, 503)
+
+
+class ApiResult(
+    collections.namedtuple("ApiResult", ["data", "status_code", "message"])
+):
+    # The usual (data, status_code, message) tuple, also carrying the number of
+    # retries it took
+
+    def __new__(cls, data, status_code, message, retries=0):
+        self = super().__new__(cls, data, status_code, message)
+        self.retries = retries
+        return self
+
+    # namedtuple builds copies without __new__, retries is carried over here
+
+    @classmethod
+    def _make(cls, iterable, retries=0):
+        return cls(*iterable, retries=retries)
+
+    def _replace(self, **changes):
+        retries = changes.pop("retries", self.retries)
+        return self._make(super()._replace(**changes), retries=retries)
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class RetryPolicy:
+    # max_retries       retries after the first attempt
+    # backoff_base      first backoff window in seconds, doubled on every retry
+    # backoff_max       largest backoff window
+    # max_total         seconds after which no new retry is started
+    # statuses          response statuses that are retried
+    # exceptions        exception types that are retried, defaults to the
+    #                   connection errors of the client's HTTP library
+    # idempotent        both endpoints return the same audio for the same input,
+    #                   so requests that may have reached the server are retried
+    #                   too. When False only refused requests (429, 503 or errors
+    #                   before the request was sent) are retried.
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        max_total=60.0,
+        statuses=(429, 502, 503, 504),
+        exceptions=None,
+        respect_retry_after=True,
+        idempotent=True,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_total = max_total
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions) if exceptions is not None else None
+        self.respect_retry_after = respect_retry_after
+        self.idempotent = idempotent
+
+    def retry_status(self, status_code):
+        if status_code not in self.statuses:
+            return False
+        return self.idempotent or status_code in REFUSED_STATUSES
+
+    def retry_exception(self, error, sent, transient=()):
+        exceptions = self.exceptions if self.exceptions is not None else transient
+
+        if not isinstance(error, exceptions):
+            return False
+        return self.idempotent or not sent
+
+    def next_delay(self, retries, elapsed, retry_after=None):
+        # Seconds to wait before the next retry, None when giving up
+        if retries >= self.max_retries:
+            return None
+
+        if retry_after is not None and self.respect_retry_after:
+            delay = retry_after
+        else:
+            # Full jitter spreads the retries of many clients over the whole
+            # window instead of having them all come back at once
+            window = min(self.backoff_max, self.backoff_base * 2**retries)
+            delay = random.uniform(0, window)
+
+        if self.max_total is not None and elapsed + delay > self.max_total:
+            return None
+        return delay
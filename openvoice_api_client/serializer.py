@@ -0,0 +1,75 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonSerializer:
+    # Standard library backend, always available
+    name = "json"
+    content_type = "application/json"
+
+    def dumps(self, data):
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    name = "orjson"
+
+    def dumps(self, data):
+        return orjson.dumps(data)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonSerializer(JsonSerializer):
+    name = "ujson"
+
+    def dumps(self, data):
+        return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+BACKENDS = {
+    "orjson": (OrjsonSerializer, lambda: orjson),
+    "ujson": (UjsonSerializer, lambda: ujson),
+    "json": (JsonSerializer, lambda: json),
+}
+
+
+def get_serializer(backend=None):
+    # backend is a backend name, None for the fastest one installed, or any
+    # object with dumps (returning bytes) and loads methods, and optionally a
+    # content_type (application/json otherwise)
+    if backend is None:
+        for name in ("orjson", "ujson", "json"):
+            serializer, module = BACKENDS[name]
+            if module() is not None:
+                return serializer()
+
+    if not isinstance(backend, str):
+        return backend
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+
+    serializer, module = BACKENDS[backend]
+
+    if module() is None:
+        raise ImportError(f"JSON backend {backend} is not installed")
+    return serializer()
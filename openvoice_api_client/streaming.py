@@ -0,0 +1,263 @@
+import base64
+import binascii
+import json
+import os
+import aiofiles
+
+
+class Base64JsonBody:
+    # JSON request body whose `key` field is the base64 encoded content of a file,
+    # produced in chunks so only one chunk of the file is in memory at a time.
+    # Works as a sync iterable for requests and an async iterable for aiohttp.
+    # Its length is known upfront, requests sends it as Content-Length, aiohttp
+    # needs the header set explicitly to avoid chunked transfer encoding.
+
+    def __init__(self, payload, path, key="audio_data", chunk_size=3 * 256 * 1024):
+        self.payload = payload
+        self.path = path
+        self.key = key
+        # Encoding blocks of a multiple of 3 bytes gives base64 without padding
+        # in between, so the encoded chunks can simply be concatenated
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        self.file_size = os.path.getsize(path)
+
+        params = {k: v for k, v in payload.items() if k != key}
+        params[key] = ""
+        document = json.dumps(params).encode("utf-8")
+        # The field is serialised last, split around its empty string value
+        self.prefix = document[:-2]
+        self.suffix = document[-2:]
+
+    def __len__(self):
+        encoded_size = (self.file_size + 2) // 3 * 4
+        return len(self.prefix) + encoded_size + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        with open(self.path, "rb") as source:
+            encoder = _ChunkEncoder()
+            while True:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield encoder.encode(chunk)
+            yield encoder.flush()
+        yield self.suffix
+
+    async def __aiter__(self):
+        yield self.prefix
+        async with aiofiles.open(self.path, "rb") as source:
+            encoder = _ChunkEncoder()
+            while True:
+                chunk = await source.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield encoder.encode(chunk)
+            yield encoder.flush()
+        yield self.suffix
+
+
+class _ChunkEncoder:
+    # Keeps reads that are not a multiple of 3 bytes aligned across chunks
+    def __init__(self):
+        self.pending = b""
+
+    def encode(self, chunk):
+        if self.pending:
+            chunk = self.pending + chunk
+        cut = len(chunk) - len(chunk) % 3
+        self.pending = chunk[cut:]
+        return base64.b64encode(chunk[:cut])
+
+    def flush(self):
+        pending, self.pending = self.pending, b""
+        return base64.b64encode(pending)
+
+
+class Base64JsonDecoder:
+    # Incremental decoder for a JSON document carrying base64 data in its `key`
+    # string field. Fed the body chunk by chunk, it returns the decoded bytes as
+    # soon as complete 4 character groups arrive, so neither the document nor
+    # the audio is ever held in memory as a whole.
+
+    def __init__(self, key="audio_data"):
+        self.key = key.encode("utf-8")
+        self.done = False
+        # Document text before the value, only kept until the key is found
+        self._buffer = bytearray()
+        self._in_value = False
+        # Base64 characters not yet forming a complete group, and a trailing
+        # escape sequence split between two chunks
+        self._pending = b""
+        self._escape = b""
+
+    def feed(self, chunk):
+        if self.done:
+            return b""
+
+        if not self._in_value:
+            self._buffer += chunk
+            start = self._find_value()
+
+            if start is None:
+                return b""
+
+            chunk = bytes(self._buffer[start:])
+            self._buffer = bytearray()
+            self._in_value = True
+
+        end = chunk.find(b'"')
+
+        if end != -1:
+            chunk = chunk[:end]
+            self.done = True
+
+        return self._decode(chunk)
+
+    def close(self):
+        # Raises when the document ended before the whole value was read
+        if not self.done:
+            raise ValueError(f"JSON document ended before the end of {self.key!r}")
+        if self._pending or self._escape:
+            raise ValueError(f"Truncated base64 data in {self.key!r}")
+
+    def _find_value(self):
+        # Scans the string tokens of the buffer for the key followed by `:` and
+        # the opening quote of its value, returns the offset of the value
+        buffer = self._buffer
+        position = 0
+
+        while True:
+            start = buffer.find(b'"', position)
+
+            if start == -1:
+                del buffer[:]
+                return None
+
+            end = self._string_end(buffer, start + 1)
+
+            if end is None:
+                break
+
+            if buffer[start + 1 : end] == self.key:
+                rest = bytes(buffer[end + 1 :]).lstrip()
+
+                if len(rest) < 2 or (rest[:1] == b":" and not rest[1:].lstrip()):
+                    # Wait for the characters after the key
+                    break
+
+                if rest[:1] == b":":
+                    value = rest[1:].lstrip()
+
+                    if value[:1] != b'"':
+                        raise ValueError(f"{self.key!r} is not a JSON string")
+                    return len(buffer) - len(value) + 1
+
+            position = end + 1
+
+        # Keep the incomplete token for the next chunk
+        del buffer[:start]
+        return None
+
+    def _string_end(self, buffer, position):
+        # Offset of the closing quote of a string, skipping escaped quotes
+        while True:
+            end = buffer.find(b'"', position)
+
+            if end == -1:
+                return None
+
+            backslashes = 0
+            while buffer[end - 1 - backslashes] == 0x5C:
+                backslashes += 1
+
+            if backslashes % 2 == 0:
+                return end
+            position = end + 1
+
+    def _decode(self, chunk):
+        if self._escape or b"\\" in chunk:
+            chunk = self._unescape(self._escape + chunk)
+
+        chunk = self._pending + chunk
+        cut = len(chunk) - len(chunk) % 4
+        self._pending = chunk[cut:]
+        return binascii.a2b_base64(chunk[:cut])
+
+    def _unescape(self, chunk):
+        # Base64 only needs `\/` and `\uXXXX`, whitespace escapes from line
+        # wrapped encoders are dropped
+        parts = []
+        position = 0
+        self._escape = b""
+
+        while True:
+            index = chunk.find(b"\\", position)
+
+            if index == -1:
+                parts.append(chunk[position:])
+                break
+
+            parts.append(chunk[position:index])
+            kind = chunk[index + 1 : index + 2]
+            length = 6 if kind == b"u" else 2
+
+            if len(chunk) - index < length:
+                self._escape = chunk[index:]
+                break
+
+            if kind == b"u":
+                parts.append(chr(int(chunk[index + 2 : index + 6], 16)).encode())
+            elif kind not in (b"n", b"r", b"t"):
+                parts.append(kind)
+            position = index + length
+
+        return b"".join(parts)
+
+
+class BufferWriter:
+    # Writes chunks one after another into a caller's buffer. A bytearray grows
+    # when the data does not fit, any other writable buffer (memoryview, array,
+    # mmap) must be large enough and raises ValueError otherwise.
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.length = 0
+
+        if isinstance(buffer, bytearray):
+            self.view = None
+        else:
+            self.view = memoryview(buffer).cast("B")
+
+            if self.view.readonly:
+                self.release()
+                raise ValueError("Buffer is read-only")
+
+    def expect(self, size):
+        # Fails before anything is read when a fixed buffer cannot hold `size`
+        # bytes. Bytearrays grow while being written, which over-allocates, so
+        # growing them upfront would only cost a temporary block of zeros.
+        if self.view is not None and size > len(self.view):
+            raise ValueError(
+                f"Buffer of {len(self.view)} bytes is too small for {size} bytes"
+            )
+
+    def write(self, chunk):
+        end = self.length + len(chunk)
+
+        if self.view is None:
+            # Slice assignment past the end extends the bytearray
+            self.buffer[self.length : end] = chunk
+        else:
+            if end > len(self.view):
+                raise ValueError(
+                    f"Buffer of {len(self.view)} bytes is too small for the audio"
+                )
+            self.view[self.length : end] = chunk
+
+        self.length = end
+
+    def release(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
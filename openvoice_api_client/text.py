@@ -0,0 +1,99 @@
+import re
+
+# A sentence runs up to terminal punctuation (plus closing quotes or brackets)
+# followed by whitespace, or up to the end of the text
+SENTENCE = re.compile(r"\S.*?(?:[.!?…。！？]+[\"'”’)\]]*(?=\s|$)|$)", re.S)
+CLAUSE_END = re.compile(r"(?<=[,:;—–])\s+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def split_sentences(text, max_chars=300):
+    # Splits text at sentence boundaries, sentences longer than max_chars are
+    # split further at clause boundaries and finally at word boundaries.
+    chunks = []
+
+    for sentence in SENTENCE.findall(text):
+        chunks.extend(_split_long(sentence.strip(), max_chars))
+
+    return chunks
+
+
+def _split_long(text, max_chars):
+    if not max_chars or len(text) <= max_chars:
+        return [text]
+
+    clauses = CLAUSE_END.split(text)
+
+    if len(clauses) > 1:
+        parts = [part for clause in clauses for part in _split_long(clause, max_chars)]
+        return _pack(parts, max_chars)
+
+    words = WHITESPACE.split(text)
+
+    if len(words) > 1:
+        return _pack(words, max_chars)
+
+    # A single word longer than max_chars is sent as is
+    return [text]
+
+
+def _pack(parts, max_chars):
+    # Greedily joins consecutive parts while they fit in max_chars
+    chunks = []
+    current = ""
+
+    for part in parts:
+        candidate = f"{current} {part}" if current else part
+
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            current = part
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+# Terminal punctuation only ends a sentence once the following whitespace has
+# arrived, "2." could still become "2.5"
+BOUNDARY = re.compile(r"[.!?…。！？]+[\"'”’)\]]*\s")
+
+
+class SentenceBuffer:
+    # Accumulates text fragments (e.g. LLM tokens) and hands out sentences as
+    # soon as they are complete.
+
+    def __init__(self, max_chars=300):
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, fragment):
+        self.buffer += fragment
+        end = None
+
+        for match in BOUNDARY.finditer(self.buffer):
+            end = match.end()
+
+        if end is not None:
+            complete, self.buffer = self.buffer[:end], self.buffer[end:]
+            return split_sentences(complete, self.max_chars)
+
+        if self.max_chars and len(self.buffer) > self.max_chars:
+            # No sentence end in sight, release what fits at clause or word
+            # boundaries and keep the tail, it may still be growing
+            text = self.buffer.rstrip()
+            chunks = _split_long(text.strip(), self.max_chars)
+
+            if len(chunks) > 1:
+                self.buffer = chunks[-1] + self.buffer[len(text) :]
+                return chunks[:-1]
+
+        return []
+
+    def flush(self):
+        remaining, self.buffer = self.buffer, ""
+        return split_sentences(remaining, self.max_chars)
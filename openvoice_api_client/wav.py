@@ -0,0 +1,325 @@
+import collections
+import mmap
+import struct
+
+WavInfo = collections.namedtuple(
+    "WavInfo",
+    [
+        "audio_format",
+        "channels",
+        "sample_rate",
+        "bits_per_sample",
+        "block_align",
+        "data_offset",
+        "data_size",
+    ],
+)
+
+
+def parse_header(data):
+    # Walks the RIFF chunks up to the start of the sample data. The view is
+    # released on errors too, so memory mapped inputs can still be closed.
+    with memoryview(data) as view:
+        if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+            raise ValueError("Not a RIFF/WAVE file")
+
+        offset = 12
+        fmt = None
+
+        while offset + 8 <= len(view):
+            chunk_id = bytes(view[offset : offset + 4])
+            (chunk_size,) = struct.unpack_from("<I", view, offset + 4)
+            body = offset + 8
+
+            if chunk_id == b"fmt ":
+                if body + 16 > len(view):
+                    raise ValueError("Truncated WAVE fmt chunk")
+                fmt = struct.unpack_from("<HHIIHH", view, body)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAVE data chunk found before fmt chunk")
+
+                # Streamed WAVs may carry a placeholder size, trust the buffer
+                data_size = min(chunk_size, len(view) - body)
+                audio_format, channels, sample_rate, _, block_align, bits = fmt
+                return WavInfo(
+                    audio_format,
+                    channels,
+                    sample_rate,
+                    bits,
+                    block_align,
+                    body,
+                    data_size,
+                )
+
+            # Chunks are word aligned
+            offset = body + chunk_size + (chunk_size & 1)
+
+        raise ValueError("WAVE file has no data chunk")
+
+
+def build_header(info, data_size):
+    # Streams of unknown length use 0xFFFFFFFF for both sizes
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        min(36 + data_size, 0xFFFFFFFF),
+        b"WAVE",
+        b"fmt ",
+        16,
+        info.audio_format,
+        info.channels,
+        info.sample_rate,
+        info.sample_rate * info.block_align,
+        info.block_align,
+        info.bits_per_sample,
+        b"data",
+        data_size,
+    )
+
+
+def same_format(a, b):
+    return (a.audio_format, a.channels, a.sample_rate, a.bits_per_sample) == (
+        b.audio_format,
+        b.channels,
+        b.sample_rate,
+        b.bits_per_sample,
+    )
+
+
+def concatenate(clips, silence=0.0, crossfade=0.0):
+    # Joins the sample data of WAV clips sharing one format into a single WAV,
+    # optionally separated by `silence` seconds or overlapped by `crossfade`
+    # seconds
+    parts = []
+    _stitch([_Clip(clip) for clip in clips], parts.append, silence, crossfade)
+
+    # A single allocation for the output, the slices themselves are not copied
+    return b"".join(parts)
+
+
+def concatenate_files(paths, output_file, silence=0.0, crossfade=0.0):
+    # Same as concatenate for files on disk. Inputs are memory mapped one or two
+    # at a time and their sample data is written straight from the mappings.
+    with open(output_file, "wb") as output:
+        return _stitch(
+            [_MappedClip(path) for path in paths], output.write, silence, crossfade
+        )
+
+
+class _Clip:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.view = None
+
+    def open(self):
+        self.view = memoryview(self.buffer)
+        return self.view
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+
+
+class _MappedClip(_Clip):
+    def __init__(self, path):
+        super().__init__(None)
+        self.path = path
+
+    def open(self):
+        with open(self.path, "rb") as source:
+            self.buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        return super().open()
+
+    def close(self):
+        super().close()
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+
+def _stitch(clips, write, silence, crossfade):
+    if not clips:
+        raise ValueError("No clips to concatenate")
+
+    if silence and crossfade:
+        raise ValueError("Use either silence or crossfade between clips, not both")
+
+    infos = []
+
+    for clip in clips:
+        try:
+            infos.append(parse_header(clip.open()))
+        finally:
+            clip.close()
+
+    first = infos[0]
+
+    for info in infos[1:]:
+        if not same_format(first, info):
+            raise ValueError("Cannot concatenate WAV clips with different formats")
+
+    frame = first.block_align
+    gap = int(round(silence * first.sample_rate)) * frame
+    fade = int(round(crossfade * first.sample_rate)) * frame
+    dtype = _sample_dtype(first) if fade else None
+
+    # Each clip gives at most half of its frames to each of its neighbours
+    overlaps = [
+        min(fade, a.data_size // frame // 2 * frame, b.data_size // frame // 2 * frame)
+        for a, b in zip(infos, infos[1:])
+    ]
+    data_size = sum(info.data_size for info in infos)
+    data_size += gap * (len(infos) - 1) - sum(overlaps)
+    header = build_header(first, data_size)
+    write(header)
+
+    # 8 bit PCM is unsigned, its silence is the mid value
+    silence_block = bytes([0x80 if first.bits_per_sample == 8 else 0]) * gap
+    previous = None
+    tail = None
+
+    try:
+        for index, (clip, info) in enumerate(zip(clips, infos)):
+            view = clip.open()
+            data = view[info.data_offset : info.data_offset + info.data_size]
+            start = overlaps[index - 1] if index else 0
+            end = info.data_size - (overlaps[index] if index < len(overlaps) else 0)
+
+            if index:
+                if start:
+                    write(_crossfade(tail, data[:start], dtype, first.channels))
+                elif gap:
+                    write(silence_block)
+                tail.release()
+                previous.close()
+
+            write(data[start:end])
+            tail = data[end:]
+            data.release()
+            previous = clip
+    finally:
+        if tail is not None:
+            tail.release()
+        if previous is not None:
+            previous.close()
+
+    return len(header) + data_size
+
+
+# G.711 mu-law, read as 16 bit samples
+_MULAW_FORMAT = 7
+
+_DTYPES = {
+    (1, 8): "u1",
+    (1, 16): "<i2",
+    (1, 32): "<i4",
+    (3, 32): "<f4",
+    (3, 64): "<f8",
+}
+
+
+def _sample_dtype(info):
+    dtype = _DTYPES.get((info.audio_format, info.bits_per_sample))
+
+    if dtype is None:
+        raise ValueError(
+            f"Samples of format {info.audio_format} with {info.bits_per_sample} bits are not supported"
+        )
+    return dtype
+
+
+def _numpy(feature):
+    # numpy is an optional dependency, only needed for sample level work
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(f"{feature} requires numpy") from None
+    return numpy
+
+
+def _crossfade(tail, head, dtype, channels):
+    # Linear fade computed on whole arrays, no per sample Python work
+    np = _numpy("Crossfading WAV clips")
+
+    a = np.frombuffer(tail, dtype=dtype).astype(np.float64)
+    b = np.frombuffer(head, dtype=dtype).astype(np.float64)
+    frames = len(a) // channels
+    ramp = np.repeat(np.linspace(0.0, 1.0, frames, endpoint=False), channels)
+    mixed = a * (1.0 - ramp) + b * ramp
+
+    if np.dtype(dtype).kind in "iu":
+        limits = np.iinfo(dtype)
+        mixed = np.clip(np.rint(mixed), limits.min, limits.max)
+    return mixed.astype(dtype).tobytes()
+
+
+def to_numpy(data):
+    # Samples of a WAV as a NumPy array over the same buffer, nothing is copied
+    # except for G.711 mu-law, which is decoded to 16 bit samples. Returns
+    # (samples, sample_rate), with one column per channel for more than one
+    # channel. Arrays over bytes are read-only.
+    info, samples = _samples(data)
+    return samples, info.sample_rate
+
+
+def stack(clips):
+    # Copies the samples of WAV clips sharing one format into one contiguous
+    # array of shape (clips, frames) or (clips, frames, channels), padding the
+    # shorter ones with silence. Returns (samples, sample_rate, lengths) where
+    # lengths holds the number of frames of each clip.
+    return stack_samples([to_numpy(clip) for clip in clips])
+
+
+def stack_samples(clips):
+    # Same as stack for (samples, sample_rate) pairs as given by to_numpy
+    np = _numpy("Stacking WAV samples")
+
+    if not clips:
+        raise ValueError("No clips to stack")
+
+    first, sample_rate = clips[0]
+
+    for samples, rate in clips[1:]:
+        if (rate, samples.dtype, samples.shape[1:]) != (
+            sample_rate,
+            first.dtype,
+            first.shape[1:],
+        ):
+            raise ValueError("Cannot stack WAV clips with different formats")
+
+    lengths = [len(samples) for samples, _ in clips]
+    shape = (len(clips), max(lengths)) + first.shape[1:]
+    # 8 bit PCM is unsigned, its silence is the mid value
+    output = np.full(shape, 0x80 if first.dtype == np.uint8 else 0, first.dtype)
+
+    for row, (samples, _) in zip(output, clips):
+        row[: len(samples)] = samples
+
+    return output, sample_rate, lengths
+
+
+def _samples(data):
+    np = _numpy("Reading WAV samples")
+    info = parse_header(data)
+    frames = info.data_size // info.block_align
+
+    if info.audio_format == _MULAW_FORMAT and info.bits_per_sample == 8:
+        from .dsp import mulaw_decode
+
+        codes = np.frombuffer(
+            data, np.uint8, count=frames * info.channels, offset=info.data_offset
+        )
+        samples = mulaw_decode(codes)
+    else:
+        samples = np.frombuffer(
+            data,
+            dtype=_sample_dtype(info),
+            count=frames * info.channels,
+            offset=info.data_offset,
+        )
+
+    if info.channels > 1:
+        samples = samples.reshape(frames, info.channels)
+    return info, samples
@@ -17,6 +17,10 @@ setup(
         'aiohttp',
         'aiofiles', 
     ],
+    extras_require={
+        'numpy': ['numpy'],
+        'orjson': ['orjson'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
@@ -0,0 +1,132 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.cache import DiskCache, MemoryCache, cache_key
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_key_ignores_response_format_and_order(self):
+        payload = {"model": "en", "input": "Hello", "speed": 1, "voice": "raw"}
+        reordered = {
+            "voice": "raw",
+            "response_format": "base64",
+            "speed": 1.0,
+            "input": "Hello",
+            "model": "en",
+        }
+        self.assertEqual(cache_key("v2", payload), cache_key("v2", reordered))
+
+    def test_key_depends_on_synthesis_params(self):
+        payload = {"model": "en", "input": "Hello", "speed": 1.0, "voice": "raw"}
+        self.assertNotEqual(cache_key("v2", payload), cache_key("v1", payload))
+        self.assertNotEqual(
+            cache_key("v2", payload), cache_key("v2", dict(payload, accent="en-au"))
+        )
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_get(self):
+        cache = DiskCache(self.directory)
+        self.assertIsNone(cache.get("a" * 64))
+
+        cache.put("a" * 64, b"audio_bytes_content")
+        self.assertEqual(cache.get("a" * 64), b"audio_bytes_content")
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["size"], len(b"audio_bytes_content"))
+
+        # No temporary files are left behind
+        shard = os.path.join(self.directory, "aa")
+        self.assertEqual(os.listdir(shard), ["a" * 64])
+
+    def test_put_file(self):
+        source = os.path.join(self.directory, "source.wav")
+        with open(source, "wb") as source_file:
+            source_file.write(b"audio_bytes_content")
+
+        cache = DiskCache(os.path.join(self.directory, "cache"))
+        cache.put_file("b" * 64, source)
+        self.assertEqual(cache.get("b" * 64), b"audio_bytes_content")
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskCache(self.directory, max_size=25)
+        cache.put("a" * 64, b"0123456789")
+        cache.put("b" * 64, b"0123456789")
+        time.sleep(0.01)
+        cache.get("a" * 64)
+        cache.put("c" * 64, b"0123456789")
+
+        self.assertIsNotNone(cache.get("a" * 64))
+        self.assertIsNone(cache.get("b" * 64))
+        self.assertIsNotNone(cache.get("c" * 64))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["size"], 25)
+
+    def test_expires_by_age(self):
+        cache = DiskCache(self.directory, max_age=60)
+        cache.put("a" * 64, b"audio_bytes_content")
+        path = os.path.join(self.directory, "aa", "a" * 64)
+        stored = time.time() - 120
+        os.utime(path, (stored, stored))
+
+        self.assertIsNone(cache.get("a" * 64))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_index_is_loaded_from_disk(self):
+        DiskCache(self.directory).put("a" * 64, b"audio_bytes_content")
+        cache = DiskCache(self.directory)
+
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.get("a" * 64), b"audio_bytes_content")
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_returns_read_only_views(self):
+        cache = MemoryCache()
+        data = b"audio_bytes_content"
+        cache.put("a", data)
+        view = cache.get("a")
+
+        self.assertIsInstance(view, memoryview)
+        self.assertTrue(view.readonly)
+        self.assertIs(view.obj, data)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_by_byte_budget(self):
+        cache = MemoryCache(max_size=25)
+        cache.put("a", b"0123456789")
+        cache.put("b", b"0123456789")
+        cache.get("a")
+        cache.put("c", bytearray(b"0123456789"))
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(bytes(cache.get("c")), b"0123456789")
+        self.assertEqual(cache.stats()["size"], 20)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_skips_entries_over_budget(self):
+        cache = MemoryCache(max_size=5)
+        view = cache.put("a", b"0123456789")
+
+        self.assertEqual(bytes(view), b"0123456789")
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,13 +2,25 @@ import unittest
 import sys
 import os
 import base64
+import json
 import asyncio
+import tempfile
+import threading
+import time
 from unittest import TestCase, mock
 from unittest.mock import patch, mock_open, MagicMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
 from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.cache import DiskCache, MemoryCache, cache_key
+from openvoice_api_client.streaming import Base64JsonBody
+from openvoice_api_client import wav
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestClient(unittest.TestCase):
@@ -28,10 +40,10 @@ class TestClient(unittest.TestCase):
         }
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = mock_response_data
+        mock_response.content = json.dumps(mock_response_data).encode("utf-8")
 
-        # Mock requests.post to return the mock response
-        with patch("requests.post", return_value=mock_response) as mock_post:
+        # Mock requests.Session.post to return the mock response
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
             url, status_code, message = self.client.generate_audio(
                 version="v2",
                 model="en",
@@ -43,18 +55,20 @@ class TestClient(unittest.TestCase):
             self.assertEqual(status_code, 200)
             self.assertEqual(url, "http://example.com/audio.wav")
             self.assertEqual(message, "Audio file generated successfully")
-            mock_post.assert_called_once()  # Ensure requests.post was called exactly once
+            mock_post.assert_called_once()  # Ensure session.post was called exactly once
 
     @patch("builtins.open", new_callable=mock_open)
     @patch(
         "os.path.getsize", return_value=12345
     )  # Mock file size to avoid FileNotFoundError
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_generate_audio_bytes(self, mock_post, mock_getsize, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.content = b"audio_bytes_content"  # Mock audio bytes content
+        mock_response.iter_content.return_value = [
+            b"audio_bytes_content"
+        ]  # Mock streamed audio bytes content
         mock_post.return_value = mock_response
 
         output_file = "generate_audio_bytes.wav"
@@ -84,7 +98,7 @@ class TestClient(unittest.TestCase):
     @patch(
         "os.path.getsize", return_value=12345
     )  # Mock file size to avoid FileNotFoundError
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_generate_audio_bytes_as_bytes(self, mock_post, mock_getsize, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
@@ -112,12 +126,12 @@ class TestClient(unittest.TestCase):
     @patch(
         "os.path.getsize", return_value=12345
     )  # Mock file size to avoid FileNotFoundError
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_generate_audio_base64(self, mock_post, mock_getsize, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
+        response_data = {
             "result": {
                 "data": {
                     "audio_data": base64.b64encode(b"audio_bytes_content").decode(
@@ -126,6 +140,10 @@ class TestClient(unittest.TestCase):
                 }
             }
         }
+        # The body is decoded to the file as it streams in
+        mock_response.iter_content.return_value = [
+            json.dumps(response_data).encode("utf-8")
+        ]
         mock_post.return_value = mock_response
 
         output_file = "generate_audio_base64.wav"
@@ -161,20 +179,22 @@ class TestClient(unittest.TestCase):
     @patch(
         "os.path.getsize", return_value=12345
     )  # Mock file size to avoid FileNotFoundError
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_generate_audio_bytes_as_base64(self, mock_post, mock_getsize, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "result": {
-                "data": {
-                    "audio_data": base64.b64encode(b"audio_bytes_content").decode(
-                        "utf-8"
-                    )
+        mock_response.content = json.dumps(
+            {
+                "result": {
+                    "data": {
+                        "audio_data": base64.b64encode(b"audio_bytes_content").decode(
+                            "utf-8"
+                        )
+                    }
                 }
             }
-        }
+        ).encode("utf-8")
         mock_post.return_value = mock_response
 
         audio_base64, status_code, message = self.client.generate_audio(
@@ -201,7 +221,7 @@ class TestClient(unittest.TestCase):
         mock_getsize.assert_not_called()
 
     @patch("builtins.open", new_callable=mock_open)
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_change_voice(self, mock_post, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
@@ -233,7 +253,7 @@ class TestClient(unittest.TestCase):
             os.remove(audio_file)
 
     @patch("builtins.open", new_callable=mock_open)
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_change_voice_encode_param(self, mock_post, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
@@ -265,8 +285,9 @@ class TestClient(unittest.TestCase):
             os.remove(audio_file)
 
     @patch("builtins.open", new_callable=mock_open)
-    @patch("requests.post")
-    def test_change_voice_audio_file_param(self, mock_post, mock_open):
+    @patch("os.path.getsize", return_value=18)  # Size of the fake audio content
+    @patch("requests.Session.post")
+    def test_change_voice_audio_file_param(self, mock_post, mock_getsize, mock_open):
         # Mock response data for successful response
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -288,14 +309,16 @@ class TestClient(unittest.TestCase):
             type(audio_bytes), bytes
         )  # Verify that audio_bytes is of type bytes
         mock_post.assert_called_once()  # Ensure post was called once
+        # The file is streamed as the request body instead of being read upfront
+        self.assertIsInstance(mock_post.call_args[1]["data"], Base64JsonBody)
 
         # Clean up
         if os.path.exists(audio_file):
             os.remove(audio_file)
 
     def test_generate_audio_error(self):
-        # Mock requests.post to raise an exception
-        with patch("requests.post", side_effect=Exception("Test exception")):
+        # Mock requests.Session.post to raise an exception
+        with patch("requests.Session.post", side_effect=Exception("Test exception")):
             url, status_code, message = self.client.generate_audio(
                 version="v2",
                 model="en",
@@ -313,12 +336,12 @@ class TestClient(unittest.TestCase):
         # Mock response data for bad request
         mock_response = MagicMock()
         mock_response.status_code = 400
-        mock_response.json.return_value = {
-            "result": {"data": {}, "message": "Bad Request"}
-        }
+        mock_response.content = json.dumps(
+            {"result": {"data": {}, "message": "Bad Request"}}
+        ).encode("utf-8")
 
-        # Mock requests.post to return the mock response
-        with patch("requests.post", return_value=mock_response):
+        # Mock requests.Session.post to return the mock response
+        with patch("requests.Session.post", return_value=mock_response):
             url, status_code, message = self.client.generate_audio(
                 version="v2",
                 model="en",
@@ -332,6 +355,423 @@ class TestClient(unittest.TestCase):
             self.assertIsNone(url)
             self.assertEqual(message, "Bad Request")
 
+    @patch("requests.Session.post")
+    def test_generate_audio_bytes_streams_to_file(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"audio_", b"bytes_", b"content"]
+        mock_post.return_value = mock_response
+
+        client = OpenVoiceApiClient(chunk_size=1024 * 1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "output.wav")
+            client.generate_audio(input="Hello", output_file=output_file)
+
+            with open(output_file, "rb") as f:
+                self.assertEqual(f.read(), b"audio_bytes_content")
+
+        self.assertTrue(mock_post.call_args[1]["stream"])
+        mock_response.iter_content.assert_called_once_with(chunk_size=1024 * 1024)
+        mock_response.close.assert_called_once()
+
+    def test_stream_generator_chunk_size(self):
+        mock_response = MagicMock()
+        mock_response.iter_content.return_value = [b"audio_bytes_content"]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "output.wav")
+            self.client.stream_generator(output_file, mock_response, chunk_size=4096)
+
+            with open(output_file, "rb") as f:
+                self.assertEqual(f.read(), b"audio_bytes_content")
+
+        mock_response.iter_content.assert_called_once_with(chunk_size=4096)
+        mock_response.close.assert_called_once()
+
+    def test_session_is_reused(self):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+
+        with patch("requests.Session.post", return_value=mock_response):
+            self.client.generate_audio(input="Hello", response_format="bytes")
+            session = self.client._session
+            self.client.generate_audio(input="Hello", response_format="bytes")
+
+        # Both calls should go through the same pooled session
+        self.assertIsNotNone(session)
+        self.assertIs(self.client._session, session)
+
+    def test_session_pool_configuration(self):
+        client = OpenVoiceApiClient(
+            pool_connections=2, pool_maxsize=32, keep_alive=False
+        )
+        session = client._get_session()
+        adapter = session.get_adapter("http://localhost:5000")
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(session.headers["Connection"], "close")
+        client.close()
+
+    def test_context_manager_closes_session(self):
+        with patch("requests.Session.close") as mock_close:
+            with OpenVoiceApiClient() as client:
+                self.assertIsNotNone(client._session)
+
+            mock_close.assert_called_once()
+            self.assertIsNone(client._session)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    @patch("requests.Session.post")
+    def test_generate_audio_numpy(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        data = np.arange(4, dtype="<i2").tobytes()
+        info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+        mock_response.content = wav.build_header(info, len(data)) + data
+        mock_post.return_value = mock_response
+
+        (samples, sample_rate), status_code, message = self.client.generate_audio(
+            input="Hello", response_format="numpy"
+        )
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(message, "Generated audio samples")
+        self.assertEqual(sample_rate, 24000)
+        self.assertEqual(samples.tolist(), [0, 1, 2, 3])
+        # The server is asked for raw bytes
+        payload = json.loads(mock_post.call_args[1]["data"])
+        self.assertEqual(payload["response_format"], "bytes")
+
+
+class TestClientBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = OpenVoiceApiClient(max_workers=4)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def tearDown(self):
+        self.client.close()
+
+    def _fake_generate_audio(self, input="", **kwargs):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        # Later items finish first to exercise reordering
+        time.sleep(0.001 * (10 - int(input) % 10))
+        with self.lock:
+            self.running -= 1
+        if input == "3":
+            raise ValueError("Test exception")
+        return input.encode(), 200, "Generated audio bytes"
+
+    def test_submit_generate_audio(self):
+        with patch.object(
+            self.client, "generate_audio", side_effect=self._fake_generate_audio
+        ):
+            future = self.client.submit_generate_audio(input="7")
+            self.assertEqual(future.result(), (b"7", 200, "Generated audio bytes"))
+
+    def test_generate_audio_many_ordered(self):
+        specs = ({"input": str(i)} for i in range(20))
+        with patch.object(
+            self.client, "generate_audio", side_effect=self._fake_generate_audio
+        ):
+            results = list(self.client.generate_audio_many(specs))
+
+        self.assertEqual([index for index, _ in results], list(range(20)))
+        self.assertEqual(results[0][1], (b"0", 200, "Generated audio bytes"))
+        # A failing item is reported without aborting the batch
+        self.assertEqual(results[3][1], (None, 500, "Internal Server Error"))
+        self.assertLessEqual(self.peak, 4)
+
+    def test_generate_audio_many_as_completed(self):
+        specs = [{"input": str(i)} for i in range(20)]
+        with patch.object(
+            self.client, "generate_audio", side_effect=self._fake_generate_audio
+        ):
+            results = list(self.client.generate_audio_many(specs, ordered=False))
+
+        self.assertEqual(sorted(index for index, _ in results), list(range(20)))
+
+    def test_generate_audio_many_is_lazy(self):
+        consumed = []
+
+        def specs():
+            for i in range(1000000):
+                consumed.append(i)
+                yield {"input": str(i)}
+
+        with patch.object(
+            self.client, "generate_audio", side_effect=self._fake_generate_audio
+        ):
+            for index, result in self.client.generate_audio_many(specs(), window=4):
+                break
+
+        self.assertLessEqual(len(consumed), 4)
+
+    def _fake_wav(self, input="", **kwargs):
+        data = input.encode().ljust(8, b" ")
+        info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+        return wav.build_header(info, len(data)) + data, 200, "Generated audio bytes"
+
+    def test_generate_audio_long(self):
+        text = "First sentence. Second one! And a third?"
+        with patch.object(
+            self.client, "generate_audio", side_effect=self._fake_wav
+        ) as mock_generate:
+            audio_bytes, status_code, message = self.client.generate_audio_long(
+                input=text, voice="kaiwen"
+            )
+
+        self.assertEqual(status_code, 200)
+        info = wav.parse_header(audio_bytes)
+        self.assertEqual(
+            audio_bytes[info.data_offset :],
+            b"First sentence.Second one!And a third?",
+        )
+        self.assertEqual(mock_generate.call_count, 3)
+        self.assertEqual(mock_generate.call_args[1]["voice"], "kaiwen")
+        self.assertEqual(mock_generate.call_args[1]["response_format"], "raw")
+
+    def test_iter_audio_long_in_order(self):
+        text = " ".join(f"Sentence {i}." for i in range(10))
+        with patch.object(self.client, "generate_audio", side_effect=self._fake_wav):
+            results = list(self.client.iter_audio_long(input=text))
+
+        self.assertEqual([result[1] for result in results], [200] * 10)
+        self.assertEqual(
+            [result[0][44:].strip() for result in results],
+            [f"Sentence {i}.".encode() for i in range(10)],
+        )
+
+    def test_generate_audio_long_failure(self):
+        def fail_second(input="", **kwargs):
+            if input.startswith("Second"):
+                return None, 503, "Service Unavailable"
+            return self._fake_wav(input)
+
+        with patch.object(self.client, "generate_audio", side_effect=fail_second):
+            audio_bytes, status_code, message = self.client.generate_audio_long(
+                input="First sentence. Second one."
+            )
+
+        self.assertIsNone(audio_bytes)
+        self.assertEqual(status_code, 503)
+
+    def test_iter_audio_from_text(self):
+        first_result = threading.Event()
+
+        def tokens():
+            for token in "Hello there. How are you? I am".split(" "):
+                yield token + " "
+            # The first sentence is delivered while tokens are still coming
+            self.assertTrue(first_result.wait(5))
+            yield "fine."
+
+        results = []
+        with patch.object(self.client, "generate_audio", side_effect=self._fake_wav):
+            for result in self.client.iter_audio_from_text(tokens()):
+                results.append(result)
+                first_result.set()
+
+        self.assertEqual(
+            [result[0][44:].strip() for result in results],
+            [b"Hello there.", b"How are you?", b"I am fine."],
+        )
+
+    def test_iter_audio_from_text_failing_source(self):
+        def tokens():
+            yield "Hello there. "
+            raise ValueError("Test exception")
+
+        with patch.object(self.client, "generate_audio", side_effect=self._fake_wav):
+            results = list(self.client.iter_audio_from_text(tokens()))
+
+        self.assertEqual(results[0][1], 200)
+        self.assertEqual(results[-1], (None, 500, "Internal Server Error"))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_generate_audio_stacked(self):
+        def fake_generate_audio(input="", **kwargs):
+            self.assertEqual(kwargs["response_format"], "bytes")
+            data = np.full(int(input), int(input), dtype="<i2").tobytes()
+            info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+            return (
+                wav.build_header(info, len(data)) + data,
+                200,
+                "Generated audio bytes",
+            )
+
+        specs = [{"input": str(i)} for i in (2, 4, 3)]
+        with patch.object(
+            self.client, "generate_audio", side_effect=fake_generate_audio
+        ):
+            (samples, sample_rate, lengths), status_code, _ = (
+                self.client.generate_audio_stacked(specs)
+            )
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(samples.shape, (3, 4))
+        self.assertEqual(lengths, [2, 4, 3])
+        self.assertEqual(samples[2].tolist(), [3, 3, 3, 0])
+
+    def test_generate_and_change_voice_many(self):
+        running = {"generate": 0, "change": 0}
+        peak = {"generate": 0, "change": 0, "overlap": 0}
+
+        def stage(name, duration):
+            with self.lock:
+                running[name] += 1
+                peak[name] = max(peak[name], running[name])
+                peak["overlap"] = max(
+                    peak["overlap"], min(running["generate"], running["change"])
+                )
+            time.sleep(duration)
+            with self.lock:
+                running[name] -= 1
+
+        def fake_generate_audio(input="", **kwargs):
+            self.assertEqual(kwargs["response_format"], "raw")
+            stage("generate", 0.005)
+            if input == "3":
+                return None, 400, "Bad request"
+            return input.encode(), 200, "Generated audio bytes"
+
+        def fake_change_voice(audio_data=None, **kwargs):
+            self.assertTrue(kwargs["encode"])
+            stage("change", 0.01)
+            return audio_data + b"!", 200, "Changed voice"
+
+        specs = [
+            {"generate": {"input": str(i)}, "change_voice": {"voice": "elon"}}
+            for i in range(12)
+        ]
+        with patch.object(
+            self.client, "generate_audio", side_effect=fake_generate_audio
+        ), patch.object(self.client, "change_voice", side_effect=fake_change_voice):
+            results = list(
+                self.client.generate_and_change_voice_many(
+                    specs, generate_concurrency=2, change_concurrency=3
+                )
+            )
+
+        self.assertEqual([index for index, _ in results], list(range(12)))
+        self.assertEqual(results[0][1], (b"0!", 200, "Changed voice"))
+        # The failed generate_audio result is passed through
+        self.assertEqual(results[3][1], (None, 400, "Bad request"))
+        self.assertLessEqual(peak["generate"], 2)
+        self.assertLessEqual(peak["change"], 3)
+        self.assertGreaterEqual(peak["overlap"], 1)
+
+
+class TestClientCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp.name)
+        self.client = OpenVoiceApiClient(cache=self.cache)
+
+    def tearDown(self):
+        self.client.close()
+        self.tmp.cleanup()
+
+    def test_cache_hit_skips_network(self):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
+            first = self.client.generate_audio(input="Hello", response_format="bytes")
+            second = self.client.generate_audio(input="Hello", response_format="bytes")
+            audio_base64, status_code, message = self.client.generate_audio(
+                input="Hello", response_format="base64"
+            )
+
+        self.assertEqual(first, second)
+        self.assertEqual(second[0], b"audio_bytes_content")
+        self.assertEqual(base64.b64decode(audio_base64), b"audio_bytes_content")
+        mock_post.assert_called_once()
+        # The server is always asked for raw bytes when caching
+        self.assertEqual(
+            json.loads(mock_post.call_args[1]["data"])["response_format"], "bytes"
+        )
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_cache_hit_writes_output_file(self):
+        with patch("requests.Session.post") as mock_post:
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.content = b"audio_bytes_content"
+            self.client.generate_audio(input="Hello", response_format="bytes")
+
+        output_file = os.path.join(self.tmp.name, "output.wav")
+        with patch("requests.Session.post") as mock_post:
+            audio_file, status_code, message = self.client.generate_audio(
+                input="Hello", response_format="bytes", output_file=output_file
+            )
+            mock_post.assert_not_called()
+
+        self.assertEqual(audio_file, output_file)
+        with open(output_file, "rb") as f:
+            self.assertEqual(f.read(), b"audio_bytes_content")
+
+    def test_delivery_errors_return_500(self):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        output_file = os.path.join(self.tmp.name, "missing", "output.wav")
+        coalescing = OpenVoiceApiClient(coalesce=True)
+
+        with patch("requests.Session.post", return_value=mock_response):
+            for result in (
+                self.client.generate_audio(input="Hello", output_file=output_file),
+                # Served from the cache
+                self.client.generate_audio(input="Hello", output_file=output_file),
+                self.client.generate_audio_into(
+                    memoryview(bytearray(4)), input="Hello"
+                ),
+                coalescing.generate_audio_into(memoryview(bytearray(4)), input="Hello"),
+            ):
+                self.assertEqual(result, (None, 500, "Internal Server Error"))
+                self.assertEqual(result.retries, 0)
+
+        coalescing.close()
+
+    def test_errors_are_not_cached(self):
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_response.content = json.dumps(
+            {"result": {"data": {}, "message": "Bad Request"}}
+        ).encode("utf-8")
+
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
+            self.client.generate_audio(input="Hello")
+            audio_bytes, status_code, message = self.client.generate_audio(
+                input="Hello"
+            )
+
+        self.assertEqual(status_code, 400)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_memory_cache_in_front_of_disk_cache(self):
+        memory_cache = MemoryCache()
+        client = OpenVoiceApiClient(cache=self.cache, memory_cache=memory_cache)
+        payload = {"model": "en", "input": "Hello", "speed": 1.0, "voice": "raw"}
+        self.cache.put(cache_key("v2", payload), b"audio_bytes_content")
+
+        with patch("requests.Session.post") as mock_post:
+            first, status_code, message = client.generate_audio(input="Hello")
+            second, status_code, message = client.generate_audio(input="Hello")
+            mock_post.assert_not_called()
+
+        self.assertIsInstance(second, memoryview)
+        self.assertEqual(bytes(second), b"audio_bytes_content")
+        # The disk hit was promoted, the second call is served from memory
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(memory_cache.stats()["hits"], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,12 +2,21 @@ import unittest
 import asyncio
 import sys
 import os
+import json
 import base64
-from unittest.mock import patch, mock_open, MagicMock
+import tempfile
+from unittest.mock import patch, mock_open, MagicMock, AsyncMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
 from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.cache import DiskCache
+from openvoice_api_client import wav
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestClientAsync(unittest.TestCase):
@@ -322,7 +331,7 @@ class TestClientAsync(unittest.TestCase):
         # Mock response data for bad request
         mock_response = MagicMock()
         mock_response.status_code = 400
-        mock_response.json.return_value = {"data": {"message": "Bad Request"}}
+        mock_response.json.return_value = {"result": {"message": "Bad Request"}}
 
         # Mock requests.post to return the mock response
         with patch("requests.post", return_value=mock_response):
@@ -340,6 +349,486 @@ class TestClientAsync(unittest.TestCase):
             self.assertEqual(message, "Bad Request")
 
 
+class TestClientAsyncSession(unittest.TestCase):
+    def _mock_response(self, body=b"audio_bytes_content"):
+        mock_response = MagicMock()
+        mock_response.status = 200
+        mock_response.read = AsyncMock(return_value=body)
+        return mock_response
+
+    def test_session_is_reused(self):
+        async def run():
+            client = OpenVoiceApiClientAsync()
+            mock_response = self._mock_response()
+
+            with patch(
+                "aiohttp.ClientSession.post",
+                new_callable=AsyncMock,
+                return_value=mock_response,
+            ) as mock_post:
+                await client.generate_audio(input="Hello", response_format="bytes")
+                session = client._session
+                audio_bytes, status_code, message = await client.generate_audio(
+                    input="Hello", response_format="bytes"
+                )
+
+            self.assertEqual(status_code, 200)
+            self.assertEqual(audio_bytes, b"audio_bytes_content")
+            self.assertIs(client._session, session)
+            self.assertEqual(mock_post.call_count, 2)
+            self.assertEqual(mock_response.release.call_count, 2)
+            await client.aclose()
+
+        asyncio.run(run())
+
+    def test_generate_audio_bytes_streams_to_file(self):
+        async def iter_chunked(chunk_size):
+            for chunk in (b"audio_", b"bytes_", b"content"):
+                yield chunk
+
+        async def run(output_file):
+            client = OpenVoiceApiClientAsync(chunk_size=1024 * 1024)
+            mock_response = self._mock_response()
+            mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+
+            with patch(
+                "aiohttp.ClientSession.post",
+                new_callable=AsyncMock,
+                return_value=mock_response,
+            ):
+                result = await client.generate_audio(
+                    input="Hello", output_file=output_file
+                )
+
+            await client.aclose()
+            mock_response.content.iter_chunked.assert_called_once_with(1024 * 1024)
+            mock_response.read.assert_not_called()
+            return result
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "output.wav")
+            audio_file, status_code, message = asyncio.run(run(output_file))
+
+            self.assertEqual(audio_file, output_file)
+            with open(output_file, "rb") as f:
+                self.assertEqual(f.read(), b"audio_bytes_content")
+
+    def test_connector_configuration(self):
+        async def run():
+            client = OpenVoiceApiClientAsync(
+                limit=50, limit_per_host=10, keepalive_timeout=30, ttl_dns_cache=60
+            )
+            connector = client._get_session().connector
+
+            self.assertEqual(connector.limit, 50)
+            self.assertEqual(connector.limit_per_host, 10)
+            self.assertTrue(connector.use_dns_cache)
+            await client.aclose()
+
+        asyncio.run(run())
+
+    def test_context_manager_closes_session(self):
+        async def run():
+            async with OpenVoiceApiClientAsync() as client:
+                session = client._session
+                self.assertFalse(session.closed)
+
+            self.assertTrue(session.closed)
+            self.assertIsNone(client._session)
+
+        asyncio.run(run())
+
+    def test_client_outlives_event_loop(self):
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer, unused_port
+
+        async def generate_audio(request):
+            return web.Response(body=b"audio_bytes_content")
+
+        port = unused_port()
+        client = OpenVoiceApiClientAsync(f"http://127.0.0.1:{port}")
+
+        async def run():
+            app = web.Application()
+            app.router.add_post("/v2/generate-audio", generate_audio)
+
+            async with TestServer(app, host="127.0.0.1", port=port):
+                return await client.generate_audio(input="Hello")
+
+        # Every asyncio.run has a new loop, the client opens a session on each
+        for _ in range(3):
+            audio_bytes, status_code, message = asyncio.run(run())
+            self.assertEqual(status_code, 200)
+            self.assertEqual(audio_bytes, b"audio_bytes_content")
+
+        session = client._session
+        asyncio.run(client.aclose())
+        self.assertTrue(session.closed)
+        self.assertIsNone(client._session)
+
+
+class TestClientAsyncStreamAudio(unittest.TestCase):
+    def _mock_post(self, status=200, chunks=(b"audio_", b"bytes_", b"content")):
+        async def iter_chunked(chunk_size):
+            for chunk in chunks:
+                yield chunk
+
+        mock_response = MagicMock()
+        mock_response.status = status
+        mock_response.read = AsyncMock(
+            return_value=json.dumps(
+                {"result": {"data": {}, "message": "Bad Request"}}
+            ).encode("utf-8")
+        )
+        mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+        mock_post = MagicMock()
+        mock_post.return_value.__aenter__.return_value = mock_response
+        return mock_post
+
+    def test_stream_audio(self):
+        async def run():
+            mock_post = self._mock_post()
+            async with OpenVoiceApiClientAsync(chunk_size=4096) as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    stream = client.stream_audio(input="Hello")
+                    chunks = [chunk async for chunk in stream]
+
+            self.assertEqual(b"".join(chunks), b"audio_bytes_content")
+            self.assertEqual(stream.status_code, 200)
+            self.assertEqual(stream.bytes_received, len(b"audio_bytes_content"))
+            self.assertIsNotNone(stream.time_to_first_chunk)
+            self.assertEqual(
+                json.loads(mock_post.call_args[1]["data"])["response_format"], "stream"
+            )
+            mock_post.return_value.__aexit__.assert_called_once()
+
+        asyncio.run(run())
+
+    def test_stream_audio_releases_connection_on_break(self):
+        async def run():
+            mock_post = self._mock_post()
+            async with OpenVoiceApiClientAsync() as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    async with client.stream_audio(input="Hello") as stream:
+                        async for chunk in stream:
+                            break
+                    mock_post.return_value.__aexit__.assert_called_once()
+
+                    stream = client.stream_audio(input="Hello")
+                    async for chunk in stream:
+                        break
+                    await stream.aclose()
+                    self.assertEqual(mock_post.return_value.__aexit__.call_count, 2)
+
+                    # Closing twice or before iterating is harmless
+                    await stream.aclose()
+                    await client.stream_audio(input="Hello").aclose()
+
+            self.assertEqual(mock_post.return_value.__aexit__.call_count, 2)
+
+        asyncio.run(run())
+
+    def test_stream_audio_error(self):
+        async def run():
+            mock_post = self._mock_post(status=400)
+            async with OpenVoiceApiClientAsync() as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    stream = client.stream_audio(input="Hello")
+                    chunks = [chunk async for chunk in stream]
+
+            self.assertEqual(chunks, [])
+            self.assertEqual(stream.status_code, 400)
+            self.assertEqual(stream.message, "Bad Request")
+            self.assertIsNone(stream.time_to_first_chunk)
+
+        asyncio.run(run())
+
+
+class TestClientAsyncBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = OpenVoiceApiClientAsync()
+        self.running = 0
+        self.peak = 0
+
+    async def _fake_generate_audio(self, input="", **kwargs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        # Later items finish first to exercise reordering
+        await asyncio.sleep(0.001 * (10 - int(input) % 10))
+        self.running -= 1
+        if input == "3":
+            raise ValueError("Test exception")
+        return input.encode(), 200, "Generated audio bytes"
+
+    def test_generate_audio_many_ordered(self):
+        async def run():
+            specs = ({"input": str(i)} for i in range(20))
+            with patch.object(
+                self.client, "generate_audio", side_effect=self._fake_generate_audio
+            ):
+                results = [
+                    item
+                    async for item in self.client.generate_audio_many(
+                        specs, concurrency=4
+                    )
+                ]
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual([index for index, _ in results], list(range(20)))
+        self.assertEqual(results[0][1], (b"0", 200, "Generated audio bytes"))
+        # A failing item is reported without aborting the batch
+        self.assertEqual(results[3][1], (None, 500, "Internal Server Error"))
+        self.assertLessEqual(self.peak, 4)
+
+    def test_generate_audio_many_as_completed(self):
+        async def run():
+            async def specs():
+                for i in range(10):
+                    yield {"input": str(i)}
+
+            with patch.object(
+                self.client, "generate_audio", side_effect=self._fake_generate_audio
+            ):
+                results = [
+                    item
+                    async for item in self.client.generate_audio_many(
+                        specs(), concurrency=10, ordered=False
+                    )
+                ]
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(sorted(index for index, _ in results), list(range(10)))
+        self.assertNotEqual([index for index, _ in results], list(range(10)))
+
+    def test_generate_audio_many_is_lazy(self):
+        consumed = []
+
+        def specs():
+            for i in range(1000000):
+                consumed.append(i)
+                yield {"input": str(i)}
+
+        async def run():
+            with patch.object(
+                self.client, "generate_audio", side_effect=self._fake_generate_audio
+            ):
+                async for index, result in self.client.generate_audio_many(
+                    specs(), concurrency=2, window=4
+                ):
+                    break
+
+        asyncio.run(run())
+        self.assertLessEqual(len(consumed), 4)
+
+    def test_generate_audio_long(self):
+        async def fake_wav(input="", **kwargs):
+            await asyncio.sleep(0.001 * (5 - len(input) % 5))
+            data = input.encode()
+            info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+            return wav.build_header(info, len(data)) + data, 200, "Generated audio"
+
+        async def run():
+            text = " ".join(f"Sentence number {i}." for i in range(12))
+            with patch.object(self.client, "generate_audio", side_effect=fake_wav):
+                return await self.client.generate_audio_long(input=text, concurrency=4)
+
+        audio_bytes, status_code, message = asyncio.run(run())
+        self.assertEqual(status_code, 200)
+        info = wav.parse_header(audio_bytes)
+        self.assertEqual(
+            audio_bytes[info.data_offset :],
+            "".join(f"Sentence number {i}." for i in range(12)).encode(),
+        )
+
+    def test_iter_audio_from_text(self):
+        async def fake_wav(input="", **kwargs):
+            data = input.encode()
+            info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+            return wav.build_header(info, len(data)) + data, 200, "Generated audio"
+
+        async def run():
+            first_result = asyncio.Event()
+
+            async def tokens():
+                for token in "Hello there. How are you? I am".split(" "):
+                    yield token + " "
+                # The first sentence is delivered while tokens are still coming
+                await asyncio.wait_for(first_result.wait(), 5)
+                yield "fine."
+
+            results = []
+            with patch.object(self.client, "generate_audio", side_effect=fake_wav):
+                async for result in self.client.iter_audio_from_text(tokens()):
+                    results.append(result)
+                    first_result.set()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(
+            [result[0][44:] for result in results],
+            [b"Hello there.", b"How are you?", b"I am fine."],
+        )
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_generate_audio_stacked(self):
+        async def fake_generate_audio(input="", **kwargs):
+            data = np.full(int(input), int(input), dtype="<i2").tobytes()
+            info = wav.WavInfo(1, 1, 24000, 16, 2, 44, len(data))
+            return wav.build_header(info, len(data)) + data, 200, "Generated audio"
+
+        async def run():
+            specs = [{"input": str(i)} for i in (2, 4, 3)]
+            with patch.object(
+                self.client, "generate_audio", side_effect=fake_generate_audio
+            ):
+                return await self.client.generate_audio_stacked(specs, concurrency=2)
+
+        (samples, sample_rate, lengths), status_code, _ = asyncio.run(run())
+        self.assertEqual(status_code, 200)
+        self.assertEqual(samples.shape, (3, 4))
+        self.assertEqual(lengths, [2, 4, 3])
+        self.assertEqual(samples[0].tolist(), [2, 2, 0, 0])
+
+    def test_run_many(self):
+        async def work(value):
+            await asyncio.sleep(0.001 * (5 - value))
+            if value == 3:
+                raise ValueError("Test exception")
+            return value * 2
+
+        async def run():
+            specs = ({"value": i} for i in range(5))
+            return [
+                item async for item in self.client.run_many(work, specs, concurrency=2)
+            ]
+
+        results = asyncio.run(run())
+        self.assertEqual(
+            results,
+            [(0, 0), (1, 2), (2, 4), (3, (None, 500, "Internal Server Error")), (4, 8)],
+        )
+
+    def test_generate_and_change_voice_many(self):
+        running = {"generate": 0, "change": 0}
+        peak = {"generate": 0, "change": 0, "overlap": 0}
+
+        async def stage(name, duration):
+            running[name] += 1
+            peak[name] = max(peak[name], running[name])
+            peak["overlap"] = max(
+                peak["overlap"], min(running["generate"], running["change"])
+            )
+            await asyncio.sleep(duration)
+            running[name] -= 1
+
+        async def fake_generate_audio(input="", **kwargs):
+            self.assertEqual(kwargs["response_format"], "raw")
+            await stage("generate", 0.005)
+            if input == "3":
+                return None, 400, "Bad request"
+            return input.encode(), 200, "Generated audio bytes"
+
+        async def fake_change_voice(audio_data=None, **kwargs):
+            self.assertTrue(kwargs["encode"])
+            await stage("change", 0.01)
+            return audio_data + b"!", 200, "Changed voice"
+
+        async def run():
+            specs = [
+                {"generate": {"input": str(i)}, "change_voice": {"voice": "elon"}}
+                for i in range(12)
+            ]
+            with patch.object(
+                self.client, "generate_audio", side_effect=fake_generate_audio
+            ), patch.object(self.client, "change_voice", side_effect=fake_change_voice):
+                return [
+                    item
+                    async for item in self.client.generate_and_change_voice_many(
+                        specs, generate_concurrency=2, change_concurrency=3
+                    )
+                ]
+
+        results = asyncio.run(run())
+        self.assertEqual([index for index, _ in results], list(range(12)))
+        self.assertEqual(results[0][1], (b"0!", 200, "Changed voice"))
+        # The failed generate_audio result is passed through
+        self.assertEqual(results[3][1], (None, 400, "Bad request"))
+        self.assertLessEqual(peak["generate"], 2)
+        self.assertLessEqual(peak["change"], 3)
+        self.assertGreaterEqual(peak["overlap"], 1)
+
+
+class TestClientAsyncCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_hit_skips_network(self):
+        async def run():
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(return_value=b"audio_bytes_content")
+
+            async with OpenVoiceApiClientAsync(cache=self.cache) as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ) as mock_post:
+                    first = await client.generate_audio(input="Hello")
+                    second = await client.generate_audio(input="Hello")
+                    audio_base64, status_code, message = await client.generate_audio(
+                        input="Hello", response_format="base64"
+                    )
+
+            self.assertEqual(first, second)
+            self.assertEqual(second[0], b"audio_bytes_content")
+            self.assertEqual(base64.b64decode(audio_base64), b"audio_bytes_content")
+            mock_post.assert_called_once()
+            self.assertEqual(self.cache.stats()["hits"], 2)
+
+        asyncio.run(run())
+
+    def test_delivery_errors_return_500(self):
+        async def run():
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(return_value=b"audio_bytes_content")
+            output_file = os.path.join(self.tmp.name, "missing", "output.wav")
+
+            async with OpenVoiceApiClientAsync(
+                cache=self.cache
+            ) as client, OpenVoiceApiClientAsync(coalesce=True) as coalescing:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ):
+                    return [
+                        await client.generate_audio(
+                            input="Hello", output_file=output_file
+                        ),
+                        # Served from the cache
+                        await client.generate_audio(
+                            input="Hello", output_file=output_file
+                        ),
+                        await client.generate_audio_into(
+                            memoryview(bytearray(4)), input="Hello"
+                        ),
+                        await coalescing.generate_audio_into(
+                            memoryview(bytearray(4)), input="Hello"
+                        ),
+                    ]
+
+        for result in asyncio.run(run()):
+            self.assertEqual(result, (None, 500, "Internal Server Error"))
+
+
 if __name__ == "__main__":
     # Run the async tests using asyncio.run()
     asyncio.run(unittest.main())
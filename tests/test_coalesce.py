@@ -0,0 +1,162 @@
+import unittest
+import asyncio
+import base64
+import json
+import sys
+import os
+import time
+from concurrent import futures
+from unittest.mock import patch, MagicMock, AsyncMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.cache import MemoryCache
+
+
+def mock_response(body=b"audio_bytes_content"):
+    response = MagicMock()
+    response.status_code = 200
+    response.status = 200
+    response.content = body
+    response.read = AsyncMock(return_value=body)
+    return response
+
+
+class TestClientCoalesce(unittest.TestCase):
+    def test_identical_calls_share_request(self):
+        def post(*args, **kwargs):
+            time.sleep(0.2)
+            return mock_response()
+
+        client = OpenVoiceApiClient(coalesce=True, max_workers=4)
+
+        with patch("requests.Session.post", side_effect=post) as mock_post:
+            pending = [client.submit_generate_audio(input="Hello") for _ in range(3)]
+            pending.append(
+                client.submit_generate_audio(input="Hello", response_format="base64")
+            )
+            results = [future.result() for future in pending]
+        client.close()
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(
+            json.loads(mock_post.call_args.kwargs["data"])["response_format"], "bytes"
+        )
+        for result in results[:3]:
+            self.assertEqual(
+                result, (b"audio_bytes_content", 200, "Generated audio bytes")
+            )
+        self.assertEqual(
+            results[3][0], base64.b64encode(b"audio_bytes_content").decode("utf-8")
+        )
+        self.assertEqual(client._inflight, {})
+
+    def test_different_payloads_not_shared(self):
+        client = OpenVoiceApiClient(coalesce=True)
+
+        with patch("requests.Session.post", return_value=mock_response()) as mock_post:
+            client.generate_audio(input="Hello")
+            client.generate_audio(input="Hello")
+            client.generate_audio(input="Bye")
+
+        # Sequential calls are not in flight together, and there is no cache
+        self.assertEqual(mock_post.call_count, 3)
+
+    def test_follower_gets_leader_error(self):
+        client = OpenVoiceApiClient(coalesce=True)
+        leader = futures.Future()
+        client._inflight["key"] = leader
+        leader.set_result((None, 503, "Service Unavailable"))
+
+        result = client._fetch_coalesced("key", "key", "/v2/generate-audio", {})
+        self.assertEqual(result, (None, 503, "Service Unavailable"))
+
+
+class TestClientAsyncCoalesce(unittest.TestCase):
+    def _post(self, started, release):
+        async def post(*args, **kwargs):
+            started.set()
+            await release.wait()
+            return mock_response()
+
+        return post
+
+    def test_identical_calls_share_request(self):
+        async def run():
+            started, release = asyncio.Event(), asyncio.Event()
+            client = OpenVoiceApiClientAsync(coalesce=True, memory_cache=MemoryCache())
+
+            with patch(
+                "aiohttp.ClientSession.post", side_effect=self._post(started, release)
+            ) as mock_post:
+                calls = [
+                    asyncio.ensure_future(client.generate_audio(input="Hello"))
+                    for _ in range(5)
+                ]
+                await started.wait()
+                release.set()
+                results = await asyncio.gather(*calls)
+            await client.aclose()
+
+            self.assertEqual(mock_post.call_count, 1)
+            self.assertEqual(
+                {bytes(result[0]) for result in results}, {b"audio_bytes_content"}
+            )
+            self.assertEqual(client._inflight, {})
+
+        asyncio.run(run())
+
+    def test_cancelling_one_caller_keeps_request(self):
+        async def run():
+            started, release = asyncio.Event(), asyncio.Event()
+            client = OpenVoiceApiClientAsync(coalesce=True)
+
+            with patch(
+                "aiohttp.ClientSession.post", side_effect=self._post(started, release)
+            ) as mock_post:
+                first = asyncio.ensure_future(client.generate_audio(input="Hello"))
+                second = asyncio.ensure_future(client.generate_audio(input="Hello"))
+                await started.wait()
+                first.cancel()
+                await asyncio.sleep(0)
+                release.set()
+                result = await second
+            await client.aclose()
+
+            self.assertTrue(first.cancelled())
+            self.assertEqual(result[1], 200)
+            self.assertEqual(mock_post.call_count, 1)
+
+        asyncio.run(run())
+
+    def test_cancelling_every_caller_cancels_request(self):
+        async def run():
+            started, release = asyncio.Event(), asyncio.Event()
+            client = OpenVoiceApiClientAsync(coalesce=True)
+
+            with patch(
+                "aiohttp.ClientSession.post", side_effect=self._post(started, release)
+            ):
+                calls = [
+                    asyncio.ensure_future(client.generate_audio(input="Hello"))
+                    for _ in range(2)
+                ]
+                await started.wait()
+                task = next(iter(client._inflight.values()))[0]
+
+                for call in calls:
+                    call.cancel()
+                await asyncio.gather(*calls, return_exceptions=True)
+                await asyncio.sleep(0)
+            await client.aclose()
+
+            self.assertTrue(task.cancelled())
+            self.assertEqual(client._inflight, {})
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
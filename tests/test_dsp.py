@@ -0,0 +1,323 @@
+import unittest
+import asyncio
+import sys
+import os
+import base64
+from unittest.mock import patch, MagicMock, AsyncMock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.cache import MemoryCache, cache_key, variant_key
+from openvoice_api_client import wav
+
+if np is not None:
+    from openvoice_api_client import dsp
+
+
+def make_wav(samples, sample_rate=22050, channels=1):
+    data = samples.astype("<i2").tobytes()
+    info = wav.WavInfo(1, channels, sample_rate, 16, 2 * channels, 44, len(data))
+    return wav.build_header(info, len(data)) + data
+
+
+def tone(frequency, sample_rate=22050, seconds=1.0, amplitude=0.5):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestResampler(unittest.TestCase):
+    def resample(self, samples, from_rate, to_rate, chunk=None):
+        resampler = dsp.Resampler(from_rate, to_rate)
+        chunk = chunk or len(samples)
+        parts = [
+            resampler.feed(samples[i : i + chunk])
+            for i in range(0, len(samples), chunk)
+        ]
+        return np.concatenate(parts + [resampler.flush()])
+
+    def test_tone_is_kept(self):
+        output = self.resample(tone(440), 22050, 8000)
+        expected = tone(440, sample_rate=8000)
+
+        self.assertEqual(len(output), 8000)
+        self.assertLess(np.max(np.abs(output[200:-200] - expected[200:-200])), 1e-4)
+
+    def test_aliasing_is_filtered(self):
+        # 6 kHz is above the Nyquist frequency of 8 kHz audio
+        output = self.resample(tone(6000), 22050, 8000)
+        self.assertLess(np.sqrt(np.mean(output[200:-200] ** 2)), 1e-3)
+
+    def test_chunks_match_whole(self):
+        samples = np.random.default_rng(0).normal(0, 0.1, 10000)
+
+        for from_rate, to_rate in ((22050, 8000), (24000, 16000), (8000, 16000)):
+            whole = self.resample(samples, from_rate, to_rate)
+            chunked = self.resample(samples, from_rate, to_rate, chunk=777)
+            self.assertEqual(len(whole), -(-len(samples) * to_rate // from_rate))
+            np.testing.assert_array_equal(whole, chunked)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestEncoding(unittest.TestCase):
+    def test_mulaw(self):
+        samples = np.array([0, 1, -1, 32767, -32768], dtype="<i2")
+        self.assertEqual(
+            dsp.mulaw_encode(samples).tolist(), [0xFF, 0xFF, 0x7F, 0x80, 0x00]
+        )
+
+    def test_mulaw_decode(self):
+        codes = np.array([0xFF, 0x7F, 0x80, 0x00], dtype=np.uint8)
+        self.assertEqual(dsp.mulaw_decode(codes).tolist(), [0, 0, 32124, -32124])
+
+        # Full scale is clipped to the largest code
+        samples = np.arange(-32000, 32000, dtype=np.int64)
+        decoded = dsp.mulaw_decode(dsp.mulaw_encode(samples)).astype(np.int64)
+        # Quantisation steps grow with the level, about 1/16 of it at most
+        bound = np.maximum(np.abs(samples) / 14, 8)
+        self.assertTrue((np.abs(decoded - samples) <= bound).all())
+
+    def test_rms_gain(self):
+        samples = tone(440, amplitude=0.01)
+        gain = dsp.rms_gain(samples, -20.0)
+        rms = np.sqrt(np.mean((samples * gain) ** 2))
+
+        self.assertAlmostEqual(20 * np.log10(rms), -20.0, places=3)
+        self.assertEqual(dsp.rms_gain(np.zeros(10), -20.0), 1.0)
+        # Never above full scale
+        self.assertLessEqual(dsp.rms_gain(np.array([0.9, 0.0]), 0.0) * 0.9, 1.0)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestPostProcessor(unittest.TestCase):
+    def setUp(self):
+        self.audio = make_wav(tone(300, amplitude=0.1) * 32767)
+
+    def test_mulaw_wav(self):
+        output = dsp.PostProcessor().process(self.audio)
+        info = wav.parse_header(output)
+
+        self.assertEqual((info.audio_format, info.sample_rate), (7, 8000))
+        self.assertEqual(info.data_size, 8000)
+        self.assertEqual(len(output), info.data_offset + 8000)
+
+    def test_pcm16_loudness(self):
+        processor = dsp.PostProcessor(16000, "pcm16", loudness=-18.0)
+        samples, sample_rate = wav.to_numpy(processor.process(self.audio))
+        rms = np.sqrt(np.mean((samples / 32768) ** 2))
+
+        self.assertEqual(sample_rate, 16000)
+        self.assertAlmostEqual(20 * np.log10(rms), -18.0, places=2)
+
+    def test_stereo_is_downmixed(self):
+        samples = np.repeat(tone(300, amplitude=0.1) * 32767, 2)
+        audio = make_wav(samples, channels=2)
+        output = dsp.PostProcessor(container="raw").process(audio)
+        self.assertEqual(len(output), 8000)
+
+    def test_to_numpy(self):
+        for container in ("wav", "raw"):
+            for encoding in ("mulaw", "pcm16"):
+                processor = dsp.PostProcessor(encoding=encoding, container=container)
+                samples, sample_rate = processor.to_numpy(processor.process(self.audio))
+
+                self.assertEqual((sample_rate, len(samples)), (8000, 8000))
+                self.assertEqual(samples.dtype, np.dtype("<i2"))
+                rms = np.sqrt(np.mean((samples / 32768) ** 2))
+                self.assertAlmostEqual(20 * np.log10(rms), -20.0, delta=0.2)
+
+    def test_stream_matches_process(self):
+        processor = dsp.PostProcessor(16000, "pcm16", loudness=None)
+        stream = processor.stream()
+        chunks = [
+            stream.feed(self.audio[i : i + 1001])
+            for i in range(0, len(self.audio), 1001)
+        ]
+        output = b"".join(chunks) + stream.close()
+        expected = processor.process(self.audio)
+
+        self.assertEqual(output[44:], expected[44:])
+        self.assertEqual(wav.parse_header(output).data_size, len(output) - 44)
+        self.assertEqual(stream.header(), expected[:44])
+
+    def test_stream_errors(self):
+        with self.assertRaises(ValueError):
+            dsp.PostProcessor().stream().feed(b"ID3 not a wav file")
+
+        stream = dsp.PostProcessor().stream()
+        stream.feed(self.audio[:20])
+        with self.assertRaises(ValueError):
+            stream.close()
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestClientPostProcess(unittest.TestCase):
+    def setUp(self):
+        self.audio = make_wav(tone(300, amplitude=0.1) * 32767)
+        self.processor = dsp.PostProcessor()
+        self.expected = self.processor.process(self.audio)
+
+    def mock_response(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.content = self.audio
+        return response
+
+    def test_bytes(self):
+        client = OpenVoiceApiClient(postprocess=self.processor)
+
+        with patch("requests.Session.post", return_value=self.mock_response()):
+            audio_bytes, status_code, _ = client.generate_audio(input="Hello")
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(audio_bytes, self.expected)
+
+    def test_numpy(self):
+        expected = self.processor.to_numpy(self.expected)[0]
+        raw = dsp.PostProcessor(container="raw")
+
+        for client in (
+            OpenVoiceApiClient(postprocess=self.processor),
+            OpenVoiceApiClient(postprocess=self.processor, memory_cache=MemoryCache()),
+            OpenVoiceApiClient(postprocess=raw, coalesce=True),
+        ):
+            with patch("requests.Session.post", return_value=self.mock_response()):
+                (samples, sample_rate), status_code, _ = client.generate_audio(
+                    input="Hello", response_format="numpy"
+                )
+
+            self.assertEqual((status_code, sample_rate), (200, 8000))
+            np.testing.assert_array_equal(samples, expected)
+
+    def test_stacked(self):
+        client = OpenVoiceApiClient(postprocess=self.processor)
+
+        with patch("requests.Session.post", return_value=self.mock_response()):
+            (samples, sample_rate, lengths), status_code, _ = (
+                client.generate_audio_stacked([{"input": "Hello"}, {"input": "Bye"}])
+            )
+
+        self.assertEqual((status_code, sample_rate), (200, 8000))
+        self.assertEqual(samples.shape, (2, 8000))
+        self.assertEqual(lengths, [8000, 8000])
+
+    def test_long(self):
+        raw = dsp.PostProcessor(container="raw", loudness=-18.0)
+        text = "First sentence. Second one."
+        # Pieces are joined first, loudness is measured over the whole text
+        expected = raw.process(wav.concatenate([self.audio, self.audio]))
+
+        async def run_async():
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(return_value=self.audio)
+
+            async with OpenVoiceApiClientAsync(postprocess=raw) as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ):
+                    return await client.generate_audio_long(input=text)
+
+        client = OpenVoiceApiClient(postprocess=raw)
+        with patch(
+            "requests.Session.post", return_value=self.mock_response()
+        ), patch.object(raw, "process", wraps=raw.process) as process:
+            result = client.generate_audio_long(input=text)
+            process.assert_called_once()
+
+        for audio_bytes, status_code, _ in (result, asyncio.run(run_async())):
+            self.assertEqual(status_code, 200)
+            self.assertEqual(audio_bytes, expected)
+
+    def test_async_numpy(self):
+        async def run():
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(return_value=self.audio)
+
+            async with OpenVoiceApiClientAsync(
+                postprocess=self.processor, memory_cache=MemoryCache()
+            ) as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ):
+                    return [
+                        await client.generate_audio(
+                            input="Hello", response_format="numpy"
+                        ),
+                        # Served from the cache
+                        await client.generate_audio(
+                            input="Hello", response_format="numpy"
+                        ),
+                    ]
+
+        expected = self.processor.to_numpy(self.expected)[0]
+
+        for (samples, sample_rate), status_code, _ in asyncio.run(run()):
+            self.assertEqual((status_code, sample_rate), (200, 8000))
+            np.testing.assert_array_equal(samples, expected)
+
+    def test_processed_audio_is_cached(self):
+        cache = MemoryCache()
+        client = OpenVoiceApiClient(postprocess=self.processor, memory_cache=cache)
+
+        with patch(
+            "requests.Session.post", return_value=self.mock_response()
+        ) as mock_post, patch.object(
+            self.processor, "process", wraps=self.processor.process
+        ) as process:
+            first = client.generate_audio(input="Hello")
+            second = client.generate_audio(input="Hello", response_format="base64")
+
+        self.assertEqual(first[0], self.expected)
+        self.assertEqual(base64.b64decode(second[0]), self.expected)
+        mock_post.assert_called_once()
+        process.assert_called_once()
+
+        # The raw audio is kept next to it for other post-processors
+        key = cache_key(
+            "v2", {"model": "en", "input": "Hello", "speed": 1.0, "voice": "raw"}
+        )
+        self.assertEqual(bytes(cache.get(key)), self.audio)
+        self.assertEqual(
+            bytes(cache.get(variant_key(key, self.processor.key))), self.expected
+        )
+
+    def test_async_stream(self):
+        async def run():
+            async def iter_chunked(chunk_size):
+                for i in range(0, len(self.audio), 1000):
+                    yield self.audio[i : i + 1000]
+
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+            mock_post = MagicMock()
+            mock_post.return_value.__aenter__.return_value = mock_response
+
+            async with OpenVoiceApiClientAsync(postprocess=self.processor) as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    stream = client.stream_audio(input="Hello")
+                    chunks = [chunk async for chunk in stream]
+
+            return b"".join(chunks), stream
+
+        output, stream = asyncio.run(run())
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(wav.parse_header(output).sample_rate, 8000)
+        self.assertEqual(len(output), len(self.expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+import unittest
+import asyncio
+import sys
+import os
+import json
+import time
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.endpoints import EndpointPool
+
+
+class TestEndpointPool(unittest.TestCase):
+    def test_least_outstanding(self):
+        pool = EndpointPool(["http://a", "http://b/"])
+        first = pool.acquire()
+        second = pool.acquire()
+
+        self.assertNotEqual(first.url, second.url)
+        self.assertEqual({first.url, second.url}, {"http://a", "http://b"})
+
+    def test_latency_weighting(self):
+        pool = EndpointPool(["http://fast", "http://slow"])
+        fast, slow = pool.endpoints
+        fast.latency = 0.1
+        slow.latency = 1.0
+
+        picked = [pool.acquire().url for _ in range(5)]
+
+        # The fast node takes requests until (n + 1) * 0.1 exceeds the slow one
+        self.assertEqual(picked, ["http://fast"] * 5)
+        self.assertEqual(fast.outstanding, 5)
+
+    def test_latency_average(self):
+        pool = EndpointPool(["http://a"], decay=0.5)
+        endpoint = pool.acquire()
+        pool.release(endpoint, 1.0, True)
+        pool.release(pool.acquire(), 3.0, True)
+
+        self.assertEqual(endpoint.latency, 2.0)
+        self.assertEqual(endpoint.outstanding, 0)
+
+    def test_ejection_and_fail_open(self):
+        pool = EndpointPool(["http://a", "http://b"], max_failures=2, eject_time=60)
+        a, b = pool.endpoints
+
+        for _ in range(2):
+            a.outstanding += 1
+            pool.release(a, 0.0, False)
+
+        self.assertEqual([pool.acquire().url for _ in range(3)], ["http://b"] * 3)
+
+        for _ in range(2):
+            pool.release(b, 0.0, False)
+        # With every node ejected the one coming back first is still used
+        self.assertEqual(pool.acquire().url, "http://a")
+        self.assertEqual(a.ejections, 1)
+
+    def test_ejection_backoff(self):
+        pool = EndpointPool(
+            ["http://a"], max_failures=1, eject_time=10, max_eject_time=25
+        )
+        endpoint = pool.endpoints[0]
+
+        with patch("time.monotonic", return_value=100.0):
+            for expected in (110.0, 120.0, 125.0):
+                endpoint.outstanding += 1
+                pool.release(endpoint, 0.0, False)
+                self.assertEqual(endpoint.ejected_until, expected)
+
+    def test_probe(self):
+        pool = EndpointPool(["http://a", "http://b"], probe_path="/v2/generate-audio")
+        a, b = pool.endpoints
+        a.ejected_until = float("inf")
+        session = MagicMock()
+        session.get.side_effect = lambda url, timeout: MagicMock(
+            status_code=405 if url.startswith("http://a") else 502
+        )
+
+        pool.probe(session)
+
+        session.get.assert_any_call("http://a/v2/generate-audio", timeout=2.0)
+        self.assertEqual(a.ejected_until, 0.0)
+        self.assertGreater(b.ejected_until, 0.0)
+
+    def test_probe_thread(self):
+        pool = EndpointPool(["http://a"], probe_interval=0.01)
+
+        with patch.object(pool, "probe") as mock_probe:
+            pool.start_probing()
+            pool.start_probing()
+            thread = pool._probe_thread
+            while mock_probe.call_count < 2:
+                time.sleep(0.01)
+
+            # Probing goes on until every owner has stopped
+            pool.stop_probing()
+            self.assertIs(pool._probe_thread, thread)
+            pool.stop_probing()
+            pool.stop_probing()
+
+        self.assertIsNone(pool._probe_thread)
+        self.assertFalse(thread.is_alive())
+
+
+class TestClientEndpoints(unittest.TestCase):
+    @patch("requests.Session.post")
+    def test_requests_spread_over_pool(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        mock_post.return_value = mock_response
+        client = OpenVoiceApiClient(["http://a", "http://b"])
+
+        client.generate_audio(input="Hello")
+        client.generate_audio(input="Hello")
+
+        urls = {call.args[0] for call in mock_post.call_args_list}
+        self.assertTrue(
+            urls <= {"http://a/v2/generate-audio", "http://b/v2/generate-audio"}
+        )
+        self.assertEqual(sum(e.outstanding for e in client.endpoints.endpoints), 0)
+
+    @patch("time.sleep")
+    @patch("requests.Session.post")
+    def test_failures_eject(self, mock_post, mock_sleep):
+        mock_response = MagicMock()
+        mock_response.status_code = 503
+        mock_response.headers = {}
+        mock_response.content = json.dumps(
+            {"result": {"message": "Service Unavailable"}}
+        ).encode("utf-8")
+        mock_post.return_value = mock_response
+        pool = EndpointPool(["http://a"], max_failures=2)
+
+        OpenVoiceApiClient(pool).generate_audio(input="Hello")
+        OpenVoiceApiClient(pool).generate_audio(input="Hello")
+
+        self.assertFalse(pool.stats()[0]["available"])
+
+    def test_shared_pool_probing(self):
+        async def run():
+            pool = EndpointPool(["http://a"], probe_interval=0.01)
+
+            with patch.object(pool, "probe") as probe:
+                sync_client = OpenVoiceApiClient(pool)
+                sync_client._get_session()
+                clients = [OpenVoiceApiClientAsync(pool) for _ in range(2)]
+                for client in clients:
+                    client._get_session()
+                thread = pool._probe_thread
+
+                # Clients that never opened a session do not stop probing
+                OpenVoiceApiClient(pool).close()
+                sync_client.close()
+                await clients[0].aclose()
+                probed = probe.call_count
+                while probe.call_count < probed + 2:
+                    await asyncio.sleep(0.01)
+
+                self.assertIs(pool._probe_thread, thread)
+                await clients[1].aclose()
+
+            self.assertIsNone(pool._probe_thread)
+            self.assertFalse(thread.is_alive())
+
+        asyncio.run(run())
+
+    def test_async_probing_counted_once(self):
+        async def run():
+            pool = EndpointPool(["http://a"], probe_interval=0.01)
+
+            with patch.object(pool, "probe"):
+                client = OpenVoiceApiClientAsync(pool)
+                await client._get_session().close()
+                # A closed session is recreated without another probe owner
+                client._get_session()
+                thread = pool._probe_thread
+                await client.aclose()
+                await client.aclose()
+
+            self.assertEqual(pool._probe_owners, 0)
+            self.assertIsNone(pool._probe_thread)
+            self.assertFalse(thread.is_alive())
+
+        asyncio.run(run())
+
+    def test_async_stream_uses_pool(self):
+        async def run():
+            async def iter_chunked(chunk_size):
+                yield b"audio"
+
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+            mock_post = MagicMock()
+            mock_post.return_value.__aenter__.return_value = mock_response
+
+            async with OpenVoiceApiClientAsync(["http://a"]) as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    stream = client.stream_audio(input="Hello")
+                    self.assertIsNone(stream.url)
+                    async for chunk in stream:
+                        pass
+
+            self.assertEqual(stream.url, "http://a/v2/generate-audio")
+            self.assertEqual(client.endpoints.endpoints[0].outstanding, 0)
+            self.assertIsNotNone(client.endpoints.endpoints[0].latency)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import asyncio
+import sys
+import os
+import tempfile
+from unittest.mock import patch, MagicMock, AsyncMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.instrumentation import (
+    RequestTiming,
+    TimedHTTPAdapter,
+    emit,
+    queue_wait,
+)
+
+
+class TestRequestTiming(unittest.TestCase):
+    def test_record_fields(self):
+        timing = RequestTiming("http://localhost:5000/v2/generate-audio")
+        timing.finish()
+        record = timing.as_dict()
+
+        self.assertEqual(record["url"], "http://localhost:5000/v2/generate-audio")
+        self.assertGreaterEqual(record["total"], 0)
+        self.assertEqual(record["bytes_in"], 0)
+        self.assertNotIn("started", record)
+
+    def test_queue_wait_from_context(self):
+        token = queue_wait.set(0.5)
+        try:
+            self.assertEqual(RequestTiming("url").queue_wait, 0.5)
+        finally:
+            queue_wait.reset(token)
+
+    def test_failing_hook_does_not_stop_others(self):
+        received = []
+
+        def broken(timing):
+            raise RuntimeError("boom")
+
+        emit([broken, received.append], RequestTiming("url"))
+        self.assertEqual(len(received), 1)
+
+
+class TestClientHooks(unittest.TestCase):
+    def test_session_uses_timed_adapter(self):
+        with OpenVoiceApiClient() as client:
+            adapter = client._get_session().get_adapter("http://localhost:5000")
+            self.assertIsInstance(adapter, TimedHTTPAdapter)
+
+    @patch("requests.Session.post")
+    def test_hook_receives_record(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        mock_post.return_value = mock_response
+        records = []
+        client = OpenVoiceApiClient(hooks=[records.append])
+
+        client.generate_audio(input="Hello")
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].status_code, 200)
+        self.assertEqual(records[0].bytes_in, len(b"audio_bytes_content"))
+        self.assertIsNone(records[0].error)
+
+    @patch("requests.Session.post")
+    def test_hook_records_file_write(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"audio_", b"bytes"]
+        mock_post.return_value = mock_response
+        records = []
+        client = OpenVoiceApiClient(hooks=[records.append])
+
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "output.wav")
+            client.generate_audio(input="Hello", output_file=output_file)
+
+        self.assertEqual(records[0].bytes_in, 11)
+        self.assertGreater(records[0].file_write, 0)
+
+    @patch("requests.Session.post", side_effect=ConnectionError("refused"))
+    def test_hook_records_error(self, mock_post):
+        records = []
+        client = OpenVoiceApiClient(hooks=[records.append])
+
+        result = client.generate_audio(input="Hello")
+
+        self.assertEqual(result, (None, 500, "Internal Server Error"))
+        self.assertEqual(records[0].error, "ConnectionError: refused")
+        self.assertIsNone(records[0].status_code)
+
+    @patch("requests.Session.post")
+    def test_batch_records_queue_wait(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        mock_post.return_value = mock_response
+        records = []
+
+        with OpenVoiceApiClient(max_workers=1, hooks=[records.append]) as client:
+            list(client.generate_audio_many([{"input": "Hello"}] * 3))
+
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(record.queue_wait > 0 for record in records))
+
+
+class TestClientAsyncHooks(unittest.TestCase):
+    def test_hook_receives_record(self):
+        async def run():
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(return_value=b"audio_bytes_content")
+            records = []
+
+            async with OpenVoiceApiClientAsync(hooks=[records.append]) as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ) as mock_post:
+                    await client.generate_audio(input="Hello")
+
+                self.assertIs(
+                    mock_post.call_args.kwargs["trace_request_ctx"], records[0]
+                )
+                self.assertTrue(client._get_session().trace_configs)
+
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0].status_code, 200)
+            self.assertEqual(records[0].bytes_in, len(b"audio_bytes_content"))
+
+        asyncio.run(run())
+
+    def test_stream_audio_record(self):
+        async def run():
+            async def iter_chunked(chunk_size):
+                for chunk in (b"audio_", b"bytes"):
+                    yield chunk
+
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+            mock_post = MagicMock()
+            mock_post.return_value.__aenter__.return_value = mock_response
+            records = []
+
+            async with OpenVoiceApiClientAsync(hooks=[records.append]) as client:
+                with patch("aiohttp.ClientSession.post", mock_post):
+                    stream = client.stream_audio(input="Hello")
+                    async for chunk in stream:
+                        pass
+
+            self.assertEqual(records, [stream.timing])
+            self.assertEqual(records[0].bytes_in, 11)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.jobs import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "jobs.db")
+        self.client = OpenVoiceApiClientAsync()
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def _fake_generate_audio(self, input="", output_file=None, **kwargs):
+        self.calls.append(input)
+        await asyncio.sleep(0.001)
+        if input == "3":
+            return None, 400, "Bad request"
+        if input == "4":
+            raise ValueError("Test exception")
+        return output_file, 200, "Generated audio file"
+
+    def specs(self, count):
+        return [{"input": str(i), "output_file": f"{i}.wav"} for i in range(count)]
+
+    def run_queue(self, queue, progress=None):
+        async def run():
+            with patch.object(
+                self.client, "generate_audio", side_effect=self._fake_generate_audio
+            ):
+                return await queue.run(progress)
+
+        return asyncio.run(run())
+
+    def test_add_skips_known_specs(self):
+        with JobQueue(self.client, self.path, page_size=3) as queue:
+            self.assertEqual(queue.add(self.specs(10)), 10)
+            self.assertEqual(queue.add(self.specs(12)), 2)
+            self.assertEqual(queue.counts(), {"pending": 12, "done": 0, "failed": 0})
+
+            with self.assertRaises(ValueError):
+                queue.add(self.specs(1), method="stream_audio")
+
+    def test_run(self):
+        reports = []
+
+        with JobQueue(
+            self.client, self.path, concurrency=4, commit_every=3, page_size=4
+        ) as queue:
+            queue.add(self.specs(10))
+            progress = self.run_queue(
+                queue, lambda progress: reports.append(progress.done)
+            )
+
+            self.assertEqual(sorted(self.calls), sorted(str(i) for i in range(10)))
+            self.assertEqual(queue.counts(), {"pending": 0, "done": 8, "failed": 2})
+            self.assertEqual(
+                (progress.done, progress.failed, progress.pending), (8, 2, 0)
+            )
+            # Committed in batches of 3, then the rest
+            self.assertEqual(len(reports), 4)
+
+            failed = list(queue.results("failed"))
+            self.assertEqual([job[2] for job in failed], [400, 500])
+            done = list(queue.results())
+            self.assertEqual(done[0][1], {"input": "0", "output_file": "0.wav"})
+            self.assertEqual(done[0][4], "0.wav")
+
+    def test_resume(self):
+        with JobQueue(self.client, self.path, concurrency=2) as queue:
+            queue.add(self.specs(20))
+
+            async def run():
+                with patch.object(
+                    self.client,
+                    "generate_audio",
+                    side_effect=self._fake_generate_audio,
+                ):
+                    task = asyncio.ensure_future(queue.run())
+                    while len(self.calls) < 6:
+                        await asyncio.sleep(0.001)
+                    task.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await task
+
+            asyncio.run(run())
+
+        # Jobs finished before the run stopped are kept
+        with JobQueue(self.client, self.path) as queue:
+            counts = queue.counts()
+            self.assertGreaterEqual(counts["done"] + counts["failed"], 4)
+            first = list(self.calls)
+            self.calls = []
+            self.run_queue(queue)
+
+            self.assertEqual(queue.counts()["pending"], 0)
+            self.assertEqual(len(self.calls), counts["pending"])
+            self.assertEqual(
+                sorted(set(first) | set(self.calls)),
+                sorted(str(i) for i in range(20)),
+            )
+
+    def test_retry_failed(self):
+        with JobQueue(self.client, self.path) as queue:
+            queue.add(self.specs(5))
+            self.run_queue(queue)
+            self.assertEqual(queue.retry_failed(), 2)
+
+            self.calls = []
+            self.run_queue(queue)
+            self.assertEqual(sorted(self.calls), ["3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
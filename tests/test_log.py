@@ -0,0 +1,107 @@
+import unittest
+import logging
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.log import LazyJson, configure_logger, truncate
+
+
+class TestConfigureLogger(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("openvoice_api_client.tests.log")
+        self.logger.handlers = []
+
+    def test_single_handler(self):
+        first = configure_logger(self.logger, logging.INFO)
+        second = configure_logger(self.logger, logging.DEBUG)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.logger.handlers, [first])
+        self.assertEqual(self.logger.level, logging.DEBUG)
+
+    def test_format_is_kept_unless_given(self):
+        handler = configure_logger(self.logger, log_format="%(message)s")
+        configure_logger(self.logger)
+        self.assertEqual(handler.formatter._fmt, "%(message)s")
+
+        configure_logger(self.logger, log_format="%(levelname)s %(message)s")
+        self.assertEqual(handler.formatter._fmt, "%(levelname)s %(message)s")
+
+    def test_clients_share_handler(self):
+        for _ in range(3):
+            OpenVoiceApiClient()
+            OpenVoiceApiClientAsync()
+
+        for name in ("client", "client_async"):
+            logger = logging.getLogger(f"openvoice_api_client.{name}")
+            handlers = [
+                handler
+                for handler in logger.handlers
+                if getattr(handler, "_openvoice_api_client", False)
+            ]
+            self.assertEqual(len(handlers), 1)
+
+
+class TestTruncate(unittest.TestCase):
+    def test_truncates_long_and_binary_values(self):
+        data = {
+            "input": "Hello",
+            "audio_data": "A" * 1000,
+            "raw": b"\x00" * 10,
+            "nested": [{"audio_data": "B" * 100}],
+        }
+        result = truncate(data, max_length=8)
+
+        self.assertEqual(result["input"], "Hello")
+        self.assertEqual(result["audio_data"], "AAAAAAAA...<1000 chars>")
+        self.assertEqual(result["raw"], "<10 bytes>")
+        self.assertEqual(result["nested"][0]["audio_data"], "BBBBBBBB...<100 chars>")
+        self.assertEqual(len(data["audio_data"]), 1000)
+
+    def test_lazy_json_formats_on_str(self):
+        with patch(
+            "openvoice_api_client.log.json.dumps", return_value="{}"
+        ) as mock_dumps:
+            value = LazyJson({"input": "Hello"})
+            mock_dumps.assert_not_called()
+            str(value)
+            mock_dumps.assert_called_once()
+
+
+class TestClientLogging(unittest.TestCase):
+    @patch("requests.Session.post")
+    def test_payload_not_serialised_at_info(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        mock_post.return_value = mock_response
+        client = OpenVoiceApiClient(log_level=logging.INFO)
+
+        with patch("openvoice_api_client.log.json.dumps") as mock_dumps:
+            client.change_voice(voice="raw", audio_data=b"audio" * 1000, encode=True)
+
+        mock_dumps.assert_not_called()
+
+    @patch("requests.Session.post")
+    def test_payload_truncated_at_debug(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+        mock_post.return_value = mock_response
+        client = OpenVoiceApiClient(log_level=logging.DEBUG)
+
+        with self.assertLogs(client.logger, logging.DEBUG) as logs:
+            client.change_voice(voice="raw", audio_data=b"audio" * 1000, encode=True)
+
+        client.logger.setLevel(logging.WARNING)
+        self.assertTrue(any("<6668 chars>" in line for line in logs.output))
+        self.assertTrue(all(len(line) < 1000 for line in logs.output))
+
+
+if __name__ == "__main__":
+    unittest.main()
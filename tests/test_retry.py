@@ -0,0 +1,233 @@
+import unittest
+import asyncio
+import sys
+import os
+import json
+import email.utils
+import time
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import aiohttp
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.retry import ApiResult, RetryPolicy, parse_retry_after
+
+
+def mock_response(status, body=b"audio_bytes_content", retry_after=None):
+    if status != 200:
+        body = json.dumps({"result": {"message": "Service Unavailable"}}).encode()
+
+    response = MagicMock()
+    response.status_code = status
+    response.status = status
+    response.headers = {} if retry_after is None else {"Retry-After": retry_after}
+    response.content = body
+    response.read = AsyncMock(return_value=body)
+    return response
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("-1"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(date), 30, delta=2)
+
+    def test_full_jitter_backoff(self):
+        policy = RetryPolicy(max_retries=5, backoff_base=1.0, backoff_max=4.0)
+
+        for retries in range(5):
+            window = min(4.0, 2.0**retries)
+            for _ in range(20):
+                delay = policy.next_delay(retries, 0)
+                self.assertTrue(0 <= delay <= window)
+
+        self.assertIsNone(policy.next_delay(5, 0))
+
+    def test_retry_after_and_total_budget(self):
+        policy = RetryPolicy(max_total=10)
+
+        self.assertEqual(policy.next_delay(0, 0, retry_after=2.5), 2.5)
+        self.assertIsNone(policy.next_delay(0, 9, retry_after=2.5))
+        self.assertLess(
+            RetryPolicy(respect_retry_after=False).next_delay(0, 0, 100), 0.5 + 1e-9
+        )
+
+    def test_idempotency(self):
+        policy = RetryPolicy(idempotent=False)
+        error = requests.exceptions.ConnectionError()
+        transient = (requests.exceptions.ConnectionError,)
+
+        self.assertTrue(policy.retry_status(503))
+        self.assertFalse(policy.retry_status(502))
+        self.assertTrue(policy.retry_exception(error, False, transient))
+        self.assertFalse(policy.retry_exception(error, True, transient))
+        self.assertTrue(RetryPolicy().retry_exception(error, True, transient))
+        self.assertFalse(RetryPolicy().retry_exception(ValueError(), False, ()))
+
+    def test_api_result_is_a_tuple(self):
+        result = ApiResult(b"audio", 200, "Generated audio bytes", retries=2)
+        data, status_code, message = result
+
+        self.assertEqual(result, (b"audio", 200, "Generated audio bytes"))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(result.retries, 2)
+        self.assertEqual(ApiResult(None, 500, "").retries, 0)
+
+        # Copies keep the retries unless replaced
+        self.assertEqual(result._replace(status_code=500).retries, 2)
+        self.assertEqual(result._replace(retries=1).retries, 1)
+        self.assertEqual(ApiResult._make(result, retries=3).retries, 3)
+
+
+class TestClientRetry(unittest.TestCase):
+    @patch("time.sleep")
+    @patch("requests.Session.post")
+    def test_retries_until_success(self, mock_post, mock_sleep):
+        mock_post.side_effect = [
+            mock_response(503, retry_after="2"),
+            requests.exceptions.ConnectionError("reset"),
+            mock_response(200),
+        ]
+        client = OpenVoiceApiClient(retry=RetryPolicy(max_retries=3))
+
+        result = client.generate_audio(input="Hello")
+
+        self.assertEqual(result, (b"audio_bytes_content", 200, "Generated audio bytes"))
+        self.assertEqual(result.retries, 2)
+        self.assertEqual(mock_sleep.call_args_list[0].args, (2.0,))
+
+    @patch("time.sleep")
+    @patch("requests.Session.post")
+    def test_gives_up_after_max_retries(self, mock_post, mock_sleep):
+        mock_post.return_value = mock_response(503)
+        client = OpenVoiceApiClient(retry=RetryPolicy(max_retries=2))
+
+        result = client.generate_audio(input="Hello")
+
+        self.assertEqual(result, (None, 503, "Service Unavailable"))
+        self.assertEqual(result.retries, 2)
+        self.assertEqual(mock_post.call_count, 3)
+
+    @patch("requests.Session.post")
+    def test_no_retry_by_default_or_on_client_errors(self, mock_post):
+        mock_post.return_value = mock_response(503)
+        self.assertEqual(OpenVoiceApiClient().generate_audio(input="Hello").retries, 0)
+
+        mock_post.reset_mock()
+        mock_post.return_value = mock_response(400)
+        client = OpenVoiceApiClient(retry=RetryPolicy())
+        self.assertEqual(client.generate_audio(input="Hello")[1], 400)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch("time.sleep")
+    @patch("requests.Session.post")
+    def test_every_result_has_retries(self, mock_post, mock_sleep):
+        client = OpenVoiceApiClient(retry=RetryPolicy(max_retries=1))
+
+        result = client.change_voice(voice="elon", audio_file="/nonexistent.wav")
+        self.assertEqual((result.status_code, result.retries), (500, 0))
+
+        # The failed sentence was retried once
+        mock_post.side_effect = [mock_response(503), mock_response(503)]
+        result = client.generate_audio_long(input="Hello there.")
+        self.assertEqual((result.status_code, result.retries), (503, 1))
+
+        # Not WAV audio cannot be stacked
+        mock_post.side_effect = None
+        mock_post.return_value = mock_response(200)
+        result = client.generate_audio_stacked([{"input": "Hello"}])
+        self.assertEqual((result.status_code, result.retries), (500, 0))
+
+        with patch.object(client, "generate_audio", side_effect=ValueError("Test")):
+            _, result = list(client.generate_audio_many([{"input": "Hello"}]))[0]
+        self.assertEqual((result.status_code, result.retries), (500, 0))
+
+
+class TestClientAsyncRetry(unittest.TestCase):
+    def test_retries_until_success(self):
+        async def run():
+            mock_post = AsyncMock(
+                side_effect=[
+                    mock_response(502),
+                    aiohttp.ServerDisconnectedError(),
+                    mock_response(200),
+                ]
+            )
+            client = OpenVoiceApiClientAsync(retry=RetryPolicy(max_retries=3))
+
+            with patch("aiohttp.ClientSession.post", mock_post), patch(
+                "asyncio.sleep", new_callable=AsyncMock
+            ) as mock_sleep:
+                result = await client.generate_audio(input="Hello")
+            await client.aclose()
+
+            self.assertEqual(result[1], 200)
+            self.assertEqual(result.retries, 2)
+            self.assertEqual(mock_sleep.await_count, 2)
+
+        asyncio.run(run())
+
+    def test_error_body_from_server(self):
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        async def generate_audio(request):
+            payload = await request.json()
+            if payload["input"] == "Hello":
+                return web.json_response(
+                    {"result": {"message": "GPU node restarting"}}, status=503
+                )
+            return web.json_response({"result": {"message": "Bad Request"}}, status=400)
+
+        async def run():
+            app = web.Application()
+            app.router.add_post("/v2/generate-audio", generate_audio)
+
+            async with TestServer(app) as server:
+                async with OpenVoiceApiClientAsync(
+                    str(server.make_url("")),
+                    retry=RetryPolicy(max_retries=2, backoff_base=0.001),
+                ) as client:
+                    return (
+                        await client.generate_audio(input="Hello"),
+                        await client.generate_audio(input=""),
+                    )
+
+        unavailable, bad_request = asyncio.run(run())
+        self.assertEqual(unavailable, (None, 503, "GPU node restarting"))
+        self.assertEqual(unavailable.retries, 2)
+        self.assertEqual(bad_request, (None, 400, "Bad Request"))
+        self.assertEqual(bad_request.retries, 0)
+
+    def test_every_result_has_retries(self):
+        async def run():
+            async with OpenVoiceApiClientAsync() as client:
+                results = [
+                    await client.change_voice(
+                        voice="elon", audio_file="/nonexistent.wav"
+                    )
+                ]
+
+                with patch.object(
+                    client, "generate_audio", side_effect=ValueError("Test")
+                ):
+                    async for _, result in client.generate_audio_many(
+                        [{"input": "Hello"}]
+                    ):
+                        results.append(result)
+            return results
+
+        for result in asyncio.run(run()):
+            self.assertEqual((result.status_code, result.retries), (500, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
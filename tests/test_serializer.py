@@ -0,0 +1,140 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from unittest.mock import patch, MagicMock, AsyncMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client import serializer
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.serializer import JsonSerializer, get_serializer
+
+
+class TestGetSerializer(unittest.TestCase):
+    def test_prefers_installed_fast_backend(self):
+        with patch.object(serializer, "orjson", object()):
+            self.assertEqual(get_serializer().name, "orjson")
+
+        with patch.object(serializer, "orjson", None), patch.object(
+            serializer, "ujson", None
+        ):
+            self.assertEqual(get_serializer().name, "json")
+
+    def test_named_backend(self):
+        backend = get_serializer("json")
+        data = backend.dumps({"input": "Héllo", "speed": 1.0})
+
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(backend.loads(data), {"input": "Héllo", "speed": 1.0})
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_serializer("yaml")
+
+    def test_missing_backend(self):
+        with patch.object(serializer, "ujson", None):
+            with self.assertRaises(ImportError):
+                get_serializer("ujson")
+
+    def test_custom_backend(self):
+        custom = JsonSerializer()
+        self.assertIs(get_serializer(custom), custom)
+
+
+class TestClientSerializer(unittest.TestCase):
+    def test_payload_is_pre_encoded(self):
+        client = OpenVoiceApiClient(json_backend="json")
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(
+            {
+                "result": {
+                    "data": {"url": "http://example.com/audio.wav"},
+                    "message": "OK",
+                }
+            }
+        ).encode("utf-8")
+
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
+            data, status_code, _ = client.generate_audio(
+                input="Hello", response_format="url"
+            )
+
+        kwargs = mock_post.call_args[1]
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data, "http://example.com/audio.wav")
+        self.assertNotIn("json", kwargs)
+        self.assertEqual(kwargs["headers"]["Content-Type"], "application/json")
+        self.assertEqual(json.loads(kwargs["data"])["input"], "Hello")
+
+    def test_async_payload_is_pre_encoded(self):
+        async def run():
+            client = OpenVoiceApiClientAsync(json_backend="json")
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.read = AsyncMock(
+                return_value=json.dumps(
+                    {
+                        "result": {
+                            "data": {"url": "http://example.com/audio.wav"},
+                            "message": "OK",
+                        }
+                    }
+                ).encode("utf-8")
+            )
+
+            with patch(
+                "aiohttp.ClientSession.post",
+                new_callable=AsyncMock,
+                return_value=mock_response,
+            ) as mock_post:
+                data, status_code, _ = await client.generate_audio(
+                    input="Hello", response_format="url"
+                )
+            await client.aclose()
+
+            kwargs = mock_post.call_args[1]
+            self.assertEqual(status_code, 200)
+            self.assertEqual(data, "http://example.com/audio.wav")
+            self.assertEqual(kwargs["headers"]["Content-Type"], "application/json")
+            self.assertEqual(json.loads(kwargs["data"])["input"], "Hello")
+
+        asyncio.run(run())
+
+    def test_bare_custom_backend(self):
+        class Backend:
+            def dumps(self, data):
+                return json.dumps(data).encode("utf-8")
+
+            def loads(self, data):
+                return json.loads(data)
+
+        client = OpenVoiceApiClient(json_backend=Backend())
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"audio_bytes_content"
+
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
+            data, status_code, _ = client.generate_audio(input="Hello")
+
+        self.assertEqual((data, status_code), (b"audio_bytes_content", 200))
+        self.assertEqual(
+            mock_post.call_args[1]["headers"]["Content-Type"], "application/json"
+        )
+
+    def test_encoding_errors_return_500(self):
+        async def run():
+            async with OpenVoiceApiClientAsync() as client:
+                return await client.change_voice(voice="x", audio_data=b"raw")
+
+        # Bytes are not JSON serialisable without encode=True
+        result = OpenVoiceApiClient().change_voice(voice="x", audio_data=b"raw")
+        self.assertEqual(result, (None, 500, "Internal Server Error"))
+        self.assertEqual(asyncio.run(run()), (None, 500, "Internal Server Error"))
+
+
+if __name__ == "__main__":
+    unittest.main()
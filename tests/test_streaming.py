@@ -0,0 +1,328 @@
+import unittest
+import sys
+import os
+import json
+import base64
+import asyncio
+import tempfile
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from unittest.mock import patch, MagicMock, AsyncMock
+from openvoice_api_client.client import OpenVoiceApiClient
+from openvoice_api_client.client_async import OpenVoiceApiClientAsync
+from openvoice_api_client.streaming import (
+    Base64JsonBody,
+    Base64JsonDecoder,
+    BufferWriter,
+)
+
+
+class TestBase64JsonBody(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.audio_file = os.path.join(self.tmp.name, "audio.wav")
+        self.audio_bytes = os.urandom(10000)
+        with open(self.audio_file, "wb") as f:
+            f.write(self.audio_bytes)
+        self.payload = {
+            "model": "en",
+            "response_format": "bytes",
+            "voice": "elon",
+            "audio_data": None,
+            "accent": "en-au",
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _expected(self):
+        return dict(
+            self.payload, audio_data=base64.b64encode(self.audio_bytes).decode("utf-8")
+        )
+
+    def test_sync_body(self):
+        for chunk_size in (3, 1000, 1024, 1 << 20):
+            body = Base64JsonBody(self.payload, self.audio_file, chunk_size=chunk_size)
+            data = b"".join(body)
+
+            self.assertEqual(json.loads(data), self._expected())
+            self.assertEqual(len(data), len(body))
+
+    def test_async_body(self):
+        async def read(body):
+            return b"".join([chunk async for chunk in body])
+
+        body = Base64JsonBody(self.payload, self.audio_file, chunk_size=1000)
+        data = asyncio.run(read(body))
+
+        self.assertEqual(json.loads(data), self._expected())
+        self.assertEqual(len(data), len(body))
+
+    def test_body_can_be_replayed(self):
+        body = Base64JsonBody(self.payload, self.audio_file, chunk_size=999)
+        self.assertEqual(b"".join(body), b"".join(body))
+
+    def test_requests_sends_content_length(self):
+        body = Base64JsonBody(self.payload, self.audio_file)
+        request = requests.Request(
+            "POST", "http://localhost:5000/v2/change-voice", data=body
+        ).prepare()
+
+        self.assertEqual(request.headers["Content-Length"], str(len(body)))
+        self.assertNotIn("Transfer-Encoding", request.headers)
+
+    def test_aiohttp_sends_content_length(self):
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        async def run():
+            received = {}
+
+            async def change_voice(request):
+                received["headers"] = request.headers
+                received["body"] = await request.read()
+                return web.Response(body=b"audio_bytes_content")
+
+            app = web.Application()
+            app.router.add_post("/v2/change-voice", change_voice)
+
+            async with TestServer(app) as server:
+                async with OpenVoiceApiClientAsync(
+                    base_url=str(server.make_url(""))
+                ) as client:
+                    result = await client.change_voice(
+                        voice="elon", audio_file=self.audio_file
+                    )
+            return result, received
+
+        (audio_bytes, status_code, _), received = asyncio.run(run())
+        self.assertEqual(status_code, 200)
+        self.assertEqual(
+            received["headers"]["Content-Length"], str(len(received["body"]))
+        )
+        self.assertNotIn("Transfer-Encoding", received["headers"])
+        self.assertEqual(
+            base64.b64decode(json.loads(received["body"])["audio_data"]),
+            self.audio_bytes,
+        )
+
+    def test_missing_file(self):
+        with self.assertRaises(OSError):
+            Base64JsonBody(self.payload, os.path.join(self.tmp.name, "missing.wav"))
+
+
+def split(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestBase64JsonDecoder(unittest.TestCase):
+    def setUp(self):
+        self.audio_bytes = os.urandom(10001)
+        self.document = json.dumps(
+            {
+                "result": {
+                    "message": 'Field "audio_data": follows',
+                    "data": {"audio_data": base64.b64encode(self.audio_bytes).decode()},
+                }
+            }
+        ).encode("utf-8")
+
+    def decode(self, chunks):
+        decoder = Base64JsonDecoder()
+        data = b"".join(decoder.feed(chunk) for chunk in chunks)
+        decoder.close()
+        return data
+
+    def test_any_chunking(self):
+        for size in (1, 2, 3, 5, 7, 64, 4096, len(self.document)):
+            self.assertEqual(self.decode(split(self.document, size)), self.audio_bytes)
+
+    def test_escapes(self):
+        wrapped = base64.encodebytes(self.audio_bytes).decode().replace("\n", "\\n")
+        document = (
+            '{"result": {"data": {"audio_data" : "'
+            + wrapped.replace("/", "\\/").replace("+", "\\u002B")
+            + '"}}}'
+        ).encode("utf-8")
+
+        self.assertEqual(self.decode(split(document, 3)), self.audio_bytes)
+
+    def test_memory_is_bounded(self):
+        decoder = Base64JsonDecoder()
+
+        for chunk in split(self.document, 100):
+            decoder.feed(chunk)
+            self.assertLess(len(decoder._buffer) + len(decoder._pending), 200)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.decode([b'{"result": {"data": {"url": "http://x"}}}'])
+        with self.assertRaises(ValueError):
+            self.decode([self.document[: len(self.document) // 2]])
+        with self.assertRaises(ValueError):
+            self.decode([b'{"audio_data": null}'])
+
+
+class TestClientBase64ToFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmp.name, "output.wav")
+        self.audio_bytes = os.urandom(50000)
+        document = json.dumps(
+            {
+                "result": {
+                    "data": {"audio_data": base64.b64encode(self.audio_bytes).decode()},
+                    "message": "Generated audio",
+                }
+            }
+        ).encode("utf-8")
+        self.chunks = split(document, 1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch("requests.Session.post")
+    def test_sync(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = self.chunks
+        mock_post.return_value = mock_response
+        client = OpenVoiceApiClient(chunk_size=1000)
+
+        result = client.generate_audio(
+            input="Hello", response_format="base64", output_file=self.output_file
+        )
+
+        self.assertEqual(
+            result, (self.output_file, 200, "Generated audio bytes and saved to file")
+        )
+        mock_response.json.assert_not_called()
+        with open(self.output_file, "rb") as f:
+            self.assertEqual(f.read(), self.audio_bytes)
+
+    def test_async(self):
+        async def run():
+            async def iter_chunked(chunk_size):
+                for chunk in self.chunks:
+                    yield chunk
+
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.content.iter_chunked = MagicMock(side_effect=iter_chunked)
+
+            async with OpenVoiceApiClientAsync() as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ):
+                    result = await client.generate_audio(
+                        input="Hello",
+                        response_format="base64",
+                        output_file=self.output_file,
+                    )
+
+            self.assertEqual(result[1], 200)
+            with open(self.output_file, "rb") as f:
+                self.assertEqual(f.read(), self.audio_bytes)
+
+        asyncio.run(run())
+
+
+class TestBufferWriter(unittest.TestCase):
+    def test_bytearray_grows(self):
+        buffer = bytearray(b"x" * 4)
+        writer = BufferWriter(buffer)
+
+        for chunk in (b"abc", b"def", b"gh"):
+            writer.write(chunk)
+
+        self.assertEqual(writer.length, 8)
+        self.assertEqual(buffer, b"abcdefgh")
+
+    def test_bytearray_is_not_shrunk(self):
+        buffer = bytearray(10)
+        writer = BufferWriter(buffer)
+        writer.write(b"abc")
+
+        self.assertEqual(writer.length, 3)
+        self.assertEqual(len(buffer), 10)
+
+    def test_memoryview_must_fit(self):
+        buffer = bytearray(4)
+        writer = BufferWriter(memoryview(buffer))
+        writer.write(b"ab")
+
+        with self.assertRaises(ValueError):
+            writer.write(b"cde")
+        with self.assertRaises(ValueError):
+            writer.expect(5)
+        writer.release()
+        self.assertEqual(buffer, b"ab\x00\x00")
+
+    def test_read_only_buffer(self):
+        with self.assertRaises(ValueError):
+            BufferWriter(b"abc")
+
+
+class TestClientAudioInto(unittest.TestCase):
+    def setUp(self):
+        self.audio_bytes = os.urandom(5000)
+        self.chunks = split(self.audio_bytes, 1000)
+
+    @patch("requests.Session.post")
+    def test_sync(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"Content-Length": str(len(self.audio_bytes))}
+        mock_response.iter_content.return_value = self.chunks
+        mock_post.return_value = mock_response
+        client = OpenVoiceApiClient()
+        buffer = bytearray()
+
+        result = client.generate_audio_into(buffer, input="Hello")
+
+        self.assertEqual(result, (5000, 200, "Generated audio bytes"))
+        self.assertEqual(bytes(buffer[: result.data]), self.audio_bytes)
+        payload = json.loads(mock_post.call_args[1]["data"])
+        self.assertEqual(payload["response_format"], "bytes")
+
+        # A buffer that is too small fails before anything is read
+        mock_response.iter_content.reset_mock()
+        result = client.generate_audio_into(memoryview(bytearray(100)), input="Hello")
+        self.assertEqual(result, (None, 500, "Internal Server Error"))
+        mock_response.iter_content.assert_not_called()
+
+    def test_async(self):
+        async def run():
+            async def iter_any():
+                for chunk in self.chunks:
+                    yield chunk
+
+            mock_response = MagicMock()
+            mock_response.status = 200
+            mock_response.content_length = len(self.audio_bytes)
+            mock_response.headers = {}
+            mock_response.content.iter_any = MagicMock(side_effect=iter_any)
+            buffer = bytearray(8000)
+
+            async with OpenVoiceApiClientAsync() as client:
+                with patch(
+                    "aiohttp.ClientSession.post",
+                    new_callable=AsyncMock,
+                    return_value=mock_response,
+                ):
+                    result = await client.generate_audio_into(
+                        memoryview(buffer), input="Hello"
+                    )
+
+            self.assertEqual(result, (5000, 200, "Generated audio bytes"))
+            self.assertEqual(bytes(buffer[:5000]), self.audio_bytes)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
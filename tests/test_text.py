@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client.text import SentenceBuffer, split_sentences
+
+
+class TestSplitSentences(unittest.TestCase):
+    def test_splits_at_sentence_boundaries(self):
+        self.assertEqual(
+            split_sentences('Hello there. How are you? "Fine!" she said. Ok'),
+            ["Hello there.", "How are you?", '"Fine!"', "she said.", "Ok"],
+        )
+
+    def test_keeps_decimals_and_ellipses(self):
+        self.assertEqual(
+            split_sentences("Version 2.5 is out... Really?! Yes."),
+            ["Version 2.5 is out...", "Really?!", "Yes."],
+        )
+
+    def test_splits_long_sentences_at_clauses_then_words(self):
+        chunks = split_sentences(
+            "one, two, three four five six seven eight", max_chars=12
+        )
+        self.assertEqual(chunks, ["one, two,", "three four", "five six", "seven eight"])
+        self.assertTrue(all(len(chunk) <= 12 for chunk in chunks))
+
+    def test_empty_input(self):
+        self.assertEqual(split_sentences(""), [])
+        self.assertEqual(split_sentences("   "), [])
+
+
+class TestSentenceBuffer(unittest.TestCase):
+    def _feed(self, buffer, text):
+        sentences = []
+        for token in text.split(" "):
+            sentences.extend(buffer.feed(token + " "))
+        return sentences
+
+    def test_emits_complete_sentences(self):
+        buffer = SentenceBuffer()
+        sentences = self._feed(buffer, "Version 2.5 is out. It is great! Try it")
+
+        self.assertEqual(sentences, ["Version 2.5 is out.", "It is great!"])
+        self.assertEqual(buffer.flush(), ["Try it"])
+        self.assertEqual(buffer.flush(), [])
+
+    def test_waits_for_whitespace_after_punctuation(self):
+        buffer = SentenceBuffer()
+        self.assertEqual(buffer.feed("Version 2."), [])
+        self.assertEqual(buffer.feed("5 is out. "), ["Version 2.5 is out."])
+
+    def test_releases_long_sentences_at_clauses(self):
+        buffer = SentenceBuffer(max_chars=40)
+        sentences = self._feed(
+            buffer,
+            "Some very long clause, that keeps on going, and going and going on",
+        )
+
+        self.assertEqual(sentences, ["Some very long clause,", "that keeps on going,"])
+        self.assertEqual(buffer.flush(), ["and going and going on"])
+
+
+if __name__ == "__main__":
+    unittest.main()
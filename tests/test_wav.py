@@ -0,0 +1,162 @@
+import unittest
+import sys
+import os
+import struct
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from openvoice_api_client import wav
+
+
+def make_wav(data, sample_rate=24000, channels=1, bits=16):
+    block_align = channels * bits // 8
+    info = wav.WavInfo(1, channels, sample_rate, bits, block_align, 44, len(data))
+    return wav.build_header(info, len(data)) + data
+
+
+class TestWav(unittest.TestCase):
+    def test_parse_header(self):
+        info = wav.parse_header(make_wav(b"\x01\x00" * 10, sample_rate=16000))
+
+        self.assertEqual(info.sample_rate, 16000)
+        self.assertEqual(info.channels, 1)
+        self.assertEqual(info.bits_per_sample, 16)
+        self.assertEqual(info.data_offset, 44)
+        self.assertEqual(info.data_size, 20)
+
+    def test_parse_header_skips_extra_chunks(self):
+        clip = make_wav(b"\x01\x00" * 4)
+        extra = b"LIST" + struct.pack("<I", 3) + b"abc\x00"
+        clip = clip[:36] + extra + clip[36:]
+        info = wav.parse_header(clip)
+
+        self.assertEqual(info.data_offset, 44 + len(extra))
+        self.assertEqual(info.data_size, 8)
+
+    def test_parse_header_streamed_size(self):
+        clip = bytearray(make_wav(b"\x01\x00" * 4))
+        clip[40:44] = struct.pack("<I", 0xFFFFFFFF)
+        self.assertEqual(wav.parse_header(clip).data_size, 8)
+
+    def test_parse_header_invalid(self):
+        with self.assertRaises(ValueError):
+            wav.parse_header(b"not a wav file")
+
+    def test_concatenate(self):
+        output = wav.concatenate([make_wav(b"\x01\x00"), make_wav(b"\x02\x00\x03\x00")])
+        info = wav.parse_header(output)
+
+        self.assertEqual(info.data_size, 6)
+        self.assertEqual(output[info.data_offset :], b"\x01\x00\x02\x00\x03\x00")
+        self.assertEqual(struct.unpack_from("<I", output, 4)[0], len(output) - 8)
+
+    def test_concatenate_mismatched_formats(self):
+        with self.assertRaises(ValueError):
+            wav.concatenate([make_wav(b"\x01\x00"), make_wav(b"\x01\x00", 16000)])
+
+    def test_concatenate_with_silence(self):
+        output = wav.concatenate(
+            [make_wav(b"\x01\x00"), make_wav(b"\x02\x00")], silence=0.001
+        )
+        info = wav.parse_header(output)
+
+        # 24 frames of silence at 24 kHz
+        self.assertEqual(info.data_size, 4 + 48)
+        self.assertEqual(output[info.data_offset + 2 : -2], b"\x00" * 48)
+
+    def test_concatenate_rejects_silence_and_crossfade(self):
+        with self.assertRaises(ValueError):
+            wav.concatenate(
+                [make_wav(b"\x01\x00"), make_wav(b"\x01\x00")],
+                silence=0.1,
+                crossfade=0.1,
+            )
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_concatenate_with_crossfade(self):
+        a = make_wav(np.full(100, 1000, dtype="<i2").tobytes(), sample_rate=100)
+        b = make_wav(np.full(100, -1000, dtype="<i2").tobytes(), sample_rate=100)
+        output = wav.concatenate([a, b], crossfade=0.1)
+        info = wav.parse_header(output)
+        samples = np.frombuffer(output[info.data_offset :], dtype="<i2")
+
+        self.assertEqual(len(samples), 190)
+        self.assertTrue((samples[:90] == 1000).all())
+        self.assertTrue((samples[100:] == -1000).all())
+        self.assertEqual(list(samples[90:95]), [1000, 800, 600, 400, 200])
+
+    def test_concatenate_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(3):
+                path = os.path.join(tmp, f"{i}.wav")
+                with open(path, "wb") as f:
+                    f.write(make_wav(bytes([i, 0]) * 4))
+                paths.append(path)
+
+            output_file = os.path.join(tmp, "output.wav")
+            size = wav.concatenate_files(paths, output_file, silence=0.0001)
+
+            with open(output_file, "rb") as f:
+                output = f.read()
+
+        info = wav.parse_header(output)
+        self.assertEqual(size, len(output))
+        self.assertEqual(info.data_size, 3 * 8 + 2 * 4)
+        self.assertEqual(
+            output[info.data_offset :],
+            b"\x00\x00" * 4
+            + b"\x00" * 4
+            + b"\x01\x00" * 4
+            + b"\x00" * 4
+            + b"\x02\x00" * 4,
+        )
+
+    def test_concatenate_files_bad_input(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            good = os.path.join(tmp, "good.wav")
+            with open(good, "wb") as f:
+                f.write(make_wav(b"\x00\x00" * 4))
+
+            for content in (b"ID3 not a wav file at all", make_wav(b"")[:30]):
+                bad = os.path.join(tmp, "bad.wav")
+                with open(bad, "wb") as f:
+                    f.write(content)
+
+                with self.assertRaises(ValueError):
+                    wav.concatenate_files([good, bad], os.path.join(tmp, "output.wav"))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_to_numpy(self):
+        data = make_wav(np.arange(6, dtype="<i2").tobytes(), channels=2)
+        samples, sample_rate = wav.to_numpy(data)
+
+        self.assertEqual(sample_rate, 24000)
+        self.assertEqual(samples.dtype, np.dtype("<i2"))
+        self.assertEqual(samples.tolist(), [[0, 1], [2, 3], [4, 5]])
+        # A view over the received bytes, not a copy
+        self.assertFalse(samples.flags.owndata)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_stack(self):
+        a = make_wav(np.full(3, 7, dtype="<i2").tobytes())
+        b = make_wav(np.full(5, -7, dtype="<i2").tobytes())
+        samples, sample_rate, lengths = wav.stack([a, b])
+
+        self.assertEqual(sample_rate, 24000)
+        self.assertEqual(lengths, [3, 5])
+        self.assertTrue(samples.flags.c_contiguous)
+        self.assertEqual(samples.tolist(), [[7, 7, 7, 0, 0], [-7] * 5])
+
+        with self.assertRaises(ValueError):
+            wav.stack([a, make_wav(b"\x00\x00", sample_rate=16000)])
+
+
+if __name__ == "__main__":
+    unittest.main()